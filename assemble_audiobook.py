@@ -0,0 +1,213 @@
+# assemble_audiobook.py
+
+import os
+import re
+import struct
+
+import soundfile as sf
+
+from audio_encoder import OUTPUT_FORMATS
+
+# --- Configuration ---
+ASSEMBLY_BLOCK_FRAMES = 24000 * 60 # Frames copied at a time (1 minute of Kokoro audio), so memory stays flat
+RIFF_SIZE_LIMIT = 0xFFFFFFFF # Largest RIFF/data size a plain WAV header can hold; larger books are written as RF64
+DS64_CHUNK_SIZE = 28 # ds64 body without a table: RIFF size, data size, frame count (8 bytes each), table length
+INCOMPLETE_MARKERS = (".part.f32", ".journal") # Sidecars of a chapter still being synthesized or encoded
+TEMP_OUTPUT_MARKER = ".tmp" # Stem suffix of an output still being written (e.g. 'ch01.tmp.mp3')
+
+# --- Chapters ---
+def chapter_title(path):
+    """
+    Returns a chapter title from an extracted chapter's filename, e.g.
+    '003_L2_The_Long_Night.wav' -> 'The Long Night'.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    stem = re.sub(r'^\d+_', '', stem)  # Chapter number added by the extractor
+    stem = re.sub(r'^L\d+_', '', stem) # TOC level prefix
+    return stem.replace('_', ' ').strip() or os.path.basename(path)
+
+def find_chapter_audio(audio_dir):
+    """
+    Returns the finished chapter audio files of a book directory, in chapter (name) order.
+
+    Files still being synthesized or encoded (with a checkpoint journal or raw .part.f32
+    audio next to them) and temporary outputs are left out.
+    """
+    names = os.listdir(audio_dir)
+    chapters = []
+    for name in sorted(names):
+        root, ext = os.path.splitext(name)
+        if ext.lower() not in OUTPUT_FORMATS or root.endswith(TEMP_OUTPUT_MARKER):
+            continue
+        if any(name + marker in names for marker in INCOMPLETE_MARKERS):
+            continue
+        chapters.append(os.path.join(audio_dir, name))
+    return chapters
+
+def find_incomplete_chapters(audio_dir):
+    """
+    Returns the names of the chapter audio files of a book directory that are still being
+    synthesized or encoded (see INCOMPLETE_MARKERS), in name order, whether or not an
+    earlier version of the file exists.
+    """
+    incomplete = set()
+    for name in os.listdir(audio_dir):
+        for marker in INCOMPLETE_MARKERS:
+            if name.endswith(marker) and os.path.splitext(name[:-len(marker)])[1].lower() in OUTPUT_FORMATS:
+                incomplete.add(name[:-len(marker)])
+    return sorted(incomplete)
+
+def book_output_path(audio_dir):
+    """Returns where the single-file book of a chapter directory goes: '<audio_dir>.wav', next to it."""
+    return os.path.normpath(audio_dir) + ".wav"
+
+# --- WAV Container ---
+def _chunk(chunk_id, body):
+    """A RIFF chunk: id, little-endian size, body and a pad byte if the size is odd."""
+    return chunk_id + struct.pack('<I', len(body)) + body + (b'\0' if len(body) % 2 else b'')
+
+def _cue_chunk(offsets):
+    """cue chunk with one cue point (ids from 1) per frame offset into the data chunk."""
+    body = struct.pack('<I', len(offsets))
+    for cue_id, offset in enumerate(offsets, start=1):
+        body += struct.pack('<II4sIII', cue_id, offset, b'data', 0, 0, offset)
+    return _chunk(b'cue ', body)
+
+def _label_chunk(titles):
+    """LIST/adtl chunk with a labl (UTF-8, null-terminated) naming each cue point."""
+    body = b'adtl'
+    for cue_id, title in enumerate(titles, start=1):
+        body += _chunk(b'labl', struct.pack('<I', cue_id) + title.encode('utf-8') + b'\0')
+    return _chunk(b'LIST', body)
+
+def assemble_audiobook(chapter_paths, output_path, titles=None, progress_callback=None, cancellation_flag=None):
+    """
+    Joins chapter audio files into one WAV file with a chapter marker at the start of each.
+
+    The chapters are decoded and copied a block (ASSEMBLY_BLOCK_FRAMES) at a time, so memory
+    use does not depend on the length of the book. Chapter markers are a cue point per
+    chapter plus a labl text with its title (read as markers/regions by audio editors and
+    many players). A book too large for a 4 GB WAV header is written as RF64: the header
+    reserves a JUNK chunk that becomes the ds64 chunk once the final size is known.
+    The file is written to a temporary path and renamed when complete.
+
+    Args:
+        chapter_paths (list[str]): Chapter audio files in book order (any format soundfile
+                                   reads; they must share the sample rate and channel count).
+        output_path (str): The book file to write.
+        titles (list[str], optional): One title per chapter. Default: from the filenames
+                                      (see chapter_title).
+        progress_callback (callable, optional): Called as (percentage, title) after each chapter.
+        cancellation_flag (callable, optional): Function returning True to cancel.
+
+    Returns:
+        list[tuple]: (title, start time in seconds) per chapter.
+
+    Raises:
+        ValueError: If there are no chapters or their sample rates or channel counts differ.
+        InterruptedError: If cancelled (nothing is written).
+        OSError: If a chapter cannot be read or the book cannot be written.
+    """
+    if not chapter_paths:
+        raise ValueError("No chapter audio to assemble.")
+    titles = list(titles) if titles is not None else [chapter_title(path) for path in chapter_paths]
+    first = sf.info(chapter_paths[0])
+    samplerate, channels = first.samplerate, first.channels
+    block_align = 2 * channels # int16 frames
+
+    temp_output_path = output_path + ".tmp"
+    offsets = [] # Start frame of each chapter
+    total_frames = 0
+    try:
+        with open(temp_output_path, 'wb') as out:
+            out.write(b'RIFF' + struct.pack('<I', 0) + b'WAVE')
+            out.write(_chunk(b'JUNK', bytes(DS64_CHUNK_SIZE))) # Becomes ds64 if the book needs RF64
+            out.write(_chunk(b'fmt ', struct.pack('<HHIIHH', 1, channels, samplerate, samplerate * block_align,
+                                                 block_align, 16)))
+            data_header_pos = out.tell()
+            out.write(b'data' + struct.pack('<I', 0))
+
+            for index, (path, title) in enumerate(zip(chapter_paths, titles), start=1):
+                with sf.SoundFile(path) as chapter:
+                    if chapter.samplerate != samplerate or chapter.channels != channels:
+                        raise ValueError(f"'{os.path.basename(path)}' is {chapter.samplerate} Hz / {chapter.channels} ch, "
+                                         f"but the book is {samplerate} Hz / {channels} ch.")
+                    offsets.append(total_frames)
+                    while True:
+                        if cancellation_flag and cancellation_flag():
+                            raise InterruptedError("Assembly cancelled by user.")
+                        block = chapter.read(ASSEMBLY_BLOCK_FRAMES, dtype='int16')
+                        if not len(block):
+                            break
+                        out.write(block.astype('<i2').tobytes())
+                        total_frames += len(block)
+                if progress_callback: progress_callback(index / len(chapter_paths) * 100, title)
+
+            data_size = total_frames * block_align # Always even (int16 samples), so no pad byte
+            if total_frames > 0xFFFFFFFF:
+                print("  Warning: Chapter markers past 2^32 frames cannot be stored; later chapters are unmarked.")
+            marked = [(offset, title) for offset, title in zip(offsets, titles) if offset <= 0xFFFFFFFF]
+            out.write(_cue_chunk([offset for offset, _ in marked]))
+            out.write(_label_chunk([title for _, title in marked]))
+
+            riff_size = out.tell() - 8
+            if riff_size > RIFF_SIZE_LIMIT or data_size > RIFF_SIZE_LIMIT:
+                # RF64: sizes move to the ds64 chunk, the 32-bit fields are set to -1
+                out.seek(0)
+                out.write(b'RF64' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE')
+                out.write(b'ds64' + struct.pack('<IQQQI', DS64_CHUNK_SIZE, riff_size, data_size, total_frames, 0))
+                out.seek(data_header_pos + 4)
+                out.write(struct.pack('<I', 0xFFFFFFFF))
+            else:
+                out.seek(4)
+                out.write(struct.pack('<I', riff_size))
+                out.seek(data_header_pos + 4)
+                out.write(struct.pack('<I', data_size))
+        os.replace(temp_output_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_output_path)
+        except OSError:
+            pass
+        raise
+    return [(title, offset / samplerate) for offset, title in zip(offsets, titles)]
+
+def assemble_book_directory(audio_dir, output_path=None, progress_callback=None, cancellation_flag=None):
+    """
+    Assembles the finished chapters of a book's audio directory into one chaptered WAV.
+    Unfinished chapters (see find_incomplete_chapters) are left out and listed.
+
+    Args:
+        audio_dir (str): Directory with one audio file per chapter (see find_chapter_audio).
+        output_path (str, optional): Book file. Default: book_output_path(audio_dir).
+        progress_callback, cancellation_flag: As for assemble_audiobook.
+
+    Returns:
+        str: Path of the written book file.
+
+    Raises:
+        ValueError: If the directory has no finished chapter audio.
+    """
+    output_path = output_path or book_output_path(audio_dir)
+    chapter_paths = find_chapter_audio(audio_dir)
+    print(f"\n--- Assembling '{os.path.basename(output_path)}' from {len(chapter_paths)} chapter(s) ---")
+    incomplete = find_incomplete_chapters(audio_dir)
+    if incomplete:
+        print(f"  Warning: Skipping {len(incomplete)} unfinished chapter(s) (resume the audio generation to finish them):")
+        for name in incomplete:
+            print(f"    {name}")
+    chapters = assemble_audiobook(chapter_paths, output_path, progress_callback=progress_callback,
+                                  cancellation_flag=cancellation_flag)
+    for title, start in chapters:
+        print(f"  {int(start // 3600):d}:{int(start % 3600 // 60):02d}:{start % 60:05.2f}  {title}")
+    print(f"  Book saved to '{output_path}'")
+    return output_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Join a book's chapter audio files into one WAV with chapter markers.")
+    parser.add_argument("audio_dir", help="Directory with one audio file per chapter (e.g. 'MyBook_audio')")
+    parser.add_argument("-o", "--output", default=None, help="Book file (default: '<audio_dir>.wav')")
+    args = parser.parse_args()
+    assemble_book_directory(args.audio_dir, args.output)
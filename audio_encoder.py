@@ -0,0 +1,281 @@
+# audio_encoder.py
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import soundfile as sf
+
+# --- Configuration ---
+OUTPUT_FORMATS = { # Output file extension -> (libsndfile format, subtype)
+    ".wav": ("WAV", "PCM_16"),
+    ".flac": ("FLAC", "PCM_16"),
+    ".opus": ("OGG", "OPUS"),
+    ".ogg": ("OGG", "VORBIS"),
+    ".mp3": ("MP3", "MPEG_LAYER_III"),
+}
+INLINE_FORMATS = (".wav",) # Written by the synthesis process itself; every other format is encoded in the background
+ENCODE_BLOCK_SAMPLES = 24000 * 60 # Samples read, scaled and encoded at a time (1 minute of Kokoro audio)
+DEFAULT_ENCODE_QUALITY = 0.7 # Lossy formats without a bitrate: 0 (smallest files) to 1 (best quality)
+MAX_COMPRESSION_LEVEL = 0.99 # libsndfile's MP3 encoder rejects a compression level of 1.0
+ENCODER_PROCESSES = 1 # Background encoder processes (encoding is much faster than synthesis)
+
+# --- Formats ---
+def check_output_format(extension):
+    """
+    Checks that audio can be written with this output file extension.
+
+    Args:
+        extension (str): Output file extension, e.g. '.mp3'.
+
+    Returns:
+        tuple: (format, subtype) for soundfile.
+
+    Raises:
+        ValueError: If the extension is unknown or this libsndfile build cannot write it.
+    """
+    extension = extension.lower()
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported audio format '{extension}'. Choose one of: {', '.join(OUTPUT_FORMATS)}")
+    major, subtype = OUTPUT_FORMATS[extension]
+    if not sf.check_format(major, subtype):
+        raise ValueError(f"This libsndfile ({sf.__libsndfile_version__}) cannot write {major}/{subtype} "
+                         f"audio ('{extension}'); update the soundfile package or choose another format.")
+    return major, subtype
+
+def available_output_formats():
+    """Returns the output extensions this libsndfile build can write, in OUTPUT_FORMATS order."""
+    return [extension for extension, (major, subtype) in OUTPUT_FORMATS.items() if sf.check_format(major, subtype)]
+
+def encodes_in_background(path):
+    """True if audio written to path (or with this extension) is encoded by the background encoder."""
+    extension = os.path.splitext(path)[1] or path # splitext('.mp3') has no extension
+    return extension.lower() not in INLINE_FORMATS
+
+def _bitrate_range(subtype, samplerate):
+    """(min, max) kbps that libsndfile maps compression levels 1.0 to 0.0 onto, or None."""
+    if subtype == "OPUS":
+        return 6, 256
+    if subtype == "MPEG_LAYER_III":
+        if samplerate >= 32000:
+            return 32, 320
+        return (8, 160) if samplerate >= 16000 else (8, 64)
+    return None
+
+def compression_settings(subtype, samplerate, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+    """
+    Returns the soundfile (compression_level, bitrate_mode) for a subtype.
+
+    Args:
+        subtype (str): soundfile subtype (see OUTPUT_FORMATS).
+        samplerate (int): Sample rate of the audio.
+        bitrate (int, optional): Target bitrate in kbps (MP3, which then uses a constant
+                                 bitrate, and Opus). Other formats use quality.
+        quality (float): 0 (smallest) to 1 (best), for lossy formats without a bitrate.
+
+    Returns:
+        tuple: (compression_level, bitrate_mode); (None, None) for PCM and FLAC, which
+               are lossless and keep libsndfile's defaults.
+    """
+    if subtype not in ("OPUS", "VORBIS", "MPEG_LAYER_III"):
+        return None, None
+    bitrate_mode = None
+    bitrate_range = _bitrate_range(subtype, samplerate)
+    if bitrate and bitrate_range:
+        low, high = bitrate_range
+        level = (high - min(max(bitrate, low), high)) / (high - low)
+        if subtype == "MPEG_LAYER_III":
+            bitrate_mode = "CONSTANT"
+    else:
+        level = 1.0 - min(max(quality, 0.0), 1.0)
+        if subtype == "MPEG_LAYER_III":
+            bitrate_mode = "VARIABLE"
+    return min(level, MAX_COMPRESSION_LEVEL), bitrate_mode
+
+def describe_output_format(extension, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+    """Returns a one-line description of the output format and its encoder settings, for run headers."""
+    subtype = OUTPUT_FORMATS.get(extension.lower(), (None, None))[1]
+    if subtype in ("OPUS", "VORBIS", "MPEG_LAYER_III"):
+        settings = f"{bitrate} kbps" if bitrate and subtype != "VORBIS" else f"quality {quality:.2f}"
+        return f"{extension} ({settings}, encoded in the background)"
+    if encodes_in_background(extension):
+        return f"{extension} (encoded in the background)"
+    return extension
+
+# --- Encoding ---
+def encode_audio(job, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+    """
+    Writes a finished raw recording to its output file.
+
+    The raw float32 samples are read in blocks of ENCODE_BLOCK_SAMPLES, scaled by the job's
+    gain, rounded and clipped to int16 and encoded into a temporary file (followed by the
+    job's trailing silence, if any), which then replaces output_path.
+    The job's cleanup paths (the raw file and its journal) are only removed afterwards,
+    so an encode that is interrupted can be redone from them.
+
+    Args:
+        job (dict): 'raw_path', 'output_path', 'samplerate', 'gain', 'cleanup_paths' and
+                    optionally 'trailing_samples' (see StreamingAudioWriter.seal). The output
+                    extension selects the format.
+        bitrate (int, optional): Target bitrate in kbps (see compression_settings).
+        quality (float): 0 (smallest) to 1 (best), for lossy formats without a bitrate.
+
+    Returns:
+        str: The output path.
+
+    Raises:
+        ValueError: If the output format cannot be written.
+        OSError: If reading the raw audio or writing the output fails.
+    """
+    output_path = job['output_path']
+    root, ext = os.path.splitext(output_path)
+    major, subtype = check_output_format(ext)
+    compression_level, bitrate_mode = compression_settings(subtype, job['samplerate'], bitrate, quality)
+    temp_output_path = root + ".tmp" + ext
+    try:
+        with open(job['raw_path'], 'rb') as raw, \
+                sf.SoundFile(temp_output_path, 'w', samplerate=job['samplerate'], channels=1, format=major,
+                             subtype=subtype, compression_level=compression_level, bitrate_mode=bitrate_mode) as out:
+            while True:
+                block = np.fromfile(raw, dtype=np.float32, count=ENCODE_BLOCK_SAMPLES)
+                if not block.size:
+                    break
+                out.write(np.clip(np.rint(block * np.float32(job['gain'])), -32768, 32767).astype(np.int16))
+            trailing = job.get('trailing_samples', 0)
+            while trailing > 0:
+                out.write(np.zeros(min(trailing, ENCODE_BLOCK_SAMPLES), dtype=np.int16))
+                trailing -= ENCODE_BLOCK_SAMPLES
+        os.replace(temp_output_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_output_path)
+        except OSError:
+            pass
+        raise
+    for path in job['cleanup_paths']:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return output_path
+
+def rescale_audio(path, factor, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+    """
+    Multiplies the samples of a finished audio file by factor, in place.
+
+    The file is decoded as int16 a block (ENCODE_BLOCK_SAMPLES) at a time, scaled, clipped
+    and written to a temporary file in the same format, which then replaces it. WAV and
+    FLAC stay lossless; lossy formats are encoded a second time.
+
+    Args:
+        path (str): Audio file written by encode_audio.
+        factor (float): Gain to apply.
+        bitrate (int, optional): Target bitrate in kbps for lossy formats (see compression_settings).
+        quality (float): 0 (smallest) to 1 (best), for lossy formats without a bitrate.
+
+    Raises:
+        ValueError: If the format cannot be written.
+        OSError: If reading or writing the file fails.
+    """
+    root, ext = os.path.splitext(path)
+    major, subtype = check_output_format(ext)
+    temp_path = root + ".tmp" + ext
+    try:
+        with sf.SoundFile(path) as source:
+            compression_level, bitrate_mode = compression_settings(subtype, source.samplerate, bitrate, quality)
+            with sf.SoundFile(temp_path, 'w', samplerate=source.samplerate, channels=source.channels, format=major,
+                              subtype=subtype, compression_level=compression_level, bitrate_mode=bitrate_mode) as out:
+                while True:
+                    block = source.read(ENCODE_BLOCK_SAMPLES, dtype='int16')
+                    if not len(block):
+                        break
+                    out.write(np.clip(np.rint(block * np.float32(factor)), -32768, 32767).astype(np.int16))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+# --- Background Encoder ---
+# Compressed formats are encoded by a small pool of processes, shared by every run of the
+# session, so synthesis moves on to the next file as soon as a file's raw audio is complete.
+_encoder_executor = None
+
+def _get_encoder_executor(num_processes=ENCODER_PROCESSES):
+    """Returns the shared encoder process pool (started on first use)."""
+    global _encoder_executor
+    if _encoder_executor is None:
+        # 'spawn': forking a process that already runs torch (or GUI) threads is not safe
+        _encoder_executor = ProcessPoolExecutor(max_workers=num_processes,
+                                                mp_context=multiprocessing.get_context('spawn'))
+    return _encoder_executor
+
+def shutdown_encoder_pool():
+    """Waits for queued encodes to finish and stops the encoder processes, if any are running."""
+    global _encoder_executor
+    if _encoder_executor is not None:
+        _encoder_executor.shutdown(wait=True)
+        _encoder_executor = None
+
+def _discard_broken_pool():
+    """Forgets a pool whose processes died; its queued encodes have already failed."""
+    global _encoder_executor
+    if _encoder_executor is not None:
+        _encoder_executor.shutdown(wait=False)
+        _encoder_executor = None
+
+class BackgroundEncoder:
+    """
+    Encodes the files of one run in the shared encoder processes.
+
+    submit() queues a sealed recording and returns at once; wait() blocks until every
+    file queued by this run has been written and reports the ones that failed.
+    """
+
+    def __init__(self, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+        """
+        Args:
+            bitrate (int, optional): Target bitrate in kbps (MP3 and Opus).
+            quality (float): 0 (smallest) to 1 (best), for lossy formats without a bitrate.
+        """
+        self.bitrate = bitrate
+        self.quality = quality
+        self._futures = [] # (output_path, future) per queued file
+
+    def submit(self, job):
+        """Queues a job (see encode_audio) for encoding."""
+        print(f"      Queued '{os.path.basename(job['output_path'])}' for encoding.")
+        try:
+            future = _get_encoder_executor().submit(encode_audio, job, self.bitrate, self.quality)
+        except BrokenProcessPool:
+            # An encoder process died (e.g. killed for memory); start a fresh pool
+            _discard_broken_pool()
+            future = _get_encoder_executor().submit(encode_audio, job, self.bitrate, self.quality)
+        self._futures.append((job['output_path'], future))
+
+    def wait(self):
+        """
+        Waits for every queued file.
+
+        Returns:
+            list[str]: Output paths that could not be encoded. Their raw audio and journal
+                       are kept, so a resumed run encodes them again without synthesis.
+        """
+        if self._futures:
+            print(f"  Waiting for {sum(not future.done() for _, future in self._futures)} of "
+                  f"{len(self._futures)} files still being encoded...")
+        failed = []
+        for output_path, future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    _discard_broken_pool() # So the next run starts a fresh pool
+                print(f"  Error encoding '{os.path.basename(output_path)}': {e or type(e).__name__}")
+                failed.append(output_path)
+        self._futures = []
+        return failed
@@ -0,0 +1,330 @@
+# disk_cache.py
+
+import os
+import atexit
+import hashlib
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# --- Configuration ---
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache") # Parent of all cache directories
+EVICT_TARGET_RATIO = 0.9 # Eviction frees space down to this fraction of max_bytes
+HASH_BLOCK_SIZE = 1024 * 1024 # Bytes read at a time when hashing files
+SQLITE_TIMEOUT = 30 # Seconds a store waits for another process's write lock
+SQLITE_TOUCH_FLUSH_COUNT = 1000 # Recorded reads written at once, so a run of cache hits keeps its recency
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_key(*parts):
+    """Builds a cache key (SHA-256 hex digest) from any number of str()-able parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0') # Separator, so ("ab", "c") and ("a", "bc") differ
+    return digest.hexdigest()
+
+class DiskCache:
+    """
+    A size-limited, content-addressed byte store on disk with LRU eviction.
+
+    Each entry is one file named after its key (keys are hex digests, see make_key).
+    Reading an entry refreshes its modification time, and eviction removes the
+    least recently used entries first once the total size exceeds max_bytes.
+    Writes are atomic (temp file + rename), so several processes can share a cache.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None # Total entry size in bytes, scanned on first write
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yields (path, size, mtime) for every entry currently on disk."""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # Evicted by another process
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """Returns the bytes stored under key, or None if there is no such entry."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path) # Mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Stores data (bytes) under key, evicting old entries if the cache grows too large."""
+        entry = self.open_entry(key)
+        try:
+            entry.write(data)
+            entry.commit()
+        finally:
+            entry.discard() # No-op once committed
+
+    def open_entry(self, key):
+        """
+        Starts writing the entry for key a piece at a time, for entries too large to
+        build in memory first.
+
+        Returns:
+            CacheEntryWriter: Write the data with write(), then store it with commit()
+                              (or drop it with discard()).
+        """
+        return CacheEntryWriter(self, key)
+
+    def _added(self, num_bytes):
+        """Accounts for a newly stored entry of num_bytes, evicting old entries if needed."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += num_bytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Removes least recently used entries until the cache is below its target size."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except FileNotFoundError:
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+        if removed:
+            print(f"  Cache '{os.path.basename(self.directory)}': evicted {removed} old entries.")
+
+    def stats(self):
+        """Returns (entry_count, total_bytes) for the entries currently on disk."""
+        count = total = 0
+        for _, size, _ in self._entries():
+            count += 1
+            total += size
+        return count, total
+
+    def clear(self):
+        """Deletes every entry in the cache."""
+        with self._lock:
+            if os.path.isdir(self.directory):
+                shutil.rmtree(self.directory, ignore_errors=True)
+            self._size = 0
+
+
+class CacheEntryWriter:
+    """
+    An entry of a DiskCache being written (see DiskCache.open_entry).
+
+    The data goes to a temporary file next to the entry, which commit() renames into
+    place, so readers never see a partly written entry.
+    """
+
+    def __init__(self, cache, key):
+        self._cache = cache
+        self.path = cache._path(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        """Appends data (bytes) to the entry."""
+        self._file.write(data)
+
+    def commit(self):
+        """Stores the entry, evicting old entries if the cache grows too large."""
+        size = self._file.tell()
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+        self._temp_path = None
+        self._cache._added(size)
+
+    def discard(self):
+        """Drops the entry, unless it was already committed."""
+        if self._temp_path is None:
+            return
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+        self._temp_path = None
+
+
+class SqliteCache:
+    """
+    A size-limited byte store in a single SQLite file, for many small entries.
+
+    Same interface as DiskCache, for entries (a few hundred bytes) too small to be
+    worth a file each. Reads are recorded in memory and written with the next put,
+    every SQLITE_TOUCH_FLUSH_COUNT reads, and by flush() (called at the end of a run
+    and at exit), so most lookups never take the write lock. Several processes can
+    share the file.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._size = None # Total entry size in bytes, queried on first write
+        self._touched = {} # key -> last use time, not yet written
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL") # Readers do not block the writer
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def get(self, key):
+        """Returns the bytes stored under key, or None if there is no such entry (or the store is unreadable)."""
+        with self._lock:
+            try:
+                row = self._connect().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            self._touched[key] = time.time() # Mark as recently used
+            if len(self._touched) >= SQLITE_TOUCH_FLUSH_COUNT:
+                try:
+                    with self._connection:
+                        self._write_touched()
+                except sqlite3.Error:
+                    pass # Kept in memory for the next attempt
+            return bytes(row[0])
+
+    def put(self, key, data):
+        """
+        Stores data (bytes) under key, evicting old entries if the store grows too large.
+
+        Raises:
+            OSError: If the store cannot be written.
+        """
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection: # One transaction
+                    self._write_touched()
+                    connection.execute("INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)",
+                                       (key, sqlite3.Binary(data), time.time()))
+                if self._size is None:
+                    self._size = self._total_size()
+                else:
+                    self._size += len(key) + len(data)
+                if self._size > self.max_bytes:
+                    self._evict()
+            except sqlite3.Error as e:
+                raise OSError(f"Could not write to '{self.path}': {e}") from e
+
+    def _write_touched(self):
+        """Writes the recorded reads (call with the lock held, inside a transaction)."""
+        if self._touched:
+            self._connection.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                         [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Writes the last-use times of entries read since the last write, so eviction sees them."""
+        with self._lock:
+            if not self._touched:
+                return
+            try:
+                with self._connect():
+                    self._write_touched()
+            except sqlite3.Error as e:
+                print(f"  Cache '{os.path.basename(self.path)}': could not record recent reads: {e}")
+
+    def close(self):
+        """Flushes recorded reads and closes the connection (it is reopened on next use)."""
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _total_size(self):
+        return self._connect().execute("SELECT COALESCE(SUM(LENGTH(key) + LENGTH(value)), 0) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        """Removes least recently used entries until the store is below its target size."""
+        connection = self._connect()
+        total = self._total_size()
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        stale = []
+        for key, size in connection.execute(
+            "SELECT key, LENGTH(key) + LENGTH(value) FROM entries ORDER BY last_used"
+        ):
+            if total <= target:
+                break
+            stale.append((key,))
+            total -= size
+        with connection:
+            connection.executemany("DELETE FROM entries WHERE key = ?", stale)
+        self._size = total
+        if stale:
+            print(f"  Cache '{os.path.basename(self.path)}': evicted {len(stale)} old entries.")
+
+    def stats(self):
+        """Returns (entry_count, total_bytes) for the entries currently stored."""
+        with self._lock:
+            try:
+                count, = self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()
+                return count, self._total_size()
+            except sqlite3.Error:
+                return 0, 0
+
+    def clear(self):
+        """Deletes every entry in the store."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM entries")
+            connection.execute("VACUUM") # Give the space back
+            self._touched.clear()
+            self._size = 0
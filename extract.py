@@ -7,8 +7,19 @@ import tempfile
 import time
 import unicodedata # For normalization
 from bs4 import BeautifulSoup # For improved EPUB parsing
+from lxml import etree # Fast path for well-formed XHTML in EPUBs
+import html
 from num2words import num2words
 import traceback # For detailed error logging if needed
+import functools
+import contextlib
+import io
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import deque
+from disk_cache import CACHE_ROOT, DiskCache, hash_file, make_key
+from stage_profiler import StageProfiler, print_report, write_report, read_report, summarize_reports
 
 # --- Configuration ---
 HEADER_THRESHOLD = 50 # Pixels from top to ignore
@@ -16,59 +27,174 @@ FOOTER_THRESHOLD = 50 # Pixels from bottom to ignore
 # MIN_BLOCK_WIDTH_RATIO = 0.1 # Minimum block width relative to page width (Removed for now, can be noisy)
 # MIN_BLOCK_HEIGHT_RATIO = 0.1 # Minimum block height relative to page height (Removed for now, can be noisy)
 OVERLAP_CHECK_LINES = 20 # Number of lines to check for overlap between chapters
+PAGE_SHARDS_PER_WORKER = 4 # Page ranges per worker process when extracting a PDF in parallel
+CLEAN_RULES_VERSION = 2 # Bump whenever extraction/cleaning output changes; invalidates cached extractions
+EXTRACTION_CACHE_DIR = os.path.join(CACHE_ROOT, "extraction")
+EXTRACTION_CACHE_MAX_BYTES = 1024 * 1024 * 1024 # 1 GB, least recently used entries are evicted beyond this
+PROFILE_REPORT_NAME = "extraction_profile.json" # Per-book stage timing report, written next to the extracted text
+PROFILE_SUMMARY_NAME = "extraction_profile_summary.json" # Aggregated stage timings of a batch run
+
+# --- Stage Profiling ---
+# The StageProfiler of the extraction in progress (extract_book(profile=True)), or None.
+# Instrumented stages check it once per call, so profiling costs nothing when it is off.
+_profiler = None
+
+def _run_stage(name, func, text):
+    """Runs func(text) (str -> str), recording it as stage `name` if profiling is on."""
+    profiler = _profiler
+    if profiler is None:
+        return func(text)
+    start_time = time.perf_counter()
+    result = func(text)
+    profiler.add(name, time.perf_counter() - start_time, len(text), len(result))
+    return result
+
+def _run_profiled(func, *args):
+    """Worker: runs func(*args) under a fresh StageProfiler. Returns (result, stage totals)."""
+    global _profiler
+    _profiler = StageProfiler()
+    try:
+        return func(*args), _profiler.stages
+    finally:
+        _profiler = None
 
 # --- Text Cleaning and Processing Functions ---
 # ... (Keep normalize_text, expand_abbreviations_and_initials, convert_numbers,
 #      handle_sentence_ends_and_pauses, remove_artifacts, join_wrapped_lines,
 #      basic_html_to_text, clean_pipeline - all UNCHANGED) ...
 
+# Character fixes applied after NFKC, as a single translate table
+NORMALIZE_CHAR_TABLE = str.maketrans({
+    '—': ', ', # Em dash with comma space (often better for TTS pause)
+    '–': ', ', # En dash
+    '«': '"', '»': '"', # Guillemets to standard quotes
+    chr(8216): "'", chr(8217): "'", # ‘ ’ -> '
+    chr(8220): '"', chr(8221): '"', # “ ” -> "
+})
+
 def normalize_text(text):
     """Apply Unicode normalization and fix common problematic characters."""
     # NFKC decomposes ligatures and compatibility characters
     text = unicodedata.normalize('NFKC', text)
     # Specific replacements for characters normalization might not handle as desired
-    text = text.replace('—', ', ') # Em dash with comma space (often better for TTS pause)
-    text = text.replace('–', ', ') # En dash
-    text = text.replace('«', '"').replace('»', '"') # Guillemets to standard quotes
-    # Replace various apostrophe/quote types with standard ones
-    text = text.replace(chr(8216), "'").replace(chr(8217), "'") # ‘ ’ -> '
-    text = text.replace(chr(8220), '"').replace(chr(8221), '"') # “ ” -> "
+    text = text.translate(NORMALIZE_CHAR_TABLE)
     # Add spaces around hyphens used as separators (like in ranges, if desired)
     # text = re.sub(r'(?<=\w)-(?=\w)', ' - ', text) # Optional: might affect compound words
 
     # Fix specific odd characters observed (add more if found)
     # text = text.replace('ĕ', 'e') # If 'ĕ' consistently represents 'e' due to font issues
-    # text = text.replace('', 'Th') # If Th ligature consistently causes issues
+    # text = text.replace('', 'Th') # If Th ligature consistently causes issues
 
     return text
 
+# Abbreviation (without its final period, lowercase) -> expansion. Order matters, see below.
+ABBREVIATIONS = {
+    'mr': 'Mister', 'mrs': 'Misses', 'ms': 'Miss', 'dr': 'Doctor',
+    'prof': 'Professor', 'jr': 'Junior', 'sr': 'Senior',
+    'vs': 'versus', 'etc': 'etcetera', 'i.e': 'that is',
+    'e.g': 'for example', 'cf': 'compare', 'st': 'Saint', # Changed St. -> Saint, more common? Or 'Street'? Needs context. Assume Saint for now.
+    'vol': 'Volume', 'no': 'Number', 'pp': 'pages', 'p': 'page',
+    # Add more domain-specific ones if needed
+}
+ABBREVIATION_ORDER = {abbr: idx for idx, abbr in enumerate(ABBREVIATIONS)}
+# One alternation for all abbreviations; the group holds the abbreviation without its period
+ABBREVIATION_PATTERN = re.compile(
+    r'\b(' + '|'.join(re.escape(abbr) for abbr in ABBREVIATIONS) + r')\.', re.IGNORECASE
+)
+# Per-abbreviation patterns, only used for case-insensitive matches whose lower() is not a key (e.g. 'ſt.')
+ABBREVIATION_FALLBACK_PATTERNS = [
+    (abbr, re.compile(re.escape(abbr), re.IGNORECASE)) for abbr in ABBREVIATIONS
+]
+# Fix initials like "E. B. White" -> "E B White" and collapse runs of spaces in the same pass
+INITIALS_AND_SPACES_PATTERN = re.compile(r'([A-Z])\.(?=\s*[A-Z])|( ) +')
+
+def _lookup_abbreviation(abbr):
+    """Returns the ABBREVIATIONS key for a matched abbreviation (any case)."""
+    key = abbr.lower()
+    if key in ABBREVIATIONS:
+        return key
+    for candidate, pattern in ABBREVIATION_FALLBACK_PATTERNS:
+        if pattern.fullmatch(abbr):
+            return candidate
+    return None
+
 def expand_abbreviations_and_initials(text):
     """Expand common abbreviations and fix spaced initials."""
-    abbreviations = {
-        r'\bMr\.': 'Mister', r'\bMrs\.': 'Misses', r'\bMs\.': 'Miss', r'\bDr\.': 'Doctor',
-        r'\bProf\.': 'Professor', r'\bJr\.': 'Junior', r'\bSr\.': 'Senior',
-        r'\bvs\.': 'versus', r'\betc\.': 'etcetera', r'\bi\.e\.': 'that is',
-        r'\be\.g\.': 'for example', r'\bcf\.': 'compare', r'\bSt\.': 'Saint', # Changed St. -> Saint, more common? Or 'Street'? Needs context. Assume Saint for now.
-        r'\bVol\.': 'Volume', r'\bNo\.': 'Number', r'\bpp\.': 'pages', r'\bp\.': 'page',
-        # Add more domain-specific ones if needed
-    }
-    # Expand standard abbreviations
-    for abbr, expansion in abbreviations.items():
-        text = re.sub(abbr, expansion, text, flags=re.IGNORECASE)
-
-    # Fix initials like "E. B. White" -> "E B White"
+    # Expand standard abbreviations in one scan. The result matches expanding them one
+    # abbreviation at a time in ABBREVIATIONS order: an expansion ends in a letter, so it
+    # hides the word boundary of an abbreviation directly after it, unless that one comes
+    # earlier in the order (it would have been expanded first).
+    pieces = []
+    last_end = 0
+    prev_end = -1 # End of the last expanded abbreviation
+    prev_order = 0
+    pos = 0
+    while True:
+        match = ABBREVIATION_PATTERN.search(text, pos)
+        if not match:
+            break
+        key = _lookup_abbreviation(match.group(1))
+        order = ABBREVIATION_ORDER[key]
+        if match.start() == prev_end and order > prev_order:
+            pos = match.start() + 1 # Not expanded; a later abbreviation may still start inside it
+            continue
+        pieces.append(text[last_end:match.start()])
+        pieces.append(ABBREVIATIONS[key])
+        last_end = prev_end = pos = match.end()
+        prev_order = order
+    if pieces:
+        pieces.append(text[last_end:])
+        text = "".join(pieces)
+
     # Looks for sequences of (CapitalLetter + Period + OptionalSpace) followed by another CapitalLetter
-    # Using positive lookahead to handle sequences correctly.
-    text = re.sub(r'([A-Z])\.(?=\s*[A-Z])', r'\1', text)
-    # Clean up any potential double spaces left by the above
-    text = re.sub(r' +', ' ', text)
+    # Using positive lookahead to handle sequences correctly. Double spaces are collapsed too.
+    text = INITIALS_AND_SPACES_PATTERN.sub(r'\1\2', text)
 
     return text
 
+THOUSANDS_SEPARATOR_PATTERN = re.compile(r'(?<=\d),(?=\d)')
+# Integers possibly followed by ordinal suffixes (st, nd, rd, th); the suffix decides ordinal conversion
+NUMBER_PATTERN = re.compile(r'\b(\d+)(st|nd|rd|th)?\b')
+NUMBER_WORDS_CACHE_SIZE = 8192 # Max (value, mode) pairs kept outside the precomputed tables
+# Value ranges precomputed per num2words mode the first time that mode is used
+NUMBER_WORDS_TABLE_RANGES = {
+    'cardinal': range(0, 10001),
+    'ordinal': range(0, 10001),
+    'year': range(1500, 2101),
+}
+_number_words_tables = {} # mode -> list of words for NUMBER_WORDS_TABLE_RANGES[mode]
+
+@functools.lru_cache(maxsize=NUMBER_WORDS_CACHE_SIZE)
+def _cached_num2words(num, mode):
+    return num2words(num, to=mode)
+
+def number_to_words(num, mode='cardinal'):
+    """
+    Converts an integer to words with num2words, memoized.
+
+    Common values (see NUMBER_WORDS_TABLE_RANGES) come from a table built once per
+    mode and process; everything else goes through a bounded LRU cache.
+
+    Args:
+        num (int): The number to convert.
+        mode (str): num2words conversion: 'cardinal', 'ordinal' or 'year'.
+
+    Returns:
+        str: The number in words.
+    """
+    table_range = NUMBER_WORDS_TABLE_RANGES.get(mode)
+    if table_range is not None and num in table_range:
+        table = _number_words_tables.get(mode)
+        if table is None:
+            table = [num2words(value, to=mode) for value in table_range]
+            _number_words_tables[mode] = table
+        return table[num - table_range.start]
+    return _cached_num2words(num, mode)
+
 def convert_numbers(text):
     """Convert integers and years to words. Leaves decimals and other numbers."""
     # Replace commas in numbers (thousand separators)
-    text = re.sub(r'(?<=\d),(?=\d)', '', text)
+    text = THOUSANDS_SEPARATOR_PATTERN.sub('', text)
 
     def replace_match(match):
         num_str = match.group(0)
@@ -81,32 +207,33 @@ def convert_numbers(text):
             if 1500 <= num <= 2100:
                 # Use 'year' format which typically reads digits (e.g., "nineteen eighty-four")
                 # If you prefer "one thousand nine hundred eighty four", change to 'cardinal'
-                return num2words(num, to='year')
+                return number_to_words(num, 'year')
             # Handle ordinal numbers (e.g., 1st, 2nd) - num2words handles suffixes like 'st'
             elif match.group(1):
                  # num2words can convert directly to ordinal words
-                 return num2words(num, to='ordinal')
+                 return number_to_words(num, 'ordinal')
             # Default: convert cardinal numbers
             else:
                  # Optional: Add threshold? Only convert small numbers?
                  # if num < 1000: return num2words(num) else: return num_str
-                 return num2words(num)
+                 return number_to_words(num)
         except ValueError:
             return num_str # Return original if not a valid number
 
-    # Regex to find integers possibly followed by ordinal suffixes (st, nd, rd, th)
-    # We target whole numbers primarily, potentially with ordinal indicators
-    # Make suffix optional and capture it to decide if ordinal conversion is needed
-    pattern = r'\b(\d+)(st|nd|rd|th)?\b'
-    text = re.sub(pattern, replace_match, text)
+    text = NUMBER_PATTERN.sub(replace_match, text)
     return text
 
+# Space before punctuation that follows a word character (inserted at a zero-width match), plus space collapsing
+PUNCTUATION_SPACING_PATTERN = re.compile(r'(?<=\w)(?=[.,!?;:])| +')
+SENTENCE_END_CHARS = '.!?;:'
+LIST_ITEM_START_PATTERN = re.compile(r'^[-\*\u2022•\d+\.\s]+')
+DASH_PAUSE_PATTERN = re.compile(r'\s+-\s+') # Requires space around hyphen
+SENTENCE_BREAK_PATTERN = re.compile(r'([.!?:])\s*')
+
 def handle_sentence_ends_and_pauses(text):
     """Ensure sentences end cleanly and handle potential pauses."""
-    # Add a space before punctuation if missing (helps TTS parsing)
-    text = re.sub(r'(?<=\w)([.,!?;:])', r' \1', text)
-    # Normalize multiple spaces
-    text = re.sub(r' +', ' ', text)
+    # Add a space before punctuation if missing (helps TTS parsing) and normalize multiple spaces
+    text = PUNCTUATION_SPACING_PATTERN.sub(' ', text)
 
     # Ensure common sentence endings have a period if missing (e.g. lists)
     # This is less aggressive than forcing periods everywhere
@@ -116,8 +243,8 @@ def handle_sentence_ends_and_pauses(text):
         stripped_line = line.strip()
         # Add period if line isn't empty, doesn't end in punctuation, isn't a list item, and has enough words
         if stripped_line and \
-           not re.search(r'[.!?;:]$', stripped_line) and \
-           not re.match(r'^[-\*\u2022•\d+\.\s]+', stripped_line) and \
+           stripped_line[-1] not in SENTENCE_END_CHARS and \
+           not LIST_ITEM_START_PATTERN.match(stripped_line) and \
            len(stripped_line.split()) > 3:
              line += '.' # Add period only if it seems like a sentence fragment needing termination
         processed_lines.append(line)
@@ -126,7 +253,7 @@ def handle_sentence_ends_and_pauses(text):
     # Replace semicolons with commas (often better for TTS pause)
     text = text.replace(';', ',')
     # Replace hyphens used as pauses (like in dialogues) with commas - more specific pattern
-    text = re.sub(r'\s+-\s+', ', ', text) # Requires space around hyphen
+    text = DASH_PAUSE_PATTERN.sub(', ', text)
     # Optional: Replace exclamation marks with periods if excitement is not desired
     # text = text.replace('!', '.')
     # Optional: Replace question marks with periods if intonation is not desired
@@ -135,24 +262,32 @@ def handle_sentence_ends_and_pauses(text):
     # Add newline after sentence-ending punctuation for potential TTS break cues
     # Ensure space doesn't exist before newline, add it if needed for clarity.
     # This version adds newline *after* the punctuation and a space.
-    text = re.sub(r'([.!?:])\s*', r'\1\n', text) # Ensures newline separation after sentence ends
+    text = SENTENCE_BREAK_PATTERN.sub(r'\1\n', text) # Ensures newline separation after sentence ends
 
     return text
 
+CITATION_PATTERN = re.compile(r'\[\s*\d+\s*\]')
+PAGE_NUMBER_LINE_PATTERN = re.compile(r'^\s*\d+\s*$', flags=re.MULTILINE)
+PUNCTUATION_LINE_PATTERN = re.compile(r'^\s*[.,;:!?\-—–_]+\s*$', flags=re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+
 def remove_artifacts(text):
     """Remove common extraction artifacts like citations, excessive newlines etc."""
     # Remove bracketed numbers (citations, footnotes)
-    text = re.sub(r'\[\s*\d+\s*\]', '', text)
+    text = CITATION_PATTERN.sub('', text)
     # Remove page numbers (simple standalone numbers on a line) - might need refinement
-    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
+    text = PAGE_NUMBER_LINE_PATTERN.sub('', text)
     # Remove lines that are just punctuation (often artifacts)
-    text = re.sub(r'^\s*[.,;:!?\-—–_]+\s*$', '', text, flags=re.MULTILINE)
+    text = PUNCTUATION_LINE_PATTERN.sub('', text)
     # Collapse multiple blank lines into a single blank line
-    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = BLANK_LINES_PATTERN.sub('\n\n', text)
     # Remove leading/trailing whitespace from the whole text
     text = text.strip()
     return text
 
+WRAPPED_LINE_END_CHARS = '.!?:)"»’' # A line ending in one of these looks like a finished sentence
+NEW_PARAGRAPH_START_PATTERN = re.compile(r'[\sA-Z\d"«‘\[\*\-\u2022•]')
+
 def join_wrapped_lines(text):
     """Join lines that seem to be wrapped mid-sentence. More robust."""
     lines = text.splitlines()
@@ -160,31 +295,50 @@ def join_wrapped_lines(text):
     if not lines:
         return ""
 
-    buffer = lines[0]
-    for i in range(1, len(lines)):
-        current_line = lines[i]
-        prev_line_stripped = buffer.strip() # Check the buffered content so far
+    # The buffer is kept as a list of pieces, with what the checks need tracked incrementally:
+    # the last non-space character of the buffer and whether it holds more than one word.
+    buffer = [lines[0]]
+    stripped_line = lines[0].strip()
+    last_char = stripped_line[-1:]
+    multiple_words = len(stripped_line.split()) > 1
+    for current_line in lines[1:]:
+        current_stripped = current_line.strip()
 
         # Heuristic: Join if previous line doesn't end with sentence punctuation
         # AND current line doesn't look like a new paragraph/header/list item
         # This tries to avoid joining across paragraphs or list items.
-        if (prev_line_stripped and # Don't join if buffer is empty
-            not re.search(r'[.!?:)"»’]$', prev_line_stripped) and # Doesn't end like a sentence
-            not re.match(r'^[\sA-Z\d"«‘\[\*\-\u2022•]', current_line.strip()) and # Current line doesn't start like a new para/header/list
-            len(prev_line_stripped.split()) > 1): # Avoid joining single-word lines too eagerly
+        if (last_char and # Don't join if buffer is empty
+            last_char not in WRAPPED_LINE_END_CHARS and # Doesn't end like a sentence
+            not NEW_PARAGRAPH_START_PATTERN.match(current_stripped) and # Current line doesn't start like a new para/header/list
+            multiple_words): # Avoid joining single-word lines too eagerly
              # Join with a space
-             buffer += " " + current_line.strip()
+             buffer.append(" ")
+             buffer.append(current_stripped)
+             if current_stripped:
+                 last_char = current_stripped[-1]
         else:
              # If previous line looks like end of sentence, or current line looks like start of new section
-             result_lines.append(buffer) # Add completed buffer
-             buffer = current_line # Start new buffer
+             result_lines.append("".join(buffer).strip()) # Add completed buffer
+             buffer = [current_line] # Start new buffer
+             last_char = current_stripped[-1:]
+             multiple_words = len(current_stripped.split()) > 1
 
-    result_lines.append(buffer) # Add the last buffer content
+    result_lines.append("".join(buffer).strip()) # Add the last buffer content
 
     # Filter out potentially empty lines created during processing before joining
-    return '\n'.join(filter(None, [line.strip() for line in result_lines]))
+    return '\n'.join(filter(None, result_lines))
 
 
+HTML_INLINE_SPACE_PATTERN = re.compile(r'[ \t]+')
+
+def _collapse_html_text(text):
+    """Whitespace cleanup shared by the EPUB text extractors."""
+    # Collapse multiple spaces resulting from inline tags
+    text = HTML_INLINE_SPACE_PATTERN.sub(' ', text)
+    # Collapse multiple newlines into max two (paragraph break)
+    text = BLANK_LINES_PATTERN.sub('\n\n', text)
+    return text
+
 def basic_html_to_text(html_content):
     """Extract text from HTML using BeautifulSoup, removing scripts/styles."""
     soup = BeautifulSoup(html_content, 'html.parser')
@@ -198,39 +352,303 @@ def basic_html_to_text(html_content):
     # Use separator='\n' to ensure block elements get newlines between them
     text = soup.get_text(separator='\n', strip=True)
 
-    # Collapse multiple spaces resulting from inline tags
-    text = re.sub(r'[ \t]+', ' ', text)
-    # Collapse multiple newlines into max two (paragraph break)
-    text = re.sub(r'\n\s*\n', '\n\n', text)
+    return _collapse_html_text(text)
+
+XHTML_NAMESPACE = '{http://www.w3.org/1999/xhtml}'
+XHTML_SKIPPED_TAGS = {'script', 'style', XHTML_NAMESPACE + 'script', XHTML_NAMESPACE + 'style'}
+XHTML_PARSER = etree.XMLParser(resolve_entities=False, load_dtd=False, no_network=True, huge_tree=True)
+
+def xhtml_to_text(content):
+    """
+    Extract text from a well-formed XHTML document with lxml, removing scripts/styles.
+
+    Produces the same text as basic_html_to_text: every run of text between two tags is
+    stripped and put on its own line. Entity references (e.g. &nbsp; without a loaded DTD)
+    are decoded in place and do not split the text around them.
+
+    Args:
+        content (bytes): The raw document, as stored in the EPUB.
+
+    Returns:
+        str or None: The extracted text, or None if the document is not well-formed XML.
+    """
+    try:
+        root = etree.fromstring(content, XHTML_PARSER)
+    except (etree.XMLSyntaxError, ValueError):
+        return None
+
+    strings = []
+    buffer = [] # Pieces of the text run being built
+
+    def flush():
+        if buffer:
+            text = "".join(buffer).strip()
+            if text:
+                strings.append(text)
+            buffer.clear()
+
+    def enter(node):
+        """Handles the start of a node; returns True if its children should be visited."""
+        tag = node.tag
+        if tag is etree.Entity:
+            buffer.append(html.unescape(node.text))
+            return False
+        flush()
+        if tag is etree.Comment or tag is etree.PI or tag in XHTML_SKIPPED_TAGS:
+            return False
+        if node.text:
+            buffer.append(node.text)
+        return True
+
+    def leave(node):
+        if node.tag is not etree.Entity:
+            flush()
+        if node.tail:
+            buffer.append(node.tail)
+
+    # Iterative depth-first walk (documents can nest deeper than the recursion limit)
+    stack = [(root, iter(root))] if enter(root) else []
+    while stack:
+        node, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            leave(node)
+        elif enter(child):
+            stack.append((child, iter(child)))
+        else:
+            leave(child)
+    flush()
+
+    return _collapse_html_text('\n'.join(strings))
 
+def epub_document_to_text(content):
+    """
+    Extract text from one EPUB content document: lxml for well-formed XHTML,
+    BeautifulSoup (basic_html_to_text) for anything lxml cannot parse.
+
+    Args:
+        content (bytes): The raw document, as stored in the EPUB.
+
+    Returns:
+        str: The extracted text.
+    """
+    text = xhtml_to_text(content)
+    if text is None:
+        text = basic_html_to_text(content.decode('utf-8', errors='ignore'))
     return text
 
+# Final whitespace cleanup: collapse space runs and cap newline runs at two, in one pass
+FINAL_WHITESPACE_PATTERN = re.compile(r'( ) +|(\n\n)\n+')
+
+def final_cleanup(text):
+    """Collapse leftover spaces and blank lines after all other cleaning stages."""
+    # Single newlines for within-paragraph breaks, double for paragraph ends
+    text = FINAL_WHITESPACE_PATTERN.sub(r'\1\2', text)
+    return text.strip()
+
+# Stages of clean_pipeline, in order (also used by benchmark_clean_pipeline)
+CLEAN_PIPELINE_STAGES = [
+    ("normalize", normalize_text),
+    ("join_lines", join_wrapped_lines), # Join lines SHOULD be early
+    ("abbreviations", expand_abbreviations_and_initials),
+    ("numbers", convert_numbers),
+    ("sentence_ends", handle_sentence_ends_and_pauses), # Sentence handling before artifact removal
+    ("artifacts", remove_artifacts),
+    ("final_cleanup", final_cleanup),
+]
+
+ALL_CLEAN_STAGES = frozenset(name for name, _ in CLEAN_PIPELINE_STAGES)
+
+class TextDocument:
+    """
+    Text moving through the cleaning stages, with a record of the stages already run.
+
+    clean_pipeline skips the stages listed in stages_run, so text that has already been
+    cleaned (e.g. EPUB chapters combined into a whole book) is never cleaned twice.
+    The text itself stays one plain string: the stages are regex passes over the whole
+    text, and the line-based ones (join_wrapped_lines, handle_sentence_ends_and_pauses)
+    still split it into lines themselves.
+    """
+    __slots__ = ('text', 'stages_run')
+
+    def __init__(self, text="", stages_run=()):
+        self.text = text
+        self.stages_run = set(stages_run)
+
+    @classmethod
+    def from_pages(cls, page_texts):
+        """Creates an uncleaned document from raw page texts, joined with newlines."""
+        return cls("\n".join(page_texts))
+
+def clean_document(doc):
+    """
+    Runs the clean_pipeline stages that have not run on doc yet, in order, in place.
+
+    Args:
+        doc (TextDocument): The document to clean.
+
+    Returns:
+        TextDocument: doc, with every stage recorded in doc.stages_run.
+    """
+    for name, stage in CLEAN_PIPELINE_STAGES:
+        if name not in doc.stages_run:
+            doc.text = _run_stage("clean." + name, stage, doc.text)
+            doc.stages_run.add(name)
+    return doc
+
 def clean_pipeline(text):
-    """Apply the full cleaning pipeline in order."""
+    """
+    Apply the full cleaning pipeline in order.
+
+    Accepts a str (returns the cleaned str) or a TextDocument (cleaned in place and
+    returned; stages it has already been through are skipped).
+    """
+    if isinstance(text, TextDocument):
+        if not text.text:
+            text.stages_run.update(ALL_CLEAN_STAGES)
+            return text
+        return clean_document(text)
     if not text: return ""
-    # print("--- Before clean ---\n", text[:500]) # Debug
-    text = normalize_text(text)
-    # print("--- After normalize ---\n", text[:500]) # Debug
-    text = join_wrapped_lines(text) # Join lines SHOULD be early
-    # print("--- After join lines ---\n", text[:500]) # Debug
-    text = expand_abbreviations_and_initials(text)
-    # print("--- After abbreviations ---\n", text[:500]) # Debug
-    text = convert_numbers(text)
-    # print("--- After numbers ---\n", text[:500]) # Debug
-    text = handle_sentence_ends_and_pauses(text) # Sentence handling before artifact removal
-    # print("--- After sentence ends ---\n", text[:500]) # Debug
-    text = remove_artifacts(text)
-    # print("--- After artifacts ---\n", text[:500]) # Debug
-    # Final whitespace cleanup
-    text = re.sub(r' +', ' ', text)
-    # Consolidate newlines: single newlines for within-paragraph breaks, double for paragraph ends
-    text = re.sub(r'\n\n+', '\n\n', text) # Ensure max 2 newlines
-    text = text.strip()
-    # print("--- After final cleanup ---\n", text[:500]) # Debug
+    for name, stage in CLEAN_PIPELINE_STAGES:
+        text = _run_stage("clean." + name, stage, text)
     return text
 
+def benchmark_clean_pipeline(text, repeats=3):
+    """
+    Measures the throughput of each clean_pipeline stage on a sample text.
+
+    Each stage is fed the output of the previous one, as in clean_pipeline, and
+    timed on its best of `repeats` runs.
+
+    Args:
+        text (str): Sample text to clean (ideally a few MB of raw extracted text).
+        repeats (int): Number of timed runs per stage.
+
+    Returns:
+        list: (stage_name, seconds, mb_per_second) tuples, with a final "total" entry.
+              Throughput is measured on the UTF-8 size of each stage's input.
+    """
+    results = []
+    total_seconds = 0.0
+    total_mb = len(text.encode('utf-8')) / (1024 * 1024)
+    print(f"Benchmarking clean_pipeline on {total_mb:.2f} MB of text ({repeats} runs per stage):")
+    for name, stage in CLEAN_PIPELINE_STAGES:
+        input_mb = len(text.encode('utf-8')) / (1024 * 1024)
+        best = None
+        for _ in range(max(1, repeats)):
+            start_time = time.perf_counter()
+            output = stage(text)
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        total_seconds += best
+        mb_per_second = input_mb / best if best > 0 else float('inf')
+        results.append((name, best, mb_per_second))
+        print(f"  {name:<16} {best * 1000:10.1f} ms  {mb_per_second:8.2f} MB/s")
+        text = output
+    total_mb_per_second = total_mb / total_seconds if total_seconds > 0 else float('inf')
+    results.append(("total", total_seconds, total_mb_per_second))
+    print(f"  {'total':<16} {total_seconds * 1000:10.1f} ms  {total_mb_per_second:8.2f} MB/s")
+    return results
+
+# --- Parallel Chapter Cleaning ---
+CLEAN_PENDING_PER_WORKER = 2 # Chapters queued per cleaning process; bounds the raw text held in memory
+
+def _clean_chapter_text(raw_text):
+    """Worker: cleans one chapter's raw text (str or TextDocument) and returns the cleaned str."""
+    cleaned = clean_pipeline(raw_text)
+    return cleaned.text if isinstance(cleaned, TextDocument) else cleaned
+
+def iter_cleaned_chapters(raw_chapters, num_workers=1):
+    """
+    Cleans chapter texts with clean_pipeline, optionally in a pool of worker processes,
+    and yields the results in the original order.
+
+    With num_workers > 1, up to num_workers * CLEAN_PENDING_PER_WORKER chapters are
+    cleaned ahead of the one being yielded; anything order-dependent (overlap removal,
+    numbering of non-empty chapters) is left to the caller, which sees them in sequence.
+
+    Args:
+        raw_chapters (Iterable[tuple]): (info, raw_text) pairs; raw_text is a str or TextDocument,
+                                        info is passed through as is.
+        num_workers (int): Number of cleaning processes. 1 cleans in this process.
+
+    Yields:
+        tuple: (info, cleaned_text, error) per chapter, in order. error is the exception
+               raised while cleaning (cleaned_text is then None), otherwise None.
+    """
+    if num_workers <= 1:
+        for info, raw_text in raw_chapters:
+            try:
+                yield info, _clean_chapter_text(raw_text), None
+            except Exception as e:
+                yield info, None, e
+        return
+
+    profiler = _profiler # Workers time their stages themselves and send the totals back
+
+    def finished(info, future):
+        error = future.exception()
+        if error:
+            return info, None, error
+        cleaned = future.result()
+        if profiler is not None:
+            cleaned, stages = cleaned
+            profiler.merge(stages)
+        return info, cleaned, None
+
+    max_pending = num_workers * CLEAN_PENDING_PER_WORKER
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker_process) as executor:
+        try:
+            for info, raw_text in raw_chapters:
+                if profiler is None:
+                    future = executor.submit(_clean_chapter_text, raw_text)
+                else:
+                    future = executor.submit(_run_profiled, _clean_chapter_text, raw_text)
+                pending.append((info, future))
+                del raw_text
+                while len(pending) >= max_pending:
+                    yield finished(*pending.popleft())
+            while pending:
+                yield finished(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel() # Generator closed early: drop chapters not yet cleaned
+
 # --- PDF Extraction ---
 
+def extract_page_text(page):
+    """Extracts the text of a single PDF page, filtering headers/footers."""
+    page_height = page.rect.height
+    # page_width = page.rect.width # Not currently used but available
+
+    profiler = _profiler
+    if profiler is not None: start_time = time.perf_counter()
+
+    # Extract text blocks
+    blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_TEXT) # Basic flags
+    if profiler is not None:
+        filter_start_time = time.perf_counter()
+        profiler.add("page_load", filter_start_time - start_time, 0, sum(len(block[4]) for block in blocks))
+    filtered_lines = []
+    for block in blocks:
+        x0, y0, x1, y1, text, *_ = block
+        # Filter by position (header/footer)
+        if y1 < HEADER_THRESHOLD or y0 > page_height - FOOTER_THRESHOLD:
+            continue
+
+        # Simple text cleaning per block (remove excess internal whitespace)
+        cleaned_block_text = re.sub(r'\s+', ' ', text).strip()
+        if cleaned_block_text:
+            filtered_lines.append(cleaned_block_text)
+
+    page_text = "\n".join(filtered_lines) # Join blocks with newline for structure within page
+    if profiler is not None:
+        profiler.add("block_filter", time.perf_counter() - filter_start_time,
+                     sum(len(block[4]) for block in blocks), sum(len(line) for line in filtered_lines))
+    return page_text
+
 def extract_pdf_text_by_page(doc):
     """
     Extracts text page by page from PDF, filtering headers/footers.
@@ -240,26 +658,149 @@ def extract_pdf_text_by_page(doc):
     """
     all_pages_text = []
     for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        page_height = page.rect.height
-        # page_width = page.rect.width # Not currently used but available
-
-        # Extract text blocks
-        blocks = page.get_text("blocks", flags=fitz.TEXTFLAGS_TEXT) # Basic flags
-        filtered_lines = []
-        for block in blocks:
-            x0, y0, x1, y1, text, *_ = block
-            # Filter by position (header/footer)
-            if y1 < HEADER_THRESHOLD or y0 > page_height - FOOTER_THRESHOLD:
-                continue
+        all_pages_text.append(extract_page_text(doc.load_page(page_num)))
+    return all_pages_text
+
+class PdfPageTexts:
+    """
+    Read-only, list-like view of a PDF's page texts that extracts each page on demand.
+
+    Supports len(), indexing, slicing and iteration like the list returned by
+    extract_pdf_text_by_page, without holding the text of the whole book in memory.
+    """
+    def __init__(self, doc):
+        self.doc = doc
+
+    def __len__(self):
+        return len(self.doc)
 
-            # Simple text cleaning per block (remove excess internal whitespace)
-            cleaned_block_text = re.sub(r'\s+', ' ', text).strip()
-            if cleaned_block_text:
-                filtered_lines.append(cleaned_block_text)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._page_text(page_num) for page_num in range(*index.indices(len(self.doc)))]
+        if index < 0:
+            index += len(self.doc)
+        if not 0 <= index < len(self.doc):
+            raise IndexError("page index out of range")
+        return self._page_text(index)
 
-        page_text = "\n".join(filtered_lines) # Join blocks with newline for structure within page
-        all_pages_text.append(page_text)
+    def __iter__(self):
+        for page_num in range(len(self.doc)):
+            yield self._page_text(page_num)
+
+    def _page_text(self, page_num):
+        return extract_page_text(self.doc.load_page(page_num))
+
+class RecordingPdfPageTexts(PdfPageTexts):
+    """
+    PdfPageTexts that also writes every page text into an extraction cache entry as the
+    pages are read, so caching does not need the whole book in memory either.
+
+    The entry is the zlib-compressed JSON list of page texts that _cache_get_json reads,
+    written in page order: pages a reader skips are extracted when a later page is
+    read, and finish() extracts the pages nobody read before storing the entry.
+    """
+    def __init__(self, doc, entry):
+        """
+        Args:
+            doc (fitz.Document): The open PDF document.
+            entry (CacheEntryWriter): Cache entry to write (see DiskCache.open_entry).
+        """
+        super().__init__(doc)
+        self._entry = entry
+        self._compressor = zlib.compressobj(1)
+        self._recorded = 0 # Pages written to the entry so far
+
+    def _page_text(self, page_num):
+        if self._entry is not None:
+            while self._recorded < page_num: # Pages the reader skipped
+                self._record(super()._page_text(self._recorded))
+        text = super()._page_text(page_num)
+        if self._entry is not None and page_num == self._recorded:
+            self._record(text)
+        return text
+
+    def _record(self, text):
+        try:
+            self._entry.write(self._compressor.compress(((", " if self._recorded else "[") + json.dumps(text)).encode('utf-8')))
+            self._recorded += 1
+        except OSError as e:
+            print(f"  Warning: Could not write extraction cache entry: {e}")
+            self.discard()
+
+    def finish(self):
+        """Writes the pages not read yet and stores the entry."""
+        while self._entry is not None and self._recorded < len(self.doc):
+            self._record(super()._page_text(self._recorded))
+        if self._entry is None:
+            return
+        try:
+            self._entry.write(self._compressor.compress(b"]" if self._recorded else b"[]") + self._compressor.flush())
+            self._entry.commit()
+            self._entry = None
+        except OSError as e:
+            print(f"  Warning: Could not write extraction cache entry: {e}")
+            self.discard()
+
+    def discard(self):
+        """Stops recording and drops the entry, unless finish() already stored it."""
+        if self._entry is not None:
+            self._entry.discard()
+            self._entry = None
+
+def _init_worker_process():
+    """Worker initializer: restores the real stdout/stderr (the GUI log redirector only works in the main process)."""
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+
+def _extract_page_range(file_path, start_page, end_page):
+    """Worker: opens its own document and extracts pages [start_page, end_page)."""
+    with fitz.open(file_path) as doc:
+        return [extract_page_text(doc.load_page(page_num)) for page_num in range(start_page, end_page)]
+
+def split_page_ranges(num_pages, num_shards):
+    """Splits range(num_pages) into up to num_shards contiguous (start, end) ranges."""
+    num_shards = max(1, min(num_shards, num_pages))
+    shard_size, remainder = divmod(num_pages, num_shards)
+    ranges = []
+    start = 0
+    for shard in range(num_shards):
+        end = start + shard_size + (1 if shard < remainder else 0)
+        if end > start:
+            ranges.append((start, end))
+        start = end
+    return ranges
+
+def extract_pdf_text_by_page_parallel(file_path, num_pages, num_workers):
+    """
+    Extracts text page by page like extract_pdf_text_by_page, but shards the
+    page ranges across worker processes. Each worker opens its own fitz document.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        num_pages (int): Number of pages in the document.
+        num_workers (int): Number of worker processes.
+
+    Returns:
+        list[str]: Page texts, merged back in page order.
+    """
+    # A few shards per worker keeps the workers busy when some pages are much denser than others
+    ranges = split_page_ranges(num_pages, num_workers * PAGE_SHARDS_PER_WORKER)
+    print(f"  Extracting {num_pages} pages in {len(ranges)} shards across {num_workers} worker processes...")
+    all_pages_text = []
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker_process) as executor:
+        starts = [start for start, _ in ranges]
+        ends = [end for _, end in ranges]
+        # executor.map yields results in submission order, so pages stay in order
+        profiler = _profiler
+        if profiler is None:
+            shard_results = executor.map(_extract_page_range, [file_path] * len(ranges), starts, ends)
+        else:
+            shard_results = executor.map(_run_profiled, [_extract_page_range] * len(ranges), [file_path] * len(ranges), starts, ends)
+        for shard_pages in shard_results:
+            if profiler is not None:
+                shard_pages, stages = shard_pages
+                profiler.merge(stages)
+            all_pages_text.extend(shard_pages)
     return all_pages_text
 
 # --- TOC and Chapter Structuring ---
@@ -287,16 +828,42 @@ def deduplicate_toc(toc):
             print(f"    Info: Duplicate TOC entry page removed: Level {level}, '{title}', Page {page_number}")
     return deduplicated_toc
 
+OVERLAP_WINDOW_CHARS = 4096 # Initial size of the chapter tail/head read when looking for overlap
+OVERLAP_HASH_BASE = 1000003
+OVERLAP_HASH_MOD = (1 << 61) - 1
+
+def _edge_lines(text, num_lines, from_end):
+    """
+    Returns the lines of text as text.splitlines() would, limited to the last (from_end)
+    or first num_lines + 1 or more complete lines when the text is longer.
+    Only a window at the edge of the text is split, grown until it holds enough lines.
+    """
+    window = OVERLAP_WINDOW_CHARS
+    while True:
+        if window >= len(text):
+            return text.splitlines()
+        if from_end:
+            lines = text[-window:].splitlines()[1:] # First line may be cut off
+        else:
+            lines = text[:window].splitlines()[:-1] # Last line may be cut off
+        if len(lines) > num_lines:
+            return lines
+        window *= 2
+
 def remove_overlap(prev_text, curr_text, num_lines=OVERLAP_CHECK_LINES):
     """
     Checks if the end of prev_text overlaps with the start of curr_text
     and returns prev_text with the overlap removed. Based on line comparison.
+
+    Lines are compared through hashed fingerprints: a running hash of the last k lines
+    of prev_text against one of the first k lines of curr_text, so each candidate overlap
+    size costs O(1) and only the edges of both texts are split into lines.
     """
     if not prev_text or not curr_text:
         return prev_text
 
-    prev_lines = prev_text.splitlines()
-    curr_lines = curr_text.splitlines()
+    prev_lines = _edge_lines(prev_text, num_lines, from_end=True)
+    curr_lines = _edge_lines(curr_text, num_lines, from_end=False)
 
     # Don't check if either text is too short
     if not prev_lines or not curr_lines:
@@ -304,146 +871,245 @@ def remove_overlap(prev_text, curr_text, num_lines=OVERLAP_CHECK_LINES):
 
     max_possible_overlap = min(len(prev_lines), len(curr_lines), num_lines)
 
+    # suffix_hashes[k] / prefix_hashes[k]: fingerprint of the last / first k lines
+    suffix_hashes = [0] * (max_possible_overlap + 1)
+    prefix_hashes = [0] * (max_possible_overlap + 1)
+    power = 1
+    for k in range(1, max_possible_overlap + 1):
+        suffix_hashes[k] = (suffix_hashes[k - 1] + hash(prev_lines[-k]) * power) % OVERLAP_HASH_MOD
+        prefix_hashes[k] = (prefix_hashes[k - 1] * OVERLAP_HASH_BASE + hash(curr_lines[k - 1])) % OVERLAP_HASH_MOD
+        power = power * OVERLAP_HASH_BASE % OVERLAP_HASH_MOD
+
     for overlap_size in range(max_possible_overlap, 0, -1):
         # Compare last `overlap_size` lines of prev with first `overlap_size` lines of curr
-        prev_suffix = prev_lines[-overlap_size:]
-        curr_prefix = curr_lines[:overlap_size]
-
-        # Basic check: are the lines identical?
+        # Basic check: are the lines identical? (hash first, then the lines themselves)
         # More robust checks could involve fuzzy matching, but start simple.
-        if prev_suffix == curr_prefix:
+        if (suffix_hashes[overlap_size] == prefix_hashes[overlap_size] and
+                prev_lines[-overlap_size:] == curr_lines[:overlap_size]):
             print(f"    Overlap detected ({overlap_size} lines). Removing from previous chapter end.")
             # Return previous text excluding the overlapping lines
-            return "\n".join(prev_lines[:-overlap_size])
+            return "\n".join(prev_text.splitlines()[:-overlap_size])
 
     # No overlap found
     return prev_text
 
+def benchmark_structural_passes(text, repeats=3, num_lines=OVERLAP_CHECK_LINES):
+    """
+    Measures the throughput of join_wrapped_lines and remove_overlap on a sample text
+    (for example a 10 MB single-chapter book), like benchmark_clean_pipeline.
+
+    remove_overlap is timed twice: against a next chapter that repeats the last lines of
+    text (an overlap is found and removed) and against one that does not.
 
-def structure_pdf_by_toc(deduplicated_toc, all_pages_text):
+    Args:
+        text (str): Sample raw text (ideally several MB).
+        repeats (int): Number of timed runs per pass; the best counts.
+        num_lines (int): Overlap window passed to remove_overlap.
+
+    Returns:
+        list: (pass_name, seconds, mb_per_second) tuples. Throughput is measured on the
+              UTF-8 size of the text.
     """
-    Structures the PDF text into chapters based on TOC page numbers,
-    applies cleaning pipeline per chapter, and removes overlap.
+    text_mb = len(text.encode('utf-8')) / (1024 * 1024)
+    overlapping_head = "\n".join(text.splitlines()[-num_lines:]) + "\nThe next chapter starts here."
+    passes = [
+        ("join_lines", lambda: join_wrapped_lines(text)),
+        ("overlap_found", lambda: remove_overlap(text, overlapping_head, num_lines)),
+        ("overlap_none", lambda: remove_overlap(text, "A different chapter.\nWith its own lines.", num_lines)),
+    ]
+    results = []
+    print(f"Benchmarking structural passes on {text_mb:.2f} MB of text ({repeats} runs per pass):")
+    for name, run in passes:
+        best = None
+        for _ in range(max(1, repeats)):
+            with contextlib.redirect_stdout(io.StringIO()): # remove_overlap reports each overlap
+                start_time = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        mb_per_second = text_mb / best if best > 0 else float('inf')
+        results.append((name, best, mb_per_second))
+        print(f"  {name:<16} {best * 1000:10.1f} ms  {mb_per_second:8.2f} MB/s")
+    return results
+
+
+def iter_toc_chapters(deduplicated_toc, all_pages_text, clean_workers=1):
+    """
+    Generator version of structure_pdf_by_toc: yields each non-empty chapter as soon
+    as it is final. A chapter is final once the next chapter has been cleaned and any
+    overlap has been removed from its end, so at most two chapters are held at a time.
 
     Args:
         deduplicated_toc (list): List of [level, title, page_num] entries.
-        all_pages_text (list[str]): List of text content for each page.
+        all_pages_text (Sequence[str]): Text content for each page (a list or PdfPageTexts).
+        clean_workers (int): Processes cleaning chapters ahead (see iter_cleaned_chapters).
 
-    Returns:
-        list[dict]: List of chapters, each {'level': int, 'title': str, 'text': str}.
+    Yields:
+        dict: {'level': int, 'title': str, 'text': str} for each non-empty chapter, in order.
     """
-    chapters = []
     num_pages_total = len(all_pages_text)
     print(f"  Structuring PDF text ({num_pages_total} pages) using {len(deduplicated_toc)} TOC entries...")
 
-    last_processed_chapter = None # Store {'level': ..., 'title': ..., 'text': ...}
+    def raw_chapters():
+        # Page range and raw text of each TOC entry, in order
+        for i, entry in enumerate(deduplicated_toc):
+            level, title, start_page = entry
+            start_page_idx = start_page - 1 # 0-based index
+
+            # Determine end page index
+            if i < len(deduplicated_toc) - 1:
+                _, _, next_start_page = deduplicated_toc[i + 1]
+                # End page is the page *before* the next chapter starts.
+                # Handle cases where next chapter starts on the same page (use at least one page).
+                end_page_idx = max(start_page_idx, next_start_page - 2) # -1 for index, -1 for previous page
+            else:
+                # Last chapter goes to the end of the document
+                end_page_idx = num_pages_total - 1
 
-    for i, entry in enumerate(deduplicated_toc):
-        level, title, start_page = entry
-        start_page_idx = start_page - 1 # 0-based index
+            # Validate page indices
+            if start_page_idx < 0 or start_page_idx >= num_pages_total:
+                print(f"    Warning: Invalid start page index ({start_page_idx}) for TOC entry '{title}'. Skipping.")
+                continue
+            if end_page_idx < start_page_idx:
+                 print(f"    Info: Chapter '{title}' seems to have zero pages (start={start_page}, next={deduplicated_toc[i+1][2] if i < len(deduplicated_toc)-1 else 'End'}). Assigning one page.")
+                 end_page_idx = start_page_idx # Assign at least the start page
+            elif end_page_idx >= num_pages_total:
+                 print(f"    Warning: Calculated end page index ({end_page_idx}) out of bounds. Clamping to max page ({num_pages_total - 1}).")
+                 end_page_idx = num_pages_total - 1
 
-        # Determine end page index
-        if i < len(deduplicated_toc) - 1:
-            _, _, next_start_page = deduplicated_toc[i + 1]
-            # End page is the page *before* the next chapter starts.
-            # Handle cases where next chapter starts on the same page (use at least one page).
-            end_page_idx = max(start_page_idx, next_start_page - 2) # -1 for index, -1 for previous page
-        else:
-            # Last chapter goes to the end of the document
-            end_page_idx = num_pages_total - 1
 
-        # Validate page indices
-        if start_page_idx < 0 or start_page_idx >= num_pages_total:
-            print(f"    Warning: Invalid start page index ({start_page_idx}) for TOC entry '{title}'. Skipping.")
-            continue
-        if end_page_idx < start_page_idx:
-             print(f"    Info: Chapter '{title}' seems to have zero pages (start={start_page}, next={deduplicated_toc[i+1][2] if i < len(deduplicated_toc)-1 else 'End'}). Assigning one page.")
-             end_page_idx = start_page_idx # Assign at least the start page
-        elif end_page_idx >= num_pages_total:
-             print(f"    Warning: Calculated end page index ({end_page_idx}) out of bounds. Clamping to max page ({num_pages_total - 1}).")
-             end_page_idx = num_pages_total - 1
+            # Extract pages for this chapter
+            # Slicing is [start:end+1]
+            chapter_pages = all_pages_text[start_page_idx : end_page_idx + 1]
+            raw_chapter_text = TextDocument.from_pages(chapter_pages) # Join pages for the chapter
+            del chapter_pages
 
+            # Clean the title
+            clean_title = title.strip()
+            yield (level, clean_title), raw_chapter_text
+            del raw_chapter_text
 
-        # Extract pages for this chapter
-        # Slicing is [start:end+1]
-        chapter_pages = all_pages_text[start_page_idx : end_page_idx + 1]
-        raw_chapter_text = "\n".join(chapter_pages) # Join pages for the chapter
-
-        # Clean the extracted chapter text using the pipeline
-        cleaned_chapter_text = clean_pipeline(raw_chapter_text)
+    last_processed_chapter = None # Store {'level': ..., 'title': ..., 'text': ...}
+    chapters_yielded = 0
 
-        # Clean the title
-        clean_title = title.strip()
+    # Clean the extracted chapter texts using the pipeline (in order, possibly in parallel)
+    for (level, clean_title), cleaned_chapter_text, error in iter_cleaned_chapters(raw_chapters(), clean_workers):
+        if error:
+            raise error
 
         # --- Overlap Removal ---
         # If we have processed a previous chapter, check and remove overlap from IT
         if last_processed_chapter:
             # Compare the end of the *previous* chapter's cleaned text
             # with the start of the *current* chapter's cleaned text.
-            previous_text_no_overlap = remove_overlap(
-                last_processed_chapter['text'],
-                cleaned_chapter_text
+            previous_text_no_overlap = _run_stage(
+                "overlap_removal",
+                lambda prev_text: remove_overlap(prev_text, cleaned_chapter_text),
+                last_processed_chapter['text']
             )
-            # Update the previous chapter's text in our list (or temp storage)
+            # Update the previous chapter's text
             last_processed_chapter['text'] = previous_text_no_overlap
-            # Now add the potentially modified *previous* chapter to the final list
-            chapters.append(last_processed_chapter)
+            # The previous chapter is now final; hand it out unless it ended up empty
+            if last_processed_chapter.get('text'):
+                chapters_yielded += 1
+                yield last_processed_chapter
 
         # Store the current chapter details (it will be checked for overlap by the *next* iteration)
         last_processed_chapter = {'level': level, 'title': clean_title, 'text': cleaned_chapter_text}
 
-    # Add the very last processed chapter (which wasn't added in the loop)
-    if last_processed_chapter:
-        chapters.append(last_processed_chapter)
+    # Hand out the very last processed chapter (which wasn't yielded in the loop)
+    if last_processed_chapter and last_processed_chapter.get('text'):
+        chapters_yielded += 1
+        yield last_processed_chapter
 
-    # Filter out chapters that ended up empty after cleaning/overlap removal
-    final_chapters = [chap for chap in chapters if chap.get('text')]
-    print(f"  Finished structuring. Found {len(final_chapters)} non-empty chapters.")
-    return final_chapters
+    print(f"  Finished structuring. Found {chapters_yielded} non-empty chapters.")
 
-# --- Heuristic Chapter Splitting (Fallback for PDF without TOC) ---
-def split_text_into_heuristic_chapters(full_raw_text):
+def structure_pdf_by_toc(deduplicated_toc, all_pages_text, clean_workers=1):
     """
-    Attempts to split raw text into chapters based on heuristics like
-    multiple newlines or potential chapter-like headings.
+    Structures the PDF text into chapters based on TOC page numbers,
+    applies cleaning pipeline per chapter, and removes overlap.
 
     Args:
-        full_raw_text (str): The combined raw text from all PDF pages.
+        deduplicated_toc (list): List of [level, title, page_num] entries.
+        all_pages_text (list[str]): List of text content for each page.
+        clean_workers (int): Number of processes cleaning chapters concurrently.
 
     Returns:
-        list[dict]: List of chapters [{'title': 'Chapter N', 'text': cleaned_chunk}, ...],
-                    or an empty list if splitting fails or text is empty.
+        list[dict]: List of chapters, each {'level': int, 'title': str, 'text': str}.
     """
-    if not full_raw_text or not full_raw_text.strip():
-        return []
+    return list(iter_toc_chapters(deduplicated_toc, all_pages_text, clean_workers))
+
+# --- Heuristic Chapter Splitting (Fallback for PDF without TOC) ---
+HEURISTIC_BREAK_PATTERN = re.compile(r'\n\s*\n+') # Blank line(s): a likely section break
+
+def iter_heuristic_chunks(page_texts):
+    """
+    Splits the newline-joined page texts on HEURISTIC_BREAK_PATTERN incrementally,
+    yielding the same chunks as re.split over the fully joined text.
+
+    Only the text after the last non-whitespace character is rescanned when the next
+    page arrives, since a break can only extend through whitespace.
+    """
+    pieces = [] # Text of the current chunk, up to its last non-whitespace character
+    tail = "" # Trailing whitespace of the current chunk (a break may still start here)
+    for page_num, page_text in enumerate(page_texts):
+        scan_text = tail + "\n" + page_text if page_num else page_text
+        content_end = len(scan_text.rstrip())
+        if not content_end: # Only whitespace so far: a break could still grow
+            tail = scan_text
+            continue
+        pos = 0
+        for match in HEURISTIC_BREAK_PATTERN.finditer(scan_text, 0, content_end):
+            pieces.append(scan_text[pos:match.start()])
+            yield "".join(pieces)
+            pieces = []
+            pos = match.end()
+        pieces.append(scan_text[pos:content_end])
+        tail = scan_text[content_end:]
+    pieces.append(tail)
+    yield "".join(pieces)
+
+def iter_heuristic_chapters(page_texts, clean_workers=1):
+    """
+    Generator version of split_text_into_heuristic_chapters that works on an iterable
+    of page texts and yields each cleaned chapter as soon as its chunk is complete.
 
+    Args:
+        page_texts (Iterable[str]): Raw page texts, conceptually joined with newlines.
+        clean_workers (int): Processes cleaning chapters ahead (see iter_cleaned_chapters).
+
+    Yields:
+        dict: {'title': 'Chapter_N', 'level': None, 'text': cleaned_chunk} per chapter.
+    """
     print("    Attempting heuristic chapter splitting...")
 
     # --- Strategy 1: Split by multiple newlines (common section break) ---
-    # Use 3 or more newlines as a strong indicator of a major break.
+    # Blank lines are a strong indicator of a major break.
     # This needs to happen *before* aggressive whitespace cleaning.
-    potential_chunks = re.split(r'\n\s*\n+', full_raw_text) # 3+ newlines with optional whitespace
-
-    # --- Refine Chunks (Basic filtering) ---
-    chapters = []
-    chapter_count = 0
+    chapters_yielded = 0
     min_chunk_length = 100 # Avoid tiny fragments being called chapters
 
-    for i, chunk in enumerate(potential_chunks):
-        trimmed_chunk = chunk.strip()
-        if len(trimmed_chunk) > min_chunk_length:
-            chapter_count += 1
-            # Apply the full cleaning pipeline *to each chunk*
-            cleaned_chunk_text = clean_pipeline(trimmed_chunk)
-            if cleaned_chunk_text: # Ensure cleaning didn't make it empty
-                chapters.append({
-                    'title': f'Chapter_{chapter_count}', # Generic title
-                    'level': None, # No level info available
-                    'text': cleaned_chunk_text
-                })
-        # else: # Optional: Log discarded small chunks
-            # print(f"      Discarding small chunk {i+1} (length {len(trimmed_chunk)})")
-
+    def raw_chunks():
+        chapter_count = 0
+        for chunk in iter_heuristic_chunks(page_texts):
+            trimmed_chunk = chunk.strip()
+            if len(trimmed_chunk) > min_chunk_length:
+                chapter_count += 1
+                yield chapter_count, trimmed_chunk
+            # else: # Optional: Log discarded small chunks
+                # print(f"      Discarding small chunk (length {len(trimmed_chunk)})")
+
+    # Apply the full cleaning pipeline *to each chunk*
+    for chapter_count, cleaned_chunk_text, error in iter_cleaned_chapters(raw_chunks(), clean_workers):
+        if error:
+            raise error
+        if cleaned_chunk_text: # Ensure cleaning didn't make it empty
+            chapters_yielded += 1
+            yield {
+                'title': f'Chapter_{chapter_count}', # Generic title
+                'level': None, # No level info available
+                'text': cleaned_chunk_text
+            }
 
     # --- Alternative/Future Strategy (More Complex): Look for Header Patterns ---
     # This would involve regex for "CHAPTER X", "Part Y", lines in ALL CAPS, etc.
@@ -462,28 +1128,87 @@ def split_text_into_heuristic_chapters(full_raw_text):
     #             current_chapter_lines.append(line)
     #    # Process the last chapter
 
-    if chapters:
-        print(f"    Heuristically split into {len(chapters)} potential chapters.")
+    if chapters_yielded:
+        print(f"    Heuristically split into {chapters_yielded} potential chapters.")
     else:
         print("    Heuristic splitting did not yield significant chapters.")
 
-    return chapters
+def split_text_into_heuristic_chapters(full_raw_text, clean_workers=1):
+    """
+    Attempts to split raw text into chapters based on heuristics like
+    multiple newlines or potential chapter-like headings.
+
+    Args:
+        full_raw_text (str): The combined raw text from all PDF pages.
+        clean_workers (int): Number of processes cleaning chapters concurrently.
+
+    Returns:
+        list[dict]: List of chapters [{'title': 'Chapter N', 'text': cleaned_chunk}, ...],
+                    or an empty list if splitting fails or text is empty.
+    """
+    if not full_raw_text or not full_raw_text.strip():
+        return []
+    return list(iter_heuristic_chapters([full_raw_text], clean_workers))
+
+def iter_pdf_chapters(doc, use_toc=True, all_pages_text=None, clean_workers=1):
+    """
+    Yields cleaned PDF chapters one at a time: structured by the TOC when it is usable,
+    otherwise split heuristically.
+
+    Args:
+        doc (fitz.Document): The open PDF document.
+        use_toc (bool): Whether to try the Table of Contents first.
+        all_pages_text (Sequence[str], optional): Page texts already extracted (e.g. in
+            parallel). Defaults to a PdfPageTexts view that reads pages on demand.
+        clean_workers (int): Number of processes cleaning chapters concurrently.
+
+    Yields:
+        dict: Chapter dicts with 'level', 'title' and 'text', in order.
+    """
+    if all_pages_text is None:
+        all_pages_text = PdfPageTexts(doc)
+
+    start_time = time.perf_counter()
+    toc = get_toc(doc)
+    dedup_toc = deduplicate_toc(toc) if toc else []
+    if _profiler is not None:
+        _profiler.add("toc", time.perf_counter() - start_time)
+
+    if use_toc and dedup_toc:
+        print("  Attempting to structure PDF by TOC...")
+        toc_chapters = 0
+        for chapter in iter_toc_chapters(dedup_toc, all_pages_text, clean_workers):
+            toc_chapters += 1
+            yield chapter
+        if toc_chapters:
+            return
+        print("  Structuring by TOC resulted in no chapters. Will attempt fallback.")
+    else:
+        if not use_toc: print("  TOC usage disabled.")
+        elif not dedup_toc: print("  No usable TOC found.")
+        print("  Will attempt heuristic chapter splitting.")
+
+    # --- Heuristic Fallback ---
+    yield from iter_heuristic_chapters(all_pages_text, clean_workers)
 
 # --- EPUB Extraction ---
-# ... (Keep parse_epub_content UNCHANGED) ...
-def parse_epub_content(epub_path, progress_callback=None):
+def iter_epub_chapters(epub_path, progress_callback=None, clean_workers=1):
     """
-    Extracts and cleans text content from EPUB using BeautifulSoup.
+    Extracts and cleans text content from EPUB using BeautifulSoup, yielding each
+    chapter as soon as its spine document has been cleaned. With clean_workers > 1,
+    spine documents are cleaned concurrently in worker processes (order is kept).
 
-    Returns:
-        list[dict]: A list of chapters, each with 'title' (filename) and 'text'.
+    Yields:
+        dict: A chapter with 'title' (TOC title or filename) and 'text'.
     """
-    chapters = []
     print(f"  Processing EPUB: '{os.path.basename(epub_path)}'")
     extracted_files_count = 0
 
     try:
         with zipfile.ZipFile(epub_path, 'r') as epub_zip:
+            zip_names = epub_zip.namelist() # Read once; used for lookups in the spine loop
+            zip_name_set = set(zip_names)
+
             # Find the OPF file (usually content.opf)
             opf_path = None
             container_xml = epub_zip.read('META-INF/container.xml').decode('utf-8')
@@ -492,7 +1217,7 @@ def parse_epub_content(epub_path, progress_callback=None):
             if opf_relative_path and opf_relative_path.get('full-path'):
                  opf_path = opf_relative_path.get('full-path')
             else: # Fallback: search manually
-                for item in epub_zip.namelist():
+                for item in zip_names:
                      if item.lower().endswith('.opf'):
                         opf_path = item
                         break
@@ -500,7 +1225,7 @@ def parse_epub_content(epub_path, progress_callback=None):
             if not opf_path:
                 print("  Error: Could not find OPF file in EPUB via container.xml or direct search.")
                 # Fallback: process all HTML/XHTML files naively
-                content_files = sorted([f for f in epub_zip.namelist() if f.lower().endswith(('.html', '.xhtml', '.htm'))])
+                content_files = sorted([f for f in zip_names if f.lower().endswith(('.html', '.xhtml', '.htm'))])
                 manifest_items = {} # No manifest known
                 spine_order = content_files # Assume alphabetical order is spine order
                 opf_soup = None
@@ -587,54 +1312,64 @@ def parse_epub_content(epub_path, progress_callback=None):
             total_files_in_spine = len(spine_order_refs)
             processed_spine_files = 0
 
-            for i, idref in enumerate(spine_order_refs):
-                item = manifest_items.get(idref)
-                if not item:
-                    # If using fallback where spine_order contains filenames directly
-                    if idref in epub_zip.namelist() and idref.lower().endswith(('.html','.xhtml','.htm')):
-                        content_path = idref
-                        relative_href = idref # Use filename itself
-                        item_media_type = 'application/xhtml+xml' # Assume HTML
+            def raw_spine_texts():
+                nonlocal processed_spine_files
+                for i, idref in enumerate(spine_order_refs):
+                    item = manifest_items.get(idref)
+                    if not item:
+                        # If using fallback where spine_order contains filenames directly
+                        if idref in zip_name_set and idref.lower().endswith(('.html','.xhtml','.htm')):
+                            content_path = idref
+                            relative_href = idref # Use filename itself
+                            item_media_type = 'application/xhtml+xml' # Assume HTML
+                        else:
+                             print(f"    Skipping spine item: ID '{idref}' not found in manifest.")
+                             continue
                     else:
-                         print(f"    Skipping spine item: ID '{idref}' not found in manifest.")
-                         continue
-                else:
-                    item_media_type = item.get('media-type', '')
-                    if 'html' not in item_media_type and 'xml' not in item_media_type: # Allow xhtml and xml
-                        print(f"    Skipping non-HTML/XML spine item: {idref} ({item_media_type})")
+                        item_media_type = item.get('media-type', '')
+                        if 'html' not in item_media_type and 'xml' not in item_media_type: # Allow xhtml and xml
+                            print(f"    Skipping non-HTML/XML spine item: {idref} ({item_media_type})")
+                            continue
+                        relative_href = item.get('href')
+                        # Construct full path within zip relative to OPF directory
+                        content_path = os.path.normpath(os.path.join(epub_base_path, relative_href)).replace('\\', '/')
+
+                    if progress_callback:
+                        progress_callback(10 + int((processed_spine_files / max(1, total_files_in_spine)) * 80))
+
+                    try:
+                        html_content = epub_zip.read(content_path)
+                        print(f"    [{processed_spine_files+1}/{total_files_in_spine}] Reading: '{content_path}'")
+                        # Extract text with lxml (BeautifulSoup for malformed documents)
+                        raw_text = _run_stage("epub_parse", epub_document_to_text, html_content)
+                        processed_spine_files += 1
+
+                    except KeyError:
+                        print(f"    Error: File path not found in zip for idref '{idref}': '{content_path}'")
+                        continue
+                    except Exception as e:
+                        print(f"    Error processing content file '{content_path}': {e}")
+                        # traceback.print_exc() # Uncomment for detailed debug
                         continue
-                    relative_href = item.get('href')
-                    # Construct full path within zip relative to OPF directory
-                    content_path = os.path.normpath(os.path.join(epub_base_path, relative_href)).replace('\\', '/')
-
-                if progress_callback:
-                    progress_callback(10 + int((processed_spine_files / max(1, total_files_in_spine)) * 80))
-
-                try:
-                    html_content = epub_zip.read(content_path).decode('utf-8', errors='ignore')
-                    print(f"    [{processed_spine_files+1}/{total_files_in_spine}] Reading: '{content_path}'")
-                    # Extract text using BeautifulSoup
-                    raw_text = basic_html_to_text(html_content)
-                    # Apply full cleaning pipeline
-                    cleaned_text = clean_pipeline(raw_text)
-
-                    if cleaned_text: # Only add chapter if it has content
-                         # Use TOC title if available, otherwise fallback to filename
-                         chapter_title = toc_map.get(content_path, os.path.basename(relative_href))
-                         chapters.append({
-                             'title': chapter_title,
-                             'text': cleaned_text
-                         })
-                         extracted_files_count += 1
-                    else:
-                         print(f"      No text content extracted from '{content_path}'.")
-                    processed_spine_files += 1
 
-                except KeyError:
-                    print(f"    Error: File path not found in zip for idref '{idref}': '{content_path}'")
-                except Exception as e:
-                    print(f"    Error processing content file '{content_path}': {e}")
-                    # traceback.print_exc() # Uncomment for detailed debug
+                    yield (content_path, relative_href), raw_text
+
+            # Apply full cleaning pipeline (in order, possibly in parallel)
+            for (content_path, relative_href), cleaned_text, error in iter_cleaned_chapters(raw_spine_texts(), clean_workers):
+                if error:
+                    print(f"    Error processing content file '{content_path}': {error}")
+                    continue
+
+                if cleaned_text: # Only add chapter if it has content
+                     # Use TOC title if available, otherwise fallback to filename
+                     chapter_title = toc_map.get(content_path, os.path.basename(relative_href))
+                     extracted_files_count += 1
+                     yield {
+                         'title': chapter_title,
+                         'text': cleaned_text
+                     }
+                else:
+                     print(f"      No text content extracted from '{content_path}'.")
 
             print(f"  Successfully extracted text from {extracted_files_count} content files.")
             if progress_callback: progress_callback(95) # Near end before saving
@@ -647,66 +1382,242 @@ def parse_epub_content(epub_path, progress_callback=None):
         # traceback.print_exc() # Uncomment for detailed debug
         raise # Re-raise error
 
-    return chapters
+def parse_epub_content(epub_path, progress_callback=None, clean_workers=1):
+    """
+    Extracts and cleans text content from EPUB using BeautifulSoup.
+
+    Returns:
+        list[dict]: A list of chapters, each with 'title' (filename) and 'text'.
+    """
+    return list(iter_epub_chapters(epub_path, progress_callback, clean_workers))
 
 
 # --- Saving Functions ---
-# ... (Keep save_chapters_generic, save_whole_book_text UNCHANGED) ...
-def save_chapters_generic(chapters, book_name, output_dir):
-    """Saves chapters (list of dicts with 'title', 'text') to files."""
-    if not chapters:
-        print("  No chapters found or extracted to save.")
-        return
-    os.makedirs(output_dir, exist_ok=True)
-    num_chapters = len(chapters)
-    padding = len(str(num_chapters))
-    print(f"  Saving {num_chapters} chapters to '{output_dir}'...")
-
-    for idx, chapter in enumerate(chapters, 1):
-        # Title can come from TOC (PDF/EPUB) or filename (EPUB fallback)
-        # Level might exist for PDF chapters
-        level = chapter.get('level', None) # Get level if available
-        title = chapter.get('title', f'Chapter_{idx}')
-        text = chapter.get('text', '')
-
-        # Create a safer filename from the title
-        safe_title = re.sub(r'[^\w\s-]', '', title).strip() # Allow word chars, whitespace, hyphen
-        safe_title = re.sub(r'\s+', '_', safe_title) # Replace whitespace with underscore
-        if not safe_title: safe_title = f"chapter_{idx}"
-        # Truncate long filenames if necessary
-        max_len = 60 # Limit filename length slightly more generous
-        safe_title = safe_title[:max_len]
-
-        # Add level indicator to filename if present (e.g., for PDF subchapters)
-        level_prefix = f"L{level}_" if level is not None else ""
-        filename = f"{str(idx).zfill(padding)}_{level_prefix}{safe_title}.txt"
-        filepath = os.path.join(output_dir, filename)
+def chapter_file_stem(idx, chapter):
+    """Builds the part of a chapter filename after its number (level prefix and safe title)."""
+    # Title can come from TOC (PDF/EPUB) or filename (EPUB fallback)
+    # Level might exist for PDF chapters
+    level = chapter.get('level', None) # Get level if available
+    title = chapter.get('title', f'Chapter_{idx}')
+
+    # Create a safer filename from the title
+    safe_title = re.sub(r'[^\w\s-]', '', title).strip() # Allow word chars, whitespace, hyphen
+    safe_title = re.sub(r'\s+', '_', safe_title) # Replace whitespace with underscore
+    if not safe_title: safe_title = f"chapter_{idx}"
+    # Truncate long filenames if necessary
+    max_len = 60 # Limit filename length slightly more generous
+    safe_title = safe_title[:max_len]
+
+    # Add level indicator to filename if present (e.g., for PDF subchapters)
+    level_prefix = f"L{level}_" if level is not None else ""
+    return f"{level_prefix}{safe_title}.txt"
+
+def _write_text_file(path, text):
+    """Writes text to path as UTF-8, recorded as the "save" stage if profiling is on."""
+    start_time = time.perf_counter()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if _profiler is not None:
+        _profiler.add("save", time.perf_counter() - start_time, len(text), len(text))
+
+def save_chapters_streaming(chapters, output_dir, expected_count=None):
+    """
+    Saves chapters (iterable of dicts with 'title', 'text') to files as they are produced,
+    so only the chapter being written needs to be in memory.
+
+    Files are numbered like save_chapters_generic, zero-padded to the width of the total
+    chapter count. The total is only known at the end, so files are written with the width
+    of expected_count (an upper bound, if known) and renamed once if the final width differs.
+
+    Returns:
+        list[str]: Paths of the saved chapter files, in chapter order (empty if none).
+    """
+    padding = len(str(expected_count)) if expected_count else 1
+    saved_stems = [] # (idx, stem) of chapters written so far, for the final rename
+    num_chapters = 0
+
+    for num_chapters, chapter in enumerate(chapters, 1):
+        if num_chapters == 1:
+            os.makedirs(output_dir, exist_ok=True)
+            print(f"  Saving chapters to '{output_dir}' as they are extracted...")
+        stem = chapter_file_stem(num_chapters, chapter)
+        filename = f"{str(num_chapters).zfill(padding)}_{stem}"
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(text)
+            _write_text_file(os.path.join(output_dir, filename), chapter.get('text', ''))
+            saved_stems.append((num_chapters, stem))
         except Exception as e:
             print(f"    Error saving chapter '{filename}': {e}")
 
-    print(f"  Finished saving chapters.")
+    if not num_chapters:
+        print("  No chapters found or extracted to save.")
+        return []
+
+    final_padding = len(str(num_chapters))
+    padding_used = {} # idx -> padding, for chapters whose rename failed
+    if final_padding != padding:
+        for idx, stem in saved_stems:
+            try:
+                os.replace(
+                    os.path.join(output_dir, f"{str(idx).zfill(padding)}_{stem}"),
+                    os.path.join(output_dir, f"{str(idx).zfill(final_padding)}_{stem}")
+                )
+            except OSError as e:
+                print(f"    Error renaming chapter {idx}: {e}")
+                padding_used[idx] = padding
+
+    print(f"  Finished saving {num_chapters} chapters.")
+    return [
+        os.path.join(output_dir, f"{str(idx).zfill(padding_used.get(idx, final_padding))}_{stem}")
+        for idx, stem in saved_stems
+    ]
+
+def save_chapters_generic(chapters, book_name, output_dir):
+    """Saves chapters (list of dicts with 'title', 'text') to files. Returns the saved paths."""
+    if not chapters:
+        print("  No chapters found or extracted to save.")
+        return []
+    return save_chapters_streaming(chapters, output_dir, expected_count=len(chapters))
 
 def save_whole_book_text(full_text, book_name, output_dir):
-    """Cleans and saves the entire book text to a single file."""
+    """
+    Cleans and saves the entire book text to a single file. Returns its path, or None on error.
+    full_text may be a TextDocument; cleaning stages it has already been through are skipped.
+    """
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, f"{book_name}_full_text.txt")
-    print(f"  Cleaning full text...")
-    cleaned_full_text = clean_pipeline(full_text) # Apply cleaning pipeline
+    if isinstance(full_text, TextDocument):
+        if full_text.stages_run != ALL_CLEAN_STAGES:
+            print(f"  Cleaning full text...")
+        cleaned_full_text = clean_pipeline(full_text).text
+    else:
+        print(f"  Cleaning full text...")
+        cleaned_full_text = clean_pipeline(full_text) # Apply cleaning pipeline
     print(f"  Saving full text to '{output_file}'...")
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(cleaned_full_text)
+        _write_text_file(output_file, cleaned_full_text)
         print(f"  Full text saved.")
+        return output_file
     except Exception as e:
         print(f"  Error saving full text: {e}")
+        return None
+
+
+# --- Extraction Cache ---
+# Entries are zlib-compressed JSON, keyed by the SHA-256 of the source file plus every
+# option that changes the output. Raw page texts are cached separately from the final
+# files, so changing use_toc/extract_mode (or CLEAN_RULES_VERSION) skips page extraction.
+_extraction_cache = None
+
+def get_extraction_cache():
+    """Returns the process-wide extraction DiskCache (created on first use)."""
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = DiskCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
+    return _extraction_cache
+
+def clear_extraction_cache():
+    """
+    Deletes every cached extraction.
 
+    Returns:
+        tuple: (entry_count, total_bytes) removed.
+    """
+    cache = get_extraction_cache()
+    count, total = cache.stats()
+    cache.clear()
+    print(f"Cleared extraction cache: {count} entries, {total / (1024 * 1024):.1f} MB.")
+    return count, total
+
+def _cache_get_json(cache, key):
+    data = cache.get(key)
+    if data is None:
+        return None
+    try:
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+    except (zlib.error, ValueError) as e:
+        print(f"  Warning: Ignoring unreadable extraction cache entry: {e}")
+        return None
+
+def _cache_put_json(cache, key, value):
+    try:
+        cache.put(key, zlib.compress(json.dumps(value).encode('utf-8'), 1))
+    except OSError as e:
+        print(f"  Warning: Could not write extraction cache entry: {e}")
+
+def _pages_cache_key(source_hash):
+    return make_key("pages", source_hash, HEADER_THRESHOLD, FOOTER_THRESHOLD, CLEAN_RULES_VERSION)
+
+def _output_cache_key(source_hash, file_ext, book_name, use_toc, extract_mode):
+    # book_name is part of the key because it names the whole-book output file
+    return make_key("output", source_hash, file_ext, book_name, use_toc, extract_mode,
+                    HEADER_THRESHOLD, FOOTER_THRESHOLD, CLEAN_RULES_VERSION)
+
+def restore_cached_output(cache, key, output_dir):
+    """
+    Writes the files of a cached extraction into output_dir.
+
+    Returns:
+        int: Number of files restored (0 if the extraction is not cached).
+    """
+    entry = _cache_get_json(cache, key)
+    if not entry or not entry.get('files'):
+        return 0
+    os.makedirs(output_dir, exist_ok=True)
+    for filename, text in entry['files']:
+        _write_text_file(os.path.join(output_dir, filename), text)
+    print(f"  Restored {len(entry['files'])} files from the extraction cache.")
+    return len(entry['files'])
+
+def store_cached_output(cache, key, saved_paths):
+    """Stores the saved output files of an extraction under key."""
+    files = []
+    for path in saved_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            files.append([os.path.basename(path), f.read()])
+    _cache_put_json(cache, key, {'files': files})
 
 # --- Main Extraction Function ---
 
-def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="extracted_books", progress_callback=None):
+def _save_profile_report(profiler, output_dir, **info):
+    """Prints the stage timings of a finished extraction and saves them to output_dir as JSON."""
+    report = profiler.report(**info)
+    print_report(report)
+    report_path = os.path.join(output_dir, PROFILE_REPORT_NAME)
+    try:
+        write_report(report, report_path)
+        print(f"  Stage timing report saved to '{report_path}'.")
+    except OSError as e:
+        print(f"  Warning: Could not save stage timing report: {e}")
+
+def save_profile_summary(output_dirs, summary_path):
+    """
+    Aggregates the stage timing reports of several extracted books into one summary.
+
+    Args:
+        output_dirs (Iterable[str]): Output directories of books extracted with profile=True.
+        summary_path (str): Where to save the summary JSON.
+
+    Returns:
+        dict: The summary (see stage_profiler.summarize_reports), or None if no report was found.
+    """
+    reports = []
+    for output_dir in output_dirs:
+        report = read_report(os.path.join(output_dir, PROFILE_REPORT_NAME)) if output_dir else None
+        if report:
+            reports.append(report)
+    if not reports:
+        print("  No stage timing reports found to summarize.")
+        return None
+    summary = summarize_reports(reports)
+    print_report(summary)
+    try:
+        write_report(summary, summary_path)
+        print(f"  Stage timing summary of {len(reports)} books saved to '{summary_path}'.")
+    except OSError as e:
+        print(f"  Warning: Could not save stage timing summary: {e}")
+    return summary
+
+def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="extracted_books", progress_callback=None, num_workers=1, clean_workers=1, use_cache=False, profile=False):
     """
     Extracts text from PDF or EPUB files, cleans it, and saves chapters or whole text
     directly into the specified output_dir.
@@ -728,6 +1639,19 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
                           base is `output_dir`.
         progress_callback (callable, optional): A function to call with progress percentage
                                                 (0-100) or None on error. Defaults to None.
+        num_workers (int): Number of worker processes used to extract PDF pages.
+                           1 (default) extracts serially in the calling process.
+        clean_workers (int): Number of worker processes cleaning chapters concurrently
+                             (TOC, heuristic and EPUB chapters; order is preserved).
+                             1 (default) cleans serially in the calling process.
+        use_cache (bool): If True, reuse a previous extraction of the same file contents
+                          and options from the extraction cache, and store new results
+                          (raw PDF page texts and the saved files) in it. PDF pages are
+                          still read on demand and written to the cache as they are read.
+        profile (bool): If True, time each stage (page load, block filtering, each
+                        cleaning function, overlap removal, saving, ...) and count the
+                        characters going in and out of it. The timings are printed and
+                        saved as PROFILE_REPORT_NAME (JSON) in the output directory.
 
     Returns:
         str: The absolute path to the output directory used.
@@ -756,8 +1680,37 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
     print(f"    Output directory       : {absolute_output_dir}")
     print(f"    Use TOC                : {use_toc}")
     print(f"    Extraction Mode        : {extract_mode}")
+    print(f"    Worker Processes       : {num_workers}")
+    print(f"    Cleaning Processes     : {clean_workers}")
+    print(f"    Use Cache              : {use_cache}")
+
+    global _profiler
+    previous_profiler = _profiler
+    if profile:
+        _profiler = StageProfiler(os.path.basename(file_path))
+        profile_info = {
+            'file_path': os.path.abspath(file_path), 'extract_mode': extract_mode, 'use_toc': use_toc,
+            'num_workers': num_workers, 'clean_workers': clean_workers, 'use_cache': use_cache,
+        }
 
     try:
+        cache = None
+        page_recorder = None # Writes the raw page texts to the cache as they stream
+        saved_paths = [] # Output files written, for the cache
+        if use_cache:
+            cache = get_extraction_cache()
+            hash_start_time = time.perf_counter()
+            source_hash = hash_file(file_path)
+            if _profiler is not None:
+                _profiler.add("source_hash", time.perf_counter() - hash_start_time)
+            output_key = _output_cache_key(source_hash, file_ext, safe_book_name, use_toc, extract_mode)
+            if restore_cached_output(cache, output_key, absolute_output_dir):
+                elapsed_time = time.time() - start_time
+                print(f"--- Extraction completed in {elapsed_time:.2f} seconds (cached) ---")
+                if profile: _save_profile_report(_profiler, absolute_output_dir, cached=True, **profile_info)
+                if progress_callback: progress_callback(100)
+                return absolute_output_dir
+
         if file_ext == '.pdf':
             print("  Processing PDF file...")
             if progress_callback: progress_callback(5)
@@ -765,86 +1718,83 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
             print(f"  Opened PDF. Pages: {len(doc)}")
 
             if progress_callback: progress_callback(10)
-            # Always extract page by page first
-            all_pages_text = extract_pdf_text_by_page(doc)
-            print(f"  Extracted raw text from {len(all_pages_text)} pages.")
+            cached_pages = _cache_get_json(cache, _pages_cache_key(source_hash)) if cache else None
+            if cached_pages is not None:
+                all_pages_text = cached_pages
+                print(f"  Loaded raw text of {len(all_pages_text)} pages from the extraction cache.")
+            elif num_workers > 1 and len(doc) > 1:
+                # Extract every page up front, sharded across worker processes
+                all_pages_text = extract_pdf_text_by_page_parallel(file_path, len(doc), num_workers)
+                print(f"  Extracted raw text from {len(all_pages_text)} pages.")
+                if cache: _cache_put_json(cache, _pages_cache_key(source_hash), all_pages_text)
+            elif cache:
+                # Pages are still read on demand, and written to the cache entry as they are read
+                all_pages_text = page_recorder = RecordingPdfPageTexts(doc, cache.open_entry(_pages_cache_key(source_hash)))
+            else:
+                # Pages are read on demand, so only the chapter being built is held in memory
+                all_pages_text = PdfPageTexts(doc)
             if progress_callback: progress_callback(40)
 
             # --- Chapter Logic ---
-            pdf_chapters = []
-            toc_used = False
-
             if extract_mode == "chapters":
-                toc = get_toc(doc)
-                dedup_toc = deduplicate_toc(toc) if toc else []
-
-                if use_toc and dedup_toc:
-                    print("  Attempting to structure PDF by TOC...")
-                    if progress_callback: progress_callback(50)
-                    pdf_chapters = structure_pdf_by_toc(dedup_toc, all_pages_text)
-                    if progress_callback: progress_callback(85)
-                    if pdf_chapters:
-                        toc_used = True
-                    else:
-                        print("  Structuring by TOC resulted in no chapters. Will attempt fallback.")
-                else:
-                    if not use_toc: print("  TOC usage disabled.")
-                    elif not dedup_toc: print("  No usable TOC found.")
-                    print("  Will attempt heuristic chapter splitting.")
-
-                # --- Heuristic Fallback ---
-                if not toc_used:
-                    if progress_callback: progress_callback(50) # Show progress for heuristic attempt
-                    full_raw_text = "\n".join(all_pages_text) # Combine raw pages
-                    pdf_chapters = split_text_into_heuristic_chapters(full_raw_text)
-                    if progress_callback: progress_callback(85)
-
-                # --- Save Chapters (if found by either method) ---
-                if pdf_chapters:
-                    save_chapters_generic(pdf_chapters, safe_book_name, absolute_output_dir)
-                else:
-                    # If STILL no chapters after TOC and heuristic, save as whole
+                if progress_callback: progress_callback(50)
+                # Chapters are cleaned and written to disk one at a time (TOC first, heuristic fallback)
+                saved_paths = save_chapters_streaming(
+                    iter_pdf_chapters(doc, use_toc=use_toc, all_pages_text=all_pages_text, clean_workers=clean_workers),
+                    absolute_output_dir,
+                    expected_count=len(doc.get_toc()) or None
+                )
+                if progress_callback: progress_callback(85)
+
+                if not saved_paths:
+                    # If no chapters after TOC and heuristic, save as whole
                     print("  No chapters found via TOC or heuristics. Saving as whole book text.")
-                    full_raw_text = "\n".join(all_pages_text) # Combine raw pages again (splitter might have failed)
-                    save_whole_book_text(full_raw_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                    full_raw_text = TextDocument.from_pages(all_pages_text) # Combine raw pages
+                    saved_paths = [save_whole_book_text(full_raw_text, safe_book_name, absolute_output_dir)] # save_whole cleans the text
 
             # --- Whole Book Mode ---
             else: # extract_mode == "whole"
                 print("  Saving PDF as whole book text.")
                 if progress_callback: progress_callback(60)
-                full_text = "\n".join(all_pages_text) # Join all pages extracted earlier
-                save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                full_text = TextDocument.from_pages(all_pages_text) # Join all pages
+                saved_paths = [save_whole_book_text(full_text, safe_book_name, absolute_output_dir)] # save_whole cleans the text
 
+            if page_recorder is not None:
+                page_recorder.finish() # Before closing the document: pages no chapter needed are read now
             doc.close()
             if progress_callback: progress_callback(95)
 
         elif file_ext == '.epub':
-            # --- EPUB Processing (largely unchanged) ---
             print("  Processing EPUB file...")
-            epub_chapters = parse_epub_content(file_path, progress_callback)
-
-            if not epub_chapters:
-                 print("  Warning: No content extracted from EPUB.")
+            epub_chapters = iter_epub_chapters(file_path, progress_callback, clean_workers)
 
             if extract_mode == "chapters":
-                 if epub_chapters:
-                     save_chapters_generic(epub_chapters, safe_book_name, absolute_output_dir)
-                 else:
+                 # Each spine document is cleaned and written to disk before the next one is read
+                 saved_paths = save_chapters_streaming(epub_chapters, absolute_output_dir)
+                 if not saved_paths:
+                     print("  Warning: No content extracted from EPUB.")
                      print("  No EPUB chapters extracted, nothing to save in chapter mode.")
             else: # extract_mode == "whole"
-                 if epub_chapters:
+                 # Join chapters with double newline for paragraph separation between files
+                 full_text = "\n\n".join(chap['text'] for chap in epub_chapters if chap.get('text'))
+                 if full_text:
                      print("  Combining EPUB chapters into whole book text...")
-                     # Join chapters with double newline for paragraph separation between files
-                     full_text = "\n\n".join([chap['text'] for chap in epub_chapters if chap.get('text')])
-                     save_whole_book_text(full_text, safe_book_name, absolute_output_dir) # save_whole cleans the text
+                     # The chapters are already cleaned, so the combined text is not cleaned again
+                     full_text = TextDocument(full_text, stages_run=ALL_CLEAN_STAGES)
+                     saved_paths = [save_whole_book_text(full_text, safe_book_name, absolute_output_dir)]
                  else:
+                      print("  Warning: No content extracted from EPUB.")
                       print("  No EPUB content extracted, nothing to save in whole book mode.")
 
         else:
             raise ValueError(f"Unsupported file format: '{file_ext}'. Supported: .pdf, .epub")
 
+        if cache and saved_paths and None not in saved_paths:
+            store_cached_output(cache, output_key, saved_paths)
+
         elapsed_time = time.time() - start_time
         print(f"--- Extraction completed in {elapsed_time:.2f} seconds ---")
+        if profile: _save_profile_report(_profiler, absolute_output_dir, cached=False, **profile_info)
         if progress_callback: progress_callback(100)
         return absolute_output_dir # Return the absolute path
 
@@ -853,6 +1803,103 @@ def extract_book(file_path, use_toc=True, extract_mode="chapters", output_dir="e
         traceback.print_exc() # Print full traceback for easier debugging
         if progress_callback: progress_callback(None) # Indicate error
         raise # Re-raise the exception
+    finally:
+        if page_recorder is not None:
+            page_recorder.discard() # No-op once stored
+        _profiler = previous_profiler
+
+def iter_book_chapters(file_path, use_toc=True, progress_callback=None, num_workers=1, clean_workers=1):
+    """
+    Streams the cleaned chapters of a PDF or EPUB one at a time, without saving them.
+
+    PDFs are structured by TOC (if use_toc and available) with a heuristic fallback;
+    EPUBs follow the spine order. Peak memory is bounded by the largest chapter
+    (plus the raw page texts when num_workers > 1 extracts a PDF in parallel).
+
+    Args:
+        file_path (str): Path to the input PDF or EPUB file.
+        use_toc (bool): If True (and PDF), try the Table of Contents first.
+        progress_callback (callable, optional): EPUB progress callback (0-100).
+        num_workers (int): Worker processes for PDF page extraction.
+        clean_workers (int): Worker processes cleaning chapters concurrently.
+
+    Yields:
+        dict: Chapter dicts with 'title', 'text' and (PDF only) 'level'.
+
+    Raises:
+        FileNotFoundError: If the input file does not exist.
+        ValueError: If the file format is unsupported or the EPUB is invalid.
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError(f"Input file not found: '{file_path}'")
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext == '.pdf':
+        with fitz.open(file_path) as doc:
+            all_pages_text = None
+            if num_workers > 1 and len(doc) > 1:
+                all_pages_text = extract_pdf_text_by_page_parallel(file_path, len(doc), num_workers)
+            yield from iter_pdf_chapters(doc, use_toc=use_toc, all_pages_text=all_pages_text, clean_workers=clean_workers)
+    elif file_ext == '.epub':
+        yield from iter_epub_chapters(file_path, progress_callback, clean_workers)
+    else:
+        raise ValueError(f"Unsupported file format: '{file_ext}'. Supported: .pdf, .epub")
+
+def _extract_book_worker(job):
+    """Worker: runs extract_book for one job dict in a separate process."""
+    return extract_book(**job)
+
+def extract_books(jobs, num_workers=1, cancellation_flag=None, book_callback=None, profile_summary_path=None):
+    """
+    Extracts several books, running up to num_workers books at once in
+    separate processes. Each book is extracted serially within its worker.
+
+    Args:
+        jobs (list[dict]): Keyword arguments for extract_book, one dict per book
+                           (file_path, use_toc, extract_mode, output_dir).
+        num_workers (int): Number of books extracted concurrently.
+        cancellation_flag (callable, optional): Function returning True to cancel.
+                                                Books not yet started are dropped.
+        book_callback (callable, optional): Called as (job_index, output_dir) each
+                                            time a book finishes, in completion order.
+        profile_summary_path (str, optional): If given, every book is extracted with
+                                              profile=True and the per-book stage timings
+                                              are aggregated into this JSON file.
+
+    Returns:
+        list[str]: The output directory of each job, in the order of `jobs`.
+
+    Raises:
+        InterruptedError: If cancelled before all books finished.
+        Exception: The first error raised while extracting a book.
+    """
+    results = [None] * len(jobs)
+    if profile_summary_path:
+        jobs = [dict(job, profile=True) for job in jobs]
+    if num_workers <= 1:
+        for job_index, job in enumerate(jobs):
+            if cancellation_flag and cancellation_flag():
+                raise InterruptedError("Batch extraction cancelled")
+            results[job_index] = extract_book(**job)
+            if book_callback: book_callback(job_index, results[job_index])
+        if profile_summary_path: save_profile_summary(results, profile_summary_path)
+        return results
+
+    print(f"  Extracting {len(jobs)} books with {num_workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker_process) as executor:
+        futures = {executor.submit(_extract_book_worker, job): job_index for job_index, job in enumerate(jobs)}
+        try:
+            for future in as_completed(futures):
+                if cancellation_flag and cancellation_flag():
+                    raise InterruptedError("Batch extraction cancelled")
+                job_index = futures[future]
+                results[job_index] = future.result() # Re-raises errors from the worker
+                if book_callback: book_callback(job_index, results[job_index])
+        except BaseException:
+            for future in futures:
+                future.cancel() # Drop books that have not started yet
+            raise
+    if profile_summary_path: save_profile_summary(results, profile_summary_path)
+    return results
 
 # --- Example Usage (commented out) ---
 '''
@@ -4,13 +4,54 @@ import os
 import time
 import numpy as np
 import torch
-import soundfile as sf
 import re # Needed for split_pattern if used differently
 import traceback # For more detailed error logging
-from kokoro import KPipeline # Assuming KPipeline handles device internally or takes it as arg
+import threading
+import json
+import struct
+import queue
+import multiprocessing
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+import kokoro
+import misaki
+from kokoro import KModel, KPipeline # Assuming KPipeline handles device internally or takes it as arg
+from disk_cache import CACHE_ROOT, DiskCache, SqliteCache, make_key
+from audio_encoder import (
+    DEFAULT_ENCODE_QUALITY, ENCODE_BLOCK_SAMPLES, BackgroundEncoder, check_output_format, describe_output_format,
+    encode_audio, encodes_in_background, rescale_audio
+)
+from loudness import GAIN_TOLERANCE_DB, LoudnessMeter, book_gain, gated_loudness, read_loudness_log, write_loudness_log
 
 # --- Constants ---
 DEFAULT_SAMPLE_RATE = 24000
+DEFAULT_REPO_ID = 'hexgrad/Kokoro-82M'
+PIPELINE_IDLE_TIMEOUT = 600 # Seconds an unused pipeline stays loaded before it is evicted
+WARMUP_TEXT = "Hello there." # Short sentence run once through a new pipeline to warm it up
+PEAK_HEADROOM = 0.95 # Output audio is peak-normalized to this fraction of full scale
+PARTIAL_AUDIO_SUFFIX = ".part.f32" # Raw float32 samples of an output file still being synthesized
+JOURNAL_SUFFIX = ".journal" # Sidecar checkpoint journal of an output file still being synthesized
+AUDIO_CACHE_DIR = os.path.join(CACHE_ROOT, "audio")
+AUDIO_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024 # 2 GB (about 6 hours of float32 audio), least recently used entries are evicted beyond this
+AUDIO_CACHE_FORMAT_VERSION = 1 # Bump when the entry layout or the synthesis around the pipeline changes
+PHONEME_CACHE_PATH = os.path.join(CACHE_ROOT, "phonemes.sqlite3")
+PHONEME_CACHE_MAX_BYTES = 256 * 1024 * 1024 # 256 MB (about a million sentences), least recently used entries are evicted beyond this
+PHONEME_CACHE_FORMAT_VERSION = 1 # Bump when the entry layout or the text normalization changes
+FARM_POLL_INTERVAL = 0.2 # Seconds between progress/pause/cancel checks while worker processes synthesize
+DEFAULT_BATCH_SIZE = 8 # Phoneme sequences per forward pass in batched mode
+BATCH_WINDOW_FACTOR = 4 # Batched mode sorts batch_size * this many segments by length at a time
+BATCH_FRAME_TOLERANCE = 0.1 # Sequences share a decoder pass if their frame counts differ by at most this fraction
+STAGE_QUEUE_SIZE = 16 # Items each synthesis stage (G2P, inference, writer) may run ahead of the next
+STAGE_POLL_INTERVAL = 0.1 # Seconds between stop checks of a synthesis stage blocked on a queue or pause
+PARAGRAPH_BREAK_PATTERN = re.compile(r'\n[ \t]*\n') # Blank line between paragraphs in extracted text
+CPU_TUNE_TEXT = "The old lighthouse keeper climbed the stairs slowly, counting each step as he went." # Sentence timed by tune_cpu_threads
+CPU_TUNE_RUNS = 2 # Timed runs per candidate thread count (the fastest counts)
+QUALITY_CHECK_TEXT = "It was a bright cold day in April, and the clocks were striking thirteen." # Compared between fp32 and int8 models
+QUALITY_CHECK_SEED = 0 # Torch seed for both quality check runs, so the source noise matches
+SILENCE_THRESHOLD_DB = -40 # Frames this far below a chunk's loudest frame count as silence when trimming
+SILENCE_FRAME_SAMPLES = DEFAULT_SAMPLE_RATE // 100 # 10 ms frames for the trimming energy measure
+SILENCE_MARGIN_SAMPLES = DEFAULT_SAMPLE_RATE * 30 // 1000 # 30 ms kept around speech, so soft onsets and endings stay
+DEFAULT_PAUSES = {'sentence': 0.3, 'paragraph': 0.8, 'chapter': 2.0} # Seconds of silence between trimmed chunks / at the end of a file
 
 # --- Helper Functions ---
 
@@ -31,6 +72,1335 @@ def available_voices():
         "pf_dora", "pm_alex", "pm_santa"
     ]
 
+# --- Device Selection ---
+# The usable devices are probed once per process. "auto" resolves to the GPU when one
+# works and to the CPU otherwise; a device that fails to initialize a pipeline is
+# dropped, so the rest of the run (and later runs) go straight to the CPU.
+_usable_devices = None # Probed by available_devices()
+
+def available_devices():
+    """
+    Returns the devices Kokoro can run on in this process, preferred first (the CPU last).
+
+    CUDA counts only if a tensor can actually be allocated on it, so a driver or build
+    mismatch is found here rather than halfway through loading the model.
+    """
+    global _usable_devices
+    if _usable_devices is None:
+        _usable_devices = []
+        if torch.cuda.is_available():
+            try:
+                torch.zeros(1, device="cuda")
+                _usable_devices.append("cuda")
+            except Exception as e:
+                print(f"  Note: CUDA is present but unusable ({e}).")
+        _usable_devices.append("cpu")
+    return list(_usable_devices)
+
+def resolve_device(device="auto"):
+    """
+    Returns the concrete device to use for a requested one.
+
+    Args:
+        device (str): 'auto' (or None) for the best available device, or 'cuda'/'cpu'.
+                      An unavailable 'cuda' resolves to 'cpu' (with a note).
+
+    Returns:
+        str: 'cuda' or 'cpu'.
+    """
+    usable = available_devices()
+    if device in (None, "auto"):
+        return usable[0]
+    if device not in usable and device.split(":")[0] not in usable:
+        print(f"  Note: device '{device}' is not available; using the CPU.")
+        return "cpu"
+    return device
+
+def acquire_pipeline_with_fallback(lang_code, device="auto", repo_id=DEFAULT_REPO_ID, warm_up=True, voice=None,
+                                   quantize=False):
+    """
+    acquire_pipeline on the resolved device, falling back to the CPU if the pipeline
+    cannot be initialized there (e.g. out of GPU memory, driver errors).
+
+    Returns:
+        tuple: (pipeline, device). Pass the device to release_pipeline.
+
+    Raises:
+        ValueError: If lang_code is invalid.
+        Exception: If the pipeline cannot be initialized on the CPU either.
+    """
+    device = resolve_device(device)
+    try:
+        return acquire_pipeline(lang_code, device, repo_id, warm_up=warm_up, voice=voice, quantize=quantize), device
+    except RuntimeError as e:
+        if device == "cpu":
+            raise
+        print(f"  Warning: Could not initialize the pipeline on '{device}': {e}")
+        print("  Falling back to the CPU for the rest of this session.")
+        if device in _usable_devices:
+            _usable_devices.remove(device)
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache() # Free what the failed load allocated
+        return acquire_pipeline(lang_code, "cpu", repo_id, warm_up=warm_up, voice=voice, quantize=quantize), "cpu"
+
+# --- Pipeline Registry ---
+# One KPipeline per (lang_code, device, repo_id, quantize) for the whole process, so a batch
+# of books (and every voice test) loads the model once. Pipelines of different languages on
+# the same device and repo share a single KModel; only the G2P part is per language.
+_pipelines = {} # (lang_code, device, repo_id, quantize) -> {'pipeline', 'users', 'last_used', 'warm'}
+_pipelines_lock = threading.RLock()
+_eviction_timer = None # Pending evict_idle_pipelines check, restarted by each release_pipeline
+
+def _default_voice(lang_code):
+    """Returns the first known voice of a language (voice names start with their lang_code)."""
+    for voice in available_voices():
+        if voice.startswith(lang_code):
+            return voice
+    return None
+
+def _loaded_model(device, repo_id, quantize):
+    """Returns the KModel of a loaded pipeline with this device, repo and precision, or None."""
+    for (_, other_device, other_repo_id, other_quantize), entry in _pipelines.items():
+        if (other_device, other_repo_id, other_quantize) == (device, repo_id, quantize) and entry['pipeline'].model is not None:
+            return entry['pipeline'].model
+    return None
+
+def _load_pipeline(lang_code, device, repo_id, quantize=False):
+    """
+    Creates a KPipeline, reusing the KModel of a loaded pipeline with the same device, repo
+    and precision. A new int8 model is quantized from the fp32 one (see quantize_model).
+    """
+    shared_model = _loaded_model(device, repo_id, quantize)
+    shared_note = " (sharing the loaded model)" if shared_model is not None else ""
+    precision_note = ", int8" if quantize else ""
+    print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'{precision_note}{shared_note}...")
+    init_start_time = time.time()
+    if shared_model is None and quantize:
+        # Start from the loaded fp32 model, if any; it is left unchanged
+        shared_model = _loaded_model(device, repo_id, False)
+    pipeline = KPipeline(lang_code=lang_code, repo_id=repo_id, model=shared_model if shared_model is not None else True, device=device)
+    print(f"  Pipeline initialized in {time.time() - init_start_time:.2f}s.")
+    if quantize and not shared_note:
+        reference_model = pipeline.model
+        try:
+            pipeline.model = quantize_model(reference_model)
+        except Exception as e: # E.g. no quantized engine on this platform
+            print(f"  Warning: int8 quantization failed, using the fp32 model: {e}")
+            return pipeline
+        print("  Linear layers quantized to int8.")
+        try:
+            drift = measure_output_drift(pipeline, reference_model)
+            print(f"  Int8 quality check: {format_output_drift(drift)}")
+        except Exception as e:
+            print(f"  Warning: int8 quality check failed: {e}")
+    return pipeline
+
+def warm_up_pipeline(pipeline, voice=None):
+    """
+    Runs WARMUP_TEXT through a pipeline and discards the audio, so one-off costs (voice
+    loading, G2P and kernel initialization) are paid before the first real sentence.
+
+    Args:
+        pipeline (KPipeline): The pipeline to warm up.
+        voice (str, optional): Voice to load. Defaults to the first voice of the pipeline's language.
+    """
+    voice = voice or _default_voice(pipeline.lang_code)
+    if not voice or pipeline.model is None:
+        return
+    warmup_start_time = time.time()
+    for _ in pipeline(WARMUP_TEXT, voice=voice):
+        pass
+    print(f"  Pipeline warmed up in {time.time() - warmup_start_time:.2f}s.")
+
+def get_pipeline(lang_code, device="auto", repo_id=DEFAULT_REPO_ID, warm_up=False, voice=None, quantize=False):
+    """
+    Returns the process-wide KPipeline for (lang_code, device, repo_id, quantize), loading it on first use.
+
+    While generating, use acquire_pipeline()/release_pipeline() instead, so the pipeline
+    cannot be evicted while in use.
+
+    Args:
+        lang_code (str): Kokoro language code (e.g., 'a', 'b', 'j').
+        device (str): Computation device ('auto', 'cuda' or 'cpu'; see resolve_device).
+        repo_id (str): Hugging Face repository of the model.
+        warm_up (bool): If True, run warm_up_pipeline the first time the pipeline is handed out this way.
+        voice (str, optional): Voice used for the warm-up.
+        quantize (bool): Use a model with int8 linear layers (CPU only, ignored on other
+                         devices). Its drift from the fp32 model is reported when loaded.
+
+    Returns:
+        KPipeline: The shared pipeline.
+
+    Raises:
+        ValueError: If lang_code is invalid.
+        Exception: For other errors during pipeline initialization.
+    """
+    device = resolve_device(device)
+    if quantize and device != "cpu":
+        print(f"  Note: int8 quantization is only used on the CPU; device='{device}' keeps the fp32 model.")
+        quantize = False
+    key = (lang_code, device, repo_id, quantize)
+    with _pipelines_lock:
+        evict_idle_pipelines()
+        entry = _pipelines.get(key)
+        if entry is None:
+            try:
+                pipeline = _load_pipeline(lang_code, device, repo_id, quantize)
+            except AssertionError as e:
+                # Catch assertion errors specifically, often related to invalid lang_code
+                print(f"  Error: Invalid language code '{lang_code}' provided for KPipeline.")
+                print(f"  Details: {e}")
+                raise ValueError(f"Invalid language code: {lang_code}") from e
+            entry = _pipelines[key] = {'pipeline': pipeline, 'users': 0, 'last_used': time.time(), 'warm': False}
+        else:
+            print(f"  Reusing loaded Kokoro pipeline for lang='{lang_code}' on device='{device}'.")
+        if warm_up and not entry['warm']:
+            warm_up_pipeline(entry['pipeline'], voice)
+            entry['warm'] = True
+        entry['last_used'] = time.time()
+        return entry['pipeline']
+
+def acquire_pipeline(lang_code, device="auto", repo_id=DEFAULT_REPO_ID, warm_up=True, voice=None, quantize=False):
+    """
+    Like get_pipeline (warming up by default), but marks the pipeline as in use so it is
+    never evicted until the matching release_pipeline() call.
+    """
+    device = resolve_device(device)
+    with _pipelines_lock:
+        pipeline = get_pipeline(lang_code, device, repo_id, warm_up=warm_up, voice=voice, quantize=quantize)
+        _pipelines[(lang_code, device, repo_id, quantize and device == "cpu")]['users'] += 1
+    return pipeline
+
+def release_pipeline(lang_code, device="auto", repo_id=DEFAULT_REPO_ID, quantize=False):
+    """
+    Ends one acquire_pipeline() use. The pipeline stays loaded for reuse and is evicted
+    once it has been idle for PIPELINE_IDLE_TIMEOUT seconds.
+    """
+    global _eviction_timer
+    device = resolve_device(device)
+    with _pipelines_lock:
+        entry = _pipelines.get((lang_code, device, repo_id, quantize and device == "cpu"))
+        if entry:
+            entry['users'] = max(0, entry['users'] - 1)
+            entry['last_used'] = time.time()
+        # Check again once the timeout has passed, in case nothing else uses the registry by then.
+        # One timer for the whole registry: this release is the latest, so the check moves after it.
+        if _eviction_timer is not None:
+            _eviction_timer.cancel()
+        _eviction_timer = threading.Timer(PIPELINE_IDLE_TIMEOUT + 1, evict_idle_pipelines)
+        _eviction_timer.daemon = True
+        _eviction_timer.start()
+
+def evict_idle_pipelines(max_idle=None):
+    """
+    Drops the pipelines that are not in use and have been idle for at least max_idle
+    seconds (default PIPELINE_IDLE_TIMEOUT).
+
+    Returns:
+        int: Number of pipelines evicted.
+    """
+    if max_idle is None: max_idle = PIPELINE_IDLE_TIMEOUT
+    now = time.time()
+    with _pipelines_lock:
+        idle_keys = [
+            key for key, entry in _pipelines.items()
+            if entry['users'] == 0 and now - entry['last_used'] >= max_idle
+        ]
+        for key in idle_keys:
+            del _pipelines[key]
+            print(f"  Evicted idle Kokoro pipeline for lang='{key[0]}' on device='{key[1]}'.")
+    if idle_keys and torch.cuda.is_available():
+        torch.cuda.empty_cache() # Hand the freed model memory back to the driver
+    return len(idle_keys)
+
+def release_pipelines():
+    """Drops every pipeline that is not in use, however recently it was used. Returns the count."""
+    return evict_idle_pipelines(max_idle=0)
+
+# --- CPU Fast Mode ---
+# For CPU-only synthesis: inference runs under torch.inference_mode (no autograd
+# bookkeeping at all), the thread count is picked by timing a short calibration sentence,
+# and optionally the model's linear layers are quantized to int8 (dynamic quantization:
+# int8 weights, activations quantized on the fly). Quantized models get their own
+# registry entries, and their drift from the fp32 model is reported when they are loaded.
+_tuned_cpu_threads = None # Thread count picked by tune_cpu_threads in this process
+
+def quantize_model(model):
+    """Returns a copy of a KModel with its torch.nn.Linear layers dynamically quantized to int8."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _synthesize_check_audio(pipeline, text, voice, model=None):
+    torch.manual_seed(QUALITY_CHECK_SEED)
+    chunks = [result.audio for result in pipeline(text, voice=voice, model=model) if result.audio is not None]
+    return torch.cat(chunks).numpy().astype(np.float64) if chunks else np.zeros(0)
+
+def _log_spectrogram(audio):
+    """Log-magnitude spectrogram (dB) of float audio: one row per 10 ms frame."""
+    frame_size, hop = 1024, DEFAULT_SAMPLE_RATE // 100
+    audio = np.pad(audio, (0, max(0, frame_size - len(audio))))
+    num_frames = 1 + (len(audio) - frame_size) // hop
+    frames = np.lib.stride_tricks.as_strided(
+        audio, shape=(num_frames, frame_size), strides=(audio.strides[0] * hop, audio.strides[0])
+    )
+    magnitude = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1))
+    return 20 * np.log10(np.maximum(magnitude, 1e-5))
+
+def measure_output_drift(pipeline, reference_model, voice=None, text=QUALITY_CHECK_TEXT):
+    """
+    Compares the audio of a pipeline's model with that of a reference (fp32) model.
+
+    Both runs use the same torch seed, so the noise of the model's source module matches.
+
+    Args:
+        pipeline (KPipeline): Pipeline with the model to check.
+        reference_model (KModel): The model to compare with (run through the same pipeline).
+        voice (str, optional): Voice to use. Defaults to the first voice of the pipeline's language.
+        text (str): Text to synthesize.
+
+    Returns:
+        dict: 'duration_change' (fraction of the reference length), 'snr_db' (reference
+              to difference power ratio; None if the lengths differ, as the audio is then
+              not aligned) and 'spectral_distance_db' (RMS difference of the log-magnitude
+              spectrograms over the common frames, which tolerates small misalignment).
+    """
+    voice = voice or _default_voice(pipeline.lang_code)
+    reference = _synthesize_check_audio(pipeline, text, voice, model=reference_model)
+    audio = _synthesize_check_audio(pipeline, text, voice)
+    if not len(reference) or not len(audio):
+        raise ValueError("The quality check text produced no audio.")
+    return compare_audio([reference], [audio])
+
+def compare_audio(references, audios):
+    """
+    Measures how far pieces of audio drift from their reference audio.
+
+    Args:
+        references (list[np.ndarray]): Reference float audio of each piece (e.g. sentence).
+        audios (list[np.ndarray]): Audio of the same pieces to compare, in the same order.
+
+    Returns:
+        dict: As measure_output_drift, over all pieces: the duration change of their total
+              length, the SNR over all samples (None if any piece changed length) and the
+              spectral distance over the common frames of every piece.
+    """
+    reference_length = sum(len(reference) for reference in references)
+    snr_db = None
+    if all(len(audio) == len(reference) for reference, audio in zip(references, audios)):
+        noise_power = sum(np.sum((audio - reference) ** 2) for reference, audio in zip(references, audios))
+        signal_power = sum(np.sum(reference ** 2) for reference in references)
+        snr_db = float('inf') if noise_power == 0 else 10 * np.log10(signal_power / noise_power)
+    squared_distance = num_frames = 0
+    for reference, audio in zip(references, audios):
+        reference_spectrogram, spectrogram = _log_spectrogram(reference), _log_spectrogram(audio)
+        common_frames = min(len(reference_spectrogram), len(spectrogram))
+        squared_distance += np.sum(np.mean((reference_spectrogram[:common_frames] - spectrogram[:common_frames]) ** 2, axis=1))
+        num_frames += common_frames
+    return {
+        'duration_change': (sum(len(audio) for audio in audios) - reference_length) / reference_length,
+        'snr_db': snr_db,
+        'spectral_distance_db': float(np.sqrt(squared_distance / num_frames)) if num_frames else 0.0,
+    }
+
+def format_output_drift(drift):
+    """One-line summary of a measure_output_drift result."""
+    snr = f"SNR {drift['snr_db']:.1f} dB" if drift['snr_db'] is not None else "SNR n/a (length changed)"
+    return (f"duration {drift['duration_change'] * 100:+.1f}%, {snr}, "
+            f"log-spectral distance {drift['spectral_distance_db']:.2f} dB")
+
+def tune_cpu_threads(pipeline, voice=None, candidates=None):
+    """
+    Picks the torch thread count that synthesizes CPU_TUNE_TEXT fastest and applies it.
+
+    The result is kept for the process, so later calls return it without timing again.
+    Inter-op parallelism is set to one thread where torch still allows it: the model
+    does not use it, and it would compete with the intra-op threads.
+
+    Args:
+        pipeline (KPipeline): A (warmed up) CPU pipeline.
+        voice (str, optional): Voice to use. Defaults to the first voice of the pipeline's language.
+        candidates (list[int], optional): Thread counts to try. Defaults to all, three
+                                          quarters, half and a quarter of the available CPUs.
+
+    Returns:
+        int: The thread count now set with torch.set_num_threads.
+    """
+    global _tuned_cpu_threads
+    if _tuned_cpu_threads is not None:
+        torch.set_num_threads(_tuned_cpu_threads)
+        return _tuned_cpu_threads
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass # Only possible before the first inter-op parallel work
+    if candidates is None:
+        num_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        candidates = sorted({max(1, num_cpus * share // 4) for share in (4, 3, 2, 1)}, reverse=True)
+    voice = voice or _default_voice(pipeline.lang_code)
+
+    timings = {}
+    with torch.inference_mode():
+        for num_threads in candidates:
+            torch.set_num_threads(num_threads)
+            runs = []
+            for _ in range(CPU_TUNE_RUNS if len(candidates) > 1 else 0):
+                start_time = time.time()
+                for _ in pipeline(CPU_TUNE_TEXT, voice=voice):
+                    pass
+                runs.append(time.time() - start_time)
+            timings[num_threads] = min(runs, default=0.0)
+    _tuned_cpu_threads = min(timings, key=timings.get)
+    torch.set_num_threads(_tuned_cpu_threads)
+    if len(timings) > 1:
+        summary = ", ".join(f"{num_threads}: {timing:.2f}s" for num_threads, timing in timings.items())
+        print(f"  CPU threads tuned: using {_tuned_cpu_threads} ({summary})")
+    return _tuned_cpu_threads
+
+# --- Streaming Audio Writer ---
+
+class StreamingAudioWriter:
+    """
+    Writes synthesized audio to disk chunk by chunk, so memory use does not grow with
+    the length of the file.
+
+    Chunks are appended as raw float32 samples to a temporary file next to the output
+    while the running peak and block loudness (see loudness.LoudnessMeter) are tracked.
+    finish() then makes one pass over that file, applies the peak-normalizing gain (to
+    PEAK_HEADROOM of full scale, as int16) and writes the final audio file atomically
+    (temp + rename; see audio_encoder.encode_audio), or hands that pass to an encoder in
+    another process, which may also replace the gain (see BookLoudnessNormalizer).
+
+    With journal_info, checkpoint() records the progress made so far in a sidecar journal
+    (JOURNAL_SUFFIX), and a writer created with resume=True for the same output and
+    journal_info continues from the last checkpoint instead of starting over.
+    """
+
+    def __init__(self, output_path, samplerate=DEFAULT_SAMPLE_RATE, journal_info=None, resume=False,
+                 trailing_silence=0.0):
+        """
+        Args:
+            output_path (str): Final audio file (its extension selects the format).
+            samplerate (int): Sample rate of the audio.
+            journal_info (dict, optional): JSON-serialisable description of what is being
+                synthesized (text hash, voice, ...). A checkpoint is only resumed if its
+                journal was written with an equal journal_info. None disables the journal.
+            resume (bool): Continue from the last checkpoint, if there is a usable one.
+            trailing_silence (float): Seconds of silence added after the audio when the
+                output is written (e.g. the pause after a chapter).
+        """
+        self.output_path = output_path
+        self.samplerate = samplerate
+        self.trailing_samples = round(trailing_silence * samplerate)
+        self.temp_path = output_path + PARTIAL_AUDIO_SUFFIX
+        self.journal_path = output_path + JOURNAL_SUFFIX
+        self.journal_info = journal_info
+        self.peak = np.float32(0)
+        self.meter = LoudnessMeter(samplerate)
+        self.num_samples = 0
+        self.num_chunks = 0
+        self.next_segment = 0 # Segment to synthesize next, as recorded by the last checkpoint
+        self.resumed = resume and journal_info is not None and self._load_checkpoint()
+        if self.resumed:
+            self._file = open(self.temp_path, 'r+b')
+            self._file.truncate(self.num_samples * 4) # Drop audio written after the checkpoint
+            while True: # Measure the loudness of the audio written so far, a block at a time
+                block = np.fromfile(self._file, dtype=np.float32, count=ENCODE_BLOCK_SAMPLES)
+                if not block.size:
+                    break
+                self.meter.add(block)
+        else:
+            self._file = open(self.temp_path, 'wb')
+        if journal_info is not None:
+            self._write_journal()
+
+    def _load_checkpoint(self):
+        """Restores the state saved by the last complete checkpoint. Returns True if there was one."""
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            if not lines or json.loads(lines[0]) != self.journal_info:
+                return False
+            checkpoint = None
+            for line in lines[1:]:
+                try:
+                    checkpoint = json.loads(line)
+                except ValueError:
+                    break # Torn last line from a crash while writing it
+            if checkpoint is None or os.path.getsize(self.temp_path) < checkpoint['samples'] * 4:
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self.next_segment = checkpoint['next_segment']
+        self.num_samples = checkpoint['samples']
+        self.num_chunks = checkpoint['chunks']
+        self.peak = np.float32(checkpoint['peak'])
+        return True
+
+    def _checkpoint_record(self):
+        return {'next_segment': self.next_segment, 'samples': self.num_samples,
+                'chunks': self.num_chunks, 'peak': float(self.peak)}
+
+    def _write_journal(self):
+        """(Re)writes the journal atomically: header line, plus the current checkpoint if resumed."""
+        lines = [json.dumps(self.journal_info)]
+        if self.resumed:
+            lines.append(json.dumps(self._checkpoint_record()))
+        temp_journal_path = self.journal_path + '.tmp'
+        with open(temp_journal_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_journal_path, self.journal_path)
+
+    def write(self, audio):
+        """Appends one chunk of mono audio (NumPy array or tensor of floats)."""
+        if isinstance(audio, torch.Tensor):
+            audio = audio.cpu().numpy() # Move to CPU and convert to NumPy if needed
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.size:
+            self.peak = max(self.peak, np.max(np.abs(audio)))
+        self.meter.add(audio)
+        self._file.write(audio.tobytes())
+        self.num_samples += audio.size
+        self.num_chunks += 1
+
+    def write_silence(self, num_samples):
+        """Appends num_samples of silence (a pause; not counted as a chunk)."""
+        self.meter.add(np.zeros(num_samples, dtype=np.float32))
+        self._file.write(bytes(4 * num_samples))
+        self.num_samples += num_samples
+
+    def checkpoint(self, next_segment):
+        """
+        Records in the journal that everything before segment next_segment has been written.
+        The audio is flushed to disk before the journal entry, so a checkpoint never refers
+        to samples that were lost in a crash.
+        """
+        self.next_segment = next_segment
+        if self.journal_info is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self._checkpoint_record()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def seal(self):
+        """
+        Closes the temporary audio and returns the job that normalizes it into output_path
+        (see audio_encoder.encode_audio), which may run in another process. The temporary
+        audio and journal are only removed once the job has written the output, so a
+        resumed run redoes an encode that never finished.
+
+        Returns:
+            dict: The encode job.
+        """
+        self._file.close()
+        gain = 32767 * PEAK_HEADROOM / float(self.peak) if self.peak > 0 else 1.0 # Silent audio stays as is
+        return {
+            'raw_path': self.temp_path, 'output_path': self.output_path, 'samplerate': self.samplerate,
+            'gain': gain, 'trailing_samples': self.trailing_samples,
+            'cleanup_paths': [self.temp_path, self.journal_path],
+            'loudness': dict(self.meter.stats(), peak=float(self.peak)),
+        }
+
+    def finish(self, encoder=None):
+        """
+        Normalizes the written audio into output_path (via a temporary file and rename)
+        and removes the temporary audio and journal.
+
+        Args:
+            encoder (callable, optional): Receives the sealed job (see seal) instead, e.g.
+                                          BackgroundEncoder.submit; the output then appears
+                                          once the encoder has run it.
+
+        Returns:
+            float: Duration of the written audio in seconds.
+        """
+        job = self.seal()
+        if encoder is not None:
+            encoder(job)
+        else:
+            encode_audio(job)
+        return (self.num_samples + self.trailing_samples) / self.samplerate
+
+    def close(self):
+        """Closes the temporary file, keeping it and the journal so a later run can resume."""
+        self._file.close()
+        if self.journal_info is None:
+            self.abort()
+
+    def abort(self):
+        """Closes and deletes the temporary file and journal without writing any output."""
+        self._file.close()
+        for path in (self.temp_path, self.journal_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# --- Book Loudness ---
+# Without book normalization every file is peak-normalized on its own, so the chapters of a
+# book can end up at different levels. With it, the encode jobs of a book are held until all
+# its files are synthesized, and each file is then encoded with one gain worked out from the
+# loudness stats of the whole book (see loudness.book_gain). The stats and gain of every file
+# are kept in the book's loudness log, so files finished by an earlier run are brought to a
+# changed book gain by a rescaling pass over their int16 samples instead of being synthesized again.
+
+class BookLoudnessNormalizer:
+    """
+    Gives every file of one book the same gain.
+
+    hold() stands in for the encoder while the book is synthesized. finish() then works out
+    the book gain, encodes the held files with it (here, or with the background encoder),
+    rescales finished files whose recorded gain differs, and updates the loudness log.
+    """
+
+    def __init__(self, output_dir, encoder=None, bitrate=None, quality=DEFAULT_ENCODE_QUALITY):
+        """
+        Args:
+            output_dir (str): The book's audio directory (where its loudness log is kept).
+            encoder (callable, optional): Receives each held job once its gain is set, e.g.
+                                          BackgroundEncoder.submit. Default: encode in this process.
+            bitrate (int, optional), quality (float): Encoder settings for rescaled lossy files.
+        """
+        self.output_dir = output_dir
+        self.encoder = encoder
+        self.bitrate = bitrate
+        self.quality = quality
+        self.jobs = [] # Held encode jobs (see StreamingAudioWriter.seal)
+
+    def hold(self, job):
+        """Keeps the encode job of a synthesized file until finish()."""
+        print(f"      '{os.path.basename(job['output_path'])}' will be saved once the book's loudness is known.")
+        self.jobs.append(job)
+
+    def held_paths(self):
+        """Output paths of the held files (not written yet)."""
+        return [job['output_path'] for job in self.jobs]
+
+    def finish(self, output_paths):
+        """
+        Encodes the held files with the book gain and brings finished files to it.
+
+        Args:
+            output_paths (list[str]): Every finished or held audio file of the book.
+
+        Returns:
+            list[str]: Held files that could not be written. They keep their raw audio and
+                       journal, so a resumed run saves them again. (A file that cannot be
+                       rescaled is kept as it was.)
+        """
+        log = read_loudness_log(self.output_dir)
+        entries = log['files']
+        held = set(self.held_paths())
+        for job in self.jobs:
+            entries[os.path.basename(job['output_path'])] = dict(job['loudness'], gain=None)
+        names = [os.path.basename(path) for path in output_paths]
+        measured = [entries[name] for name in names if name in entries]
+        gain = 32767 * book_gain(measured, [entry['peak'] for entry in measured], PEAK_HEADROOM) # As int16
+        gain_db = float(20 * np.log10(gain / 32767))
+        loudness_db = gated_loudness(measured)
+
+        print(f"\n--- Book Loudness: '{os.path.basename(os.path.normpath(self.output_dir))}' ---")
+        levels = [entry['loudness_db'] for entry in measured if entry['loudness_db'] is not None]
+        if levels:
+            print(f"  Files measured  : {len(measured)} (loudness {min(levels):.1f} to {max(levels):.1f} dB)")
+            print(f"  Book gain       : {gain_db:+.1f} dB, for {loudness_db + gain_db:.1f} dB overall")
+        failed = []
+        for job in self.jobs:
+            entry = entries[os.path.basename(job['output_path'])]
+            job['gain'] = entry['gain'] = gain
+            if self.encoder is not None:
+                self.encoder(job)
+                continue
+            try:
+                encode_audio(job, self.bitrate, self.quality)
+            except Exception as e:
+                print(f"  Error saving '{os.path.basename(job['output_path'])}': {e}")
+                entry['gain'] = None
+                failed.append(job['output_path'])
+        self.jobs = []
+
+        rescaled = unmeasured = 0
+        for path, name in zip(output_paths, names):
+            entry = entries.get(name)
+            if path in held:
+                continue
+            if entry is None or entry.get('gain') is None:
+                unmeasured += 1 # Written without book normalization
+                continue
+            factor = gain / entry['gain']
+            if abs(20 * np.log10(factor)) <= GAIN_TOLERANCE_DB:
+                continue
+            try:
+                rescale_audio(path, factor, self.bitrate, self.quality)
+                entry['gain'] = gain
+                rescaled += 1
+            except Exception as e:
+                print(f"  Error rescaling '{name}' (kept at its previous level): {e}")
+        if rescaled:
+            print(f"  Rescaled {rescaled} file(s) finished by an earlier run to the book gain.")
+        if unmeasured:
+            print(f"  {unmeasured} file(s) written without book normalization were left as they are.")
+        log['book'] = {'loudness_db': loudness_db, 'gain_db': gain_db}
+        try:
+            write_loudness_log(self.output_dir, log)
+        except OSError as e:
+            print(f"  Warning: Could not write the loudness log: {e}")
+        return failed
+
+# --- Sentence Audio Cache ---
+# Synthesized audio of each text segment (what split_text_segments cuts the text into), keyed by
+# the normalized segment text, voice, speed, language and model version. Entries hold the
+# segment's chunks as float32 samples, so cached and freshly synthesized audio are identical.
+_audio_cache = None
+
+def get_audio_cache():
+    """Returns the process-wide audio DiskCache (created on first use)."""
+    global _audio_cache
+    if _audio_cache is None:
+        _audio_cache = DiskCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES)
+    return _audio_cache
+
+def clear_audio_cache():
+    """
+    Deletes every cached sentence recording.
+
+    Returns:
+        tuple: (entry_count, total_bytes) removed.
+    """
+    cache = get_audio_cache()
+    count, total = cache.stats()
+    cache.clear()
+    print(f"Cleared audio cache: {count} entries, {total / (1024 * 1024):.1f} MB.")
+    return count, total
+
+def _segment_cache_key(pipeline, segment, voice, speed):
+    return make_key("audio", AUDIO_CACHE_FORMAT_VERSION, kokoro.__version__, pipeline.repo_id,
+                    pipeline.lang_code, voice, float(speed), normalize_segment_text(segment))
+
+def _pack_segment_audio(chunks):
+    """Serializes [(graphemes, phonemes, float32 audio), ...] into one cache entry."""
+    header = json.dumps([[gs, ps, len(audio)] for gs, ps, audio in chunks]).encode('utf-8')
+    return b''.join(
+        [struct.pack('<I', len(header)), header] + [audio.astype('<f4').tobytes() for _, _, audio in chunks]
+    )
+
+def _unpack_segment_audio(data):
+    """Inverse of _pack_segment_audio. Returns None for a damaged entry."""
+    try:
+        header_size, = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + header_size].decode('utf-8'))
+        offset = 4 + header_size
+        chunks = []
+        for gs, ps, num_samples in header:
+            audio = np.frombuffer(data, dtype='<f4', count=num_samples, offset=offset).astype(np.float32)
+            offset += num_samples * 4
+            chunks.append((gs, ps, audio))
+        return chunks if offset == len(data) else None
+    except (struct.error, ValueError, TypeError):
+        return None
+
+def normalize_segment_text(segment):
+    """
+    Returns a segment as it is phonemized and looked up in the caches: NFC Unicode, with
+    whitespace runs (which do not change the speech) collapsed to single spaces.
+    """
+    return " ".join(unicodedata.normalize('NFC', segment).split())
+
+# --- Phoneme Cache ---
+# G2P output of each segment, keyed by language and normalized segment text. G2P does not
+# depend on the voice or speed, so an entry is reused by every voice of its language.
+# Entries are tiny, so they share one SQLite file instead of taking a file each.
+_phoneme_cache = None
+
+def get_phoneme_cache():
+    """Returns the process-wide phoneme SqliteCache (created on first use)."""
+    global _phoneme_cache
+    if _phoneme_cache is None:
+        _phoneme_cache = SqliteCache(PHONEME_CACHE_PATH, PHONEME_CACHE_MAX_BYTES)
+    return _phoneme_cache
+
+def clear_phoneme_cache():
+    """
+    Deletes every cached phonemization.
+
+    Returns:
+        tuple: (entry_count, total_bytes) removed.
+    """
+    cache = get_phoneme_cache()
+    count, total = cache.stats()
+    cache.clear()
+    print(f"Cleared phoneme cache: {count} entries, {total / (1024 * 1024):.1f} MB.")
+    return count, total
+
+def _phoneme_cache_key(lang_code, normalized_segment):
+    return make_key("phonemes", PHONEME_CACHE_FORMAT_VERSION, kokoro.__version__, misaki.__version__,
+                    lang_code, normalized_segment)
+
+def _pack_phonemes(chunks):
+    """Serializes [(graphemes, phonemes), ...] into one cache entry (compact UTF-8 JSON)."""
+    return json.dumps(chunks, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _unpack_phonemes(data):
+    """Inverse of _pack_phonemes. Returns None for a damaged entry."""
+    try:
+        chunks = [(gs, ps) for gs, ps in json.loads(data.decode('utf-8'))]
+    except (ValueError, TypeError):
+        return None
+    if not all(isinstance(gs, str) and isinstance(ps, str) for gs, ps in chunks):
+        return None
+    return chunks
+
+def _add_counts(totals, counts):
+    """Adds the counters of counts (dict) to totals (dict, or None to ignore them)."""
+    if totals is not None:
+        for name, count in counts.items():
+            totals[name] = totals.get(name, 0) + count
+
+def _print_cache_summary(cache_stats):
+    """Prints a run's cache hit/miss counters (as collected by generate_audio_for_file_kokoro)."""
+    for label, hits_name, misses_name in (("Phoneme cache", 'phoneme_hits', 'phoneme_misses'),
+                                          ("Audio cache", 'hits', 'misses')):
+        hits, misses = cache_stats.get(hits_name, 0), cache_stats.get(misses_name, 0)
+        if hits + misses:
+            print(f"  {label:<20}: {hits} hits / {misses} misses ({hits / (hits + misses) * 100:.0f}% reused)")
+
+def _read_text_file(path):
+    """Returns the text of a UTF-8 text file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def split_text_segments(text, split_pattern=r'\n+', chunk_size=None):
+    """
+    Splits text into the segments synthesized one by one: as KPipeline does (empty ones
+    included), or packed with pack_sentences if chunk_size is given.
+    """
+    if chunk_size:
+        return pack_sentences(text, chunk_size, split_pattern)
+    return re.split(split_pattern, text.strip()) if split_pattern else [text]
+
+def pack_sentences(text, chunk_size, split_pattern=r'\n+'):
+    """
+    Packs consecutive sentences of text into segments of up to chunk_size characters,
+    never across a paragraph break (blank line).
+
+    Extracted text has one sentence per line, so synthesizing it line by line means
+    many short forward passes, each with its own seams. Packed segments are split
+    into model-sized chunks (510 phonemes at most) by KPipeline itself, at punctuation.
+
+    Args:
+        text (str): Text with paragraphs separated by blank lines.
+        chunk_size (int): Character budget of a segment (about one phoneme per character).
+                          A longer sentence becomes a segment of its own.
+        split_pattern (str): Regex separating the sentences of a paragraph.
+
+    Returns:
+        list[str]: The segments, sentences joined with single spaces.
+    """
+    segments = []
+    for paragraph in PARAGRAPH_BREAK_PATTERN.split(text.strip()):
+        sentences = re.split(split_pattern, paragraph.strip()) if split_pattern else [paragraph]
+        segment = ""
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if segment and len(segment) + 1 + len(sentence) > chunk_size:
+                segments.append(segment)
+                segment = sentence
+            else:
+                segment = f"{segment} {sentence}" if segment else sentence
+        if segment:
+            segments.append(segment)
+    return segments
+
+# --- Pause Shaping ---
+# Every chunk Kokoro synthesizes starts and ends with some silence of its own, and with one
+# sentence per line those silences add up over a chapter. With pauses set, the writer
+# trims each chunk to its speech and puts a fixed pause before it instead: a sentence
+# pause, or a paragraph pause after the last segment of a paragraph. The chapter pause
+# is added once, after the last chunk of the file.
+
+def segment_paragraph_ends(text, split_pattern=r'\n+', chunk_size=None):
+    """
+    Returns, for each segment of split_text_segments(text, split_pattern, chunk_size),
+    whether it is the last segment of its paragraph (followed by a blank line or the end).
+    """
+    if chunk_size:
+        ends = []
+        for paragraph in PARAGRAPH_BREAK_PATTERN.split(text.strip()):
+            count = len(pack_sentences(paragraph, chunk_size, split_pattern))
+            ends.extend([False] * (count - 1) + [True] if count else [])
+        return ends
+    if not split_pattern:
+        return [True]
+    separators = [match.group(0) for match in re.finditer(split_pattern, text.strip())]
+    return [bool(PARAGRAPH_BREAK_PATTERN.search(separator)) for separator in separators] + [True]
+
+def trim_silence(audio, threshold_db=SILENCE_THRESHOLD_DB):
+    """
+    Returns audio without its leading and trailing silence.
+
+    The energy of SILENCE_FRAME_SAMPLES frames is computed in one vectorized pass;
+    frames more than threshold_db below the loudest one are silence. SILENCE_MARGIN_SAMPLES
+    are kept on either side of the speech.
+
+    Args:
+        audio (np.ndarray): Mono float32 audio.
+        threshold_db (float): Silence threshold relative to the loudest frame (negative).
+
+    Returns:
+        np.ndarray: A view of audio (empty if it is all silence).
+    """
+    num_frames = len(audio) // SILENCE_FRAME_SAMPLES
+    if num_frames == 0:
+        return audio
+    frames = audio[:num_frames * SILENCE_FRAME_SAMPLES].reshape(num_frames, SILENCE_FRAME_SAMPLES)
+    energy = np.einsum('ij,ij->i', frames, frames) # Sum of squares per frame
+    loud = np.flatnonzero(energy > energy.max() * 10 ** (threshold_db / 10))
+    if not loud.size:
+        return audio[:0]
+    start = max(loud[0] * SILENCE_FRAME_SAMPLES - SILENCE_MARGIN_SAMPLES, 0)
+    end = min((loud[-1] + 1) * SILENCE_FRAME_SAMPLES + SILENCE_MARGIN_SAMPLES, len(audio))
+    return audio[start:end]
+
+def _describe_pauses(pauses):
+    """Returns pause settings as a short line for run headers."""
+    if not pauses:
+        return "as synthesized"
+    return (f"sentence {pauses['sentence']:.2f}s / paragraph {pauses['paragraph']:.2f}s / "
+            f"chapter {pauses['chapter']:.2f}s (chunk silences trimmed)")
+
+def _print_pause_summary(stats, label="Silence trimmed"):
+    """Prints how much shorter pause shaping made the audio (from the 'untrimmed_seconds'/'trimmed_seconds' counters)."""
+    before, after = stats.get('untrimmed_seconds', 0), stats.get('trimmed_seconds', 0)
+    if before:
+        saved = before - after
+        print(f"  {label:<20}: {abs(saved) / 60:.1f} min {'saved' if saved >= 0 else 'added'} "
+              f"({abs(saved) / before * 100:.0f}% of {before / 60:.1f} min synthesized)")
+
+# --- Batched Inference ---
+# With one sentence per line, a chapter is thousands of short forward passes, each too
+# small to keep the CPU (or GPU) busy. In batched mode KPipeline still does the G2P and
+# chunking (with _DeferredModel standing in for the model), and the collected phoneme
+# sequences are sorted by length and run through the model batch_size at a time.
+# The text side of KModel (ALBERT, duration predictor, text encoder) handles padding
+# with masks and packed LSTMs. The acoustic side uses instance norms over time, so only
+# sequences whose predicted frame counts are within BATCH_FRAME_TOLERANCE of each other
+# share a decoder pass; the audio is cut back to each sequence's own length.
+
+class _DeferredModel:
+    """Stands in for KModel in KPipeline.__call__: records what would be synthesized instead of running it."""
+
+    def __init__(self, model):
+        self.model = model
+        self.requests = [] # (phonemes, ref_s, speed) per chunk, in order
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def __call__(self, phonemes, ref_s, speed=1, return_output=False):
+        self.requests.append((phonemes, ref_s, speed))
+        return KModel.Output(audio=None)
+
+def _packed_lstm(lstm, x, lengths, total_length):
+    """Runs a batch_first LSTM over the unpadded part of each sequence of x (B, T, C)."""
+    packed = torch.nn.utils.rnn.pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+    lstm.flatten_parameters()
+    output, _ = lstm(packed)
+    output, _ = torch.nn.utils.rnn.pad_packed_sequence(output, batch_first=True, total_length=total_length)
+    return output
+
+def _frame_groups(indices, num_frames):
+    """Splits indices (sorted by num_frames) into runs whose frame counts are within BATCH_FRAME_TOLERANCE."""
+    groups = []
+    for index in indices:
+        if groups and num_frames[index] <= num_frames[groups[-1][0]] * (1 + BATCH_FRAME_TOLERANCE):
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+    return groups
+
+@torch.no_grad()
+def forward_batch(model, phonemes, ref_s, speed=1.0):
+    """
+    Approximate batched KModel.forward for several phoneme strings.
+
+    The text side (BERT, durations) is masked, so it matches the per-sentence model. On
+    the acoustic side sequences whose frame counts are within BATCH_FRAME_TOLERANCE of
+    each other share a pass, and the shorter ones are padded to the longest: the
+    instance norms and convolutions of the F0/N blocks and the decoder see that padding,
+    so the audio differs slightly from KModel.forward (see benchmark_batched_inference
+    for the measured drift).
+
+    Args:
+        model (KModel): The model.
+        phonemes (list[str]): Phoneme strings (at most model.context_length - 2 tokens each).
+        ref_s (list[torch.Tensor]): Voice style vector (1, 256) of each string, i.e.
+                                    pack[len(phonemes) - 1] as KPipeline.infer picks it.
+        speed (float): Speech speed multiplier.
+
+    Returns:
+        list[torch.Tensor]: Float audio of each string (on the CPU), in input order.
+    """
+    device = model.device
+    batch_size = len(phonemes)
+    input_ids = [[0, *(model.vocab[p] for p in ps if p in model.vocab), 0] for ps in phonemes]
+    lengths = torch.tensor([len(ids) for ids in input_ids], dtype=torch.long)
+    max_length = int(lengths.max())
+    padded_ids = torch.zeros((batch_size, max_length), dtype=torch.long)
+    for row, ids in enumerate(input_ids):
+        padded_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+    padded_ids = padded_ids.to(device)
+    text_mask = (torch.arange(max_length).unsqueeze(0) >= lengths.unsqueeze(1)).to(device) # True on padding
+    ref_s = torch.cat([s.reshape(1, -1) for s in ref_s]).to(device)
+    style = ref_s[:, 128:]
+
+    # --- Text side (masked, exact for padded batches) ---
+    bert_dur = model.bert(padded_ids, attention_mask=(~text_mask).int())
+    d_en = model.bert_encoder(bert_dur).transpose(-1, -2)
+    d = model.predictor.text_encoder(d_en, style, lengths, text_mask)
+    x = _packed_lstm(model.predictor.lstm, d, lengths, max_length)
+    duration = torch.sigmoid(model.predictor.duration_proj(x)).sum(axis=-1) / speed
+    pred_dur = torch.round(duration).clamp(min=1).long().masked_fill(text_mask, 0)
+    t_en = model.text_encoder(padded_ids, lengths, text_mask)
+
+    # --- Acoustic side, in groups of similar length ---
+    num_frames = pred_dur.sum(dim=1).cpu().tolist()
+    audios = [None] * batch_size
+    for group in _frame_groups(sorted(range(batch_size), key=lambda row: num_frames[row]), num_frames):
+        max_frames = max(num_frames[row] for row in group)
+        alignment = torch.zeros((len(group), max_length, max_frames), device=device)
+        for row, index in enumerate(group):
+            token_indices = torch.repeat_interleave(torch.arange(max_length, device=device), pred_dur[index])
+            alignment[row, token_indices, torch.arange(num_frames[index], device=device)] = 1
+        group_frames = torch.tensor([num_frames[index] for index in group], dtype=torch.long)
+        group_style = style[group]
+        en = d[group].transpose(-1, -2) @ alignment
+
+        # predictor.F0Ntrain, with the shared LSTM packed to each sequence's frames
+        shared = _packed_lstm(model.predictor.shared, en.transpose(-1, -2), group_frames, max_frames).transpose(-1, -2)
+        F0, N = shared, shared
+        for block in model.predictor.F0:
+            F0 = block(F0, group_style)
+        for block in model.predictor.N:
+            N = block(N, group_style)
+        F0_pred = model.predictor.F0_proj(F0).squeeze(1)
+        N_pred = model.predictor.N_proj(N).squeeze(1)
+
+        asr = t_en[group] @ alignment
+        audio = model.decoder(asr, F0_pred, N_pred, ref_s[group, :128]).reshape(len(group), -1)
+        samples_per_frame = audio.shape[-1] // max_frames
+        for row, index in enumerate(group):
+            audios[index] = audio[row, :num_frames[index] * samples_per_frame].cpu()
+    return audios
+
+# --- Staged Synthesis ---
+# A file is synthesized by three threads connected by bounded queues, so G2P, inference
+# and disk output overlap instead of taking turns:
+#   G2P thread       : cache lookups and phonemization of the segments ahead (_prepare_segments)
+#   calling thread   : model inference only (iter_synthesized_chunks)
+#   writer thread    : NumPy conversion, writing, checkpoints and progress (_AudioWriterThread)
+# Each stage checks pause and cancellation between items; a stage that fails or is
+# cancelled sets a shared stop event so the others wind down instead of blocking.
+_END = object() # Queue sentinel: no more items
+
+def _queue_put(item_queue, item, stop):
+    """Puts item on a bounded queue, giving up (returning False) once stop is set."""
+    while not stop.is_set():
+        try:
+            item_queue.put(item, timeout=STAGE_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _wait_while_paused(pause_event, stop):
+    """Blocks while pause_event is cleared. Returns False if stop was set meanwhile."""
+    if pause_event is not None:
+        while not pause_event.wait(STAGE_POLL_INTERVAL):
+            if stop.is_set():
+                return False
+    return not stop.is_set()
+
+def phonemize_segment(pipeline, segment, voice, speed=1.0, phoneme_cache=None, stats=None):
+    """
+    Runs KPipeline's G2P and chunking on one (normalized) segment without running the model.
+
+    Args:
+        pipeline (KPipeline): The pipeline.
+        segment (str): Segment text.
+        voice (str): Voice identifier.
+        speed (float): Speech speed multiplier.
+        phoneme_cache (SqliteCache, optional): Reuse (and store) the G2P output of the segment.
+        stats (dict, optional): Incremented in place: 'phoneme_hits' and 'phoneme_misses'.
+
+    Returns:
+        list[tuple]: (graphemes, phonemes, ref_s, speed) per chunk, where ref_s is the
+                     voice style vector KPipeline.infer would pass to the model.
+    """
+    text = normalize_segment_text(segment)
+    key = chunks = None
+    if phoneme_cache is not None:
+        key = _phoneme_cache_key(pipeline.lang_code, text)
+        data = phoneme_cache.get(key)
+        chunks = _unpack_phonemes(data) if data is not None else None
+        _add_counts(stats, {'phoneme_hits' if chunks is not None else 'phoneme_misses': 1})
+    if chunks is None:
+        recorder = _DeferredModel(pipeline.model)
+        chunks = [(result.graphemes, result.phonemes)
+                  for result in pipeline(text, voice=voice, speed=speed, split_pattern=None, model=recorder)]
+        if phoneme_cache is not None:
+            try:
+                phoneme_cache.put(key, _pack_phonemes(chunks))
+            except OSError as e:
+                print(f"      Warning: Could not write phoneme cache entry: {e}")
+    # The style vector for each chunk, picked as KPipeline.infer does
+    pack = pipeline.load_voice(voice).to(pipeline.model.device)
+    return [(gs, ps, pack[len(ps) - 1], speed) for gs, ps in chunks]
+
+def _prepare_segments(pipeline, segments, indices, voice, speed, audio_cache, out_queue, stop,
+                      cancellation_flag=None, pause_event=None, phoneme_cache=None, stats=None):
+    """
+    G2P stage: for each segment index, puts (index, key, cached_chunks, requests) on out_queue,
+    with cached_chunks from audio_cache or else the phonemized requests (see phonemize_segment);
+    then _END. An error (or cancellation) is put on the queue in place of _END.
+    """
+    try:
+        for index in indices:
+            if not _wait_while_paused(pause_event, stop):
+                return
+            if cancellation_flag and cancellation_flag():
+                raise InterruptedError("Processing cancelled by user.")
+            key = cached_chunks = requests = None
+            if audio_cache is not None:
+                key = _segment_cache_key(pipeline, segments[index], voice, speed)
+                cached = audio_cache.get(key)
+                cached_chunks = _unpack_segment_audio(cached) if cached is not None else None
+            if cached_chunks is None:
+                requests = phonemize_segment(pipeline, segments[index], voice, speed, phoneme_cache, stats)
+            if not _queue_put(out_queue, (index, key, cached_chunks, requests), stop):
+                return
+        _queue_put(out_queue, _END, stop)
+    except BaseException as e:
+        _queue_put(out_queue, e, stop)
+
+def _infer_requests(model, requests, batch_size=1):
+    """Inference stage: returns the audio tensor (on the CPU) of each (graphemes, phonemes, ref_s, speed) request."""
+    if batch_size <= 1:
+        return [model(ps, ref_s, chunk_speed) for _, ps, ref_s, chunk_speed in requests]
+    # Similar lengths together, so little of each pass is padding
+    order = sorted(range(len(requests)), key=lambda index: len(requests[index][1]))
+    audios = [None] * len(requests)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        batch_audio = forward_batch(
+            model,
+            [requests[index][1] for index in batch],
+            [requests[index][2] for index in batch],
+            speed=requests[batch[0]][3]
+        )
+        for index, audio in zip(batch, batch_audio):
+            audios[index] = audio
+    return audios
+
+def synthesize_segments_batched(pipeline, segments, voice, speed=1.0, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Synthesizes several text segments with batched model passes.
+
+    Args:
+        pipeline (KPipeline): Pipeline (with a model) used for G2P, chunking and voices.
+        segments (list[str]): Segments, each synthesized as pipeline(segment, split_pattern=None) would.
+        voice (str): Voice identifier.
+        speed (float): Speech speed multiplier.
+        batch_size (int): Maximum number of phoneme sequences per forward pass.
+
+    Returns:
+        list[list[tuple]]: Per segment, its (graphemes, phonemes, float32 audio) chunks.
+    """
+    segment_requests = [phonemize_segment(pipeline, segment, voice, speed) for segment in segments]
+    requests = [request for chunk_requests in segment_requests for request in chunk_requests]
+    audios = iter(_infer_requests(pipeline.model, requests, batch_size))
+    return [[(gs, ps, next(audios).numpy().astype(np.float32)) for gs, ps, _, _ in chunk_requests]
+            for chunk_requests in segment_requests]
+
+def iter_synthesized_chunks(pipeline, text, voice, speed=1.0, split_pattern=r'\n+', audio_cache=None, stats=None,
+                            start_segment=0, segment_done=None, batch_size=1, cancellation_flag=None, pause_event=None,
+                            phoneme_cache=None, chunk_size=None):
+    """
+    Yields (graphemes, phonemes, audio) for text like pipeline(text, ...), segment by
+    segment, reusing the audio of segments found in audio_cache and storing newly
+    synthesized ones in it.
+
+    The text is split into segments with split_pattern exactly as KPipeline does, and
+    each segment is synthesized on its own (after normalize_segment_text), so the audio
+    matches pipeline(text, ...) up to whitespace. With chunk_size, the sentences of each
+    paragraph are packed into larger segments first.
+    A G2P thread phonemizes up to STAGE_QUEUE_SIZE segments ahead, so the calling
+    thread only runs the model.
+
+    Args:
+        pipeline (KPipeline): The pipeline used for segments that are not cached.
+        text (str): Text to synthesize.
+        voice (str): Voice identifier.
+        speed (float): Speech speed multiplier.
+        split_pattern (str): Regex splitting the text into segments.
+        audio_cache (DiskCache, optional): Cache to use. None synthesizes everything.
+        stats (dict, optional): Incremented in place: 'hits' and 'misses' (segments), and
+                                'phoneme_hits' and 'phoneme_misses' (see phonemize_segment).
+        start_segment (int): Index (in split_text_segments) of the first segment to
+                             synthesize; earlier ones are skipped (resuming a file).
+        segment_done (callable, optional): Called with the index of the next segment once
+                                           every chunk of a segment has been consumed.
+        batch_size (int): If above 1, segments are synthesized in batched model passes of up
+                          to batch_size phoneme sequences (see forward_batch).
+        cancellation_flag (callable, optional): Stops the G2P thread when it returns True.
+        pause_event (threading.Event, optional): The G2P thread waits while it is cleared.
+        phoneme_cache (SqliteCache, optional): Reuse the G2P output of segments phonemized before.
+        chunk_size (int, optional): Pack the sentences of each paragraph into segments of up
+                                    to chunk_size characters (see pack_sentences).
+
+    Raises:
+        InterruptedError: If the G2P thread saw the cancellation first.
+    """
+    segments = split_text_segments(text, split_pattern, chunk_size)
+    indices = [index for index in range(start_segment, len(segments)) if segments[index].strip()] # Empty ones are skipped by the pipeline too
+    window_size = batch_size * BATCH_WINDOW_FACTOR if batch_size > 1 else 1
+    prepared = queue.Queue(maxsize=max(STAGE_QUEUE_SIZE, window_size))
+    stop = threading.Event()
+    g2p_thread = threading.Thread(
+        target=_prepare_segments, name="kokoro-g2p", daemon=True,
+        args=(pipeline, segments, indices, voice, speed, audio_cache, prepared, stop, cancellation_flag, pause_event,
+              phoneme_cache, stats)
+    )
+    g2p_thread.start()
+    try:
+        finished = False
+        while not finished:
+            # One segment at a time, or a window of them to sort into batches
+            window = []
+            while len(window) < window_size:
+                item = prepared.get()
+                if item is _END:
+                    finished = True
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                window.append(item)
+
+            requests = [request for _, _, cached_chunks, segment_requests in window
+                        if cached_chunks is None for request in segment_requests]
+            if batch_size > 1 and requests:
+                audios = iter(_infer_requests(pipeline.model, requests, batch_size))
+            for index, key, cached_chunks, segment_requests in window:
+                if cached_chunks is not None:
+                    if stats is not None: stats['hits'] = stats.get('hits', 0) + 1
+                    yield from cached_chunks
+                    if segment_done: segment_done(index + 1)
+                    continue
+
+                if stats is not None and audio_cache is not None: stats['misses'] = stats.get('misses', 0) + 1
+                chunks = []
+                for gs, ps, ref_s, chunk_speed in segment_requests:
+                    if batch_size > 1:
+                        audio = next(audios)
+                    else:
+                        audio = pipeline.model(ps, ref_s, chunk_speed) # Streams chunk by chunk
+                    chunks.append((gs, ps, audio))
+                    yield gs, ps, audio
+                if audio_cache is not None and chunks:
+                    try:
+                        audio_cache.put(key, _pack_segment_audio(
+                            [(gs, ps, audio.numpy().astype(np.float32)) for gs, ps, audio in chunks]
+                        ))
+                    except OSError as e:
+                        print(f"      Warning: Could not write audio cache entry: {e}")
+                if segment_done: segment_done(index + 1)
+    finally:
+        stop.set()
+        g2p_thread.join()
+
+class _AudioWriterThread(threading.Thread):
+    """
+    Writer stage of generate_audio_for_file_kokoro: takes ('chunk', graphemes, audio, pause)
+    and ('checkpoint', next_segment) items from a bounded queue, writes them to a
+    StreamingAudioWriter and reports progress. With pauses (see Pause Shaping), each chunk
+    is trimmed and preceded by the pause it names ('sentence', 'paragraph' or None).
+    The first error (or cancellation) is kept in .error and stops the stage.
+    """
+
+    def __init__(self, writer, stop, chunk_progress_callback=None, cancellation_flag=None, pause_event=None,
+                 pauses=None):
+        super().__init__(name="kokoro-writer", daemon=True)
+        self.writer = writer
+        self.stop = stop
+        self.chunk_progress_callback = chunk_progress_callback
+        self.cancellation_flag = cancellation_flag
+        self.pause_event = pause_event
+        self.pauses = pauses
+        self.samples_in = 0  # Samples synthesized (before trimming)
+        self.samples_out = 0 # Samples written for them (trimmed chunks and pauses)
+        self.items = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+        self.error = None
+        self._last_callback_time = time.time()
+
+    def put(self, item):
+        """Queues an item. Raises the writer's error if the stage has stopped."""
+        if not _queue_put(self.items, item, self.stop) or self.error is not None:
+            raise self.error or InterruptedError("Processing cancelled by user.")
+
+    def close(self):
+        """Lets the queued items be written, waits for the thread, and raises its error if any."""
+        self.put(_END)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    item = self.items.get(timeout=STAGE_POLL_INTERVAL)
+                except queue.Empty:
+                    if self.stop.is_set():
+                        return
+                    continue
+                if item is _END:
+                    return
+                if not _wait_while_paused(self.pause_event, self.stop):
+                    return
+                if self.cancellation_flag and self.cancellation_flag():
+                    print("      Cancellation detected while writing audio.")
+                    raise InterruptedError("Processing cancelled by user.")
+                if item[0] == 'checkpoint':
+                    self.writer.checkpoint(item[1])
+                    continue
+
+                _, gs, audio, pause = item
+                if self.pauses is not None:
+                    if isinstance(audio, torch.Tensor):
+                        audio = audio.cpu().numpy()
+                    audio = np.asarray(audio, dtype=np.float32)
+                    self.samples_in += audio.size
+                    audio = trim_silence(audio)
+                    if pause:
+                        pause_samples = round(self.pauses[pause] * self.writer.samplerate)
+                        self.writer.write_silence(pause_samples)
+                        self.samples_out += pause_samples
+                    self.samples_out += audio.size
+                self.writer.write(audio) # Converts tensors to NumPy
+                chars_in_chunk = len(gs) if gs else 0 # Length of graphemes in the chunk
+                current_time = time.time()
+                chunk_duration = current_time - self._last_callback_time
+                self._last_callback_time = current_time
+                if self.chunk_progress_callback and chars_in_chunk > 0:
+                    # Report characters processed in this chunk and its duration
+                    self.chunk_progress_callback(chars_in_chunk, chunk_duration)
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
 # --- Core Audio Generation for a Single File ---
 
 def generate_audio_for_file_kokoro(
@@ -42,7 +1412,17 @@ def generate_audio_for_file_kokoro(
     split_pattern=r'\n+',
     cancellation_flag=None,
     chunk_progress_callback=None, # Renamed for clarity: reports chunk progress
-    pause_event=None
+    pause_event=None,
+    audio_cache=None, # Optional DiskCache of synthesized segments (see get_audio_cache)
+    resume=False,     # Continue from the checkpoint journal of an interrupted run
+    batch_size=1,     # Phoneme sequences per forward pass (1: one sentence at a time)
+    text=None,        # Contents of input_path, if already read (e.g. read ahead by the caller)
+    use_phoneme_cache=True, # Reuse G2P output of sentences phonemized before (see get_phoneme_cache)
+    cache_stats=None, # Optional dict the file's cache hit/miss counters are added to
+    cpu_fast=False,   # Run inference under torch.inference_mode (see CPU Fast Mode)
+    chunk_size=None,  # Characters per synthesized segment (sentences packed per paragraph); None: one per split
+    encoder=None,     # Optional callable taking the finished file's encode job (e.g. BackgroundEncoder.submit)
+    pauses=None       # Trim chunk silences and use these pauses (see DEFAULT_PAUSES); None keeps chunks as synthesized
 ):
     """
     Generates audio for a single text file using a pre-initialized Kokoro pipeline.
@@ -57,14 +1437,41 @@ def generate_audio_for_file_kokoro(
         cancellation_flag (callable): Function returning True to cancel.
         chunk_progress_callback (callable): Callback reporting (chars_in_chunk, chunk_duration).
         pause_event (threading.Event): Event to pause processing.
+        audio_cache (DiskCache, optional): Reuse the audio of segments synthesized before
+            (with the same voice, speed and model) and store new ones.
+        resume (bool): Progress is checkpointed after every segment in a journal next to
+            the output. If True and the journal of an interrupted run for the same text
+            and settings exists, synthesis continues after its last finished segment.
+            The partial audio and journal of a cancelled or failed file are only kept
+            for a later run if resume is True.
+        batch_size (int): If above 1, sentences of similar length are synthesized together
+            in batched forward passes of up to batch_size sequences.
+        text (str, optional): The text of input_path. Read from input_path if None.
+        use_phoneme_cache (bool): Reuse the G2P output of segments phonemized before in the
+            same language (with any voice) and store new ones.
+        cache_stats (dict, optional): The file's 'hits'/'misses' (audio cache) and
+            'phoneme_hits'/'phoneme_misses' counters are added to it.
+        cpu_fast (bool): Run the model under torch.inference_mode.
+        chunk_size (int, optional): Pack consecutive sentences of a paragraph into segments
+            of up to chunk_size characters (see pack_sentences), for fewer, fuller forward
+            passes and fewer seams. None synthesizes each split_pattern piece on its own.
+        encoder (callable, optional): Receives the encode job of the finished audio (see
+            StreamingAudioWriter.seal) instead of it being normalized and written here, so
+            a compressed format is encoded without holding up the next file.
+        pauses (dict, optional): Seconds of silence for 'sentence', 'paragraph' and 'chapter'
+            pauses. Each chunk's own leading and trailing silence is trimmed (trim_silence)
+            and replaced by a sentence pause, or a paragraph pause after the last segment of
+            a paragraph; the chapter pause ends the file. cache_stats gets the
+            'untrimmed_seconds'/'trimmed_seconds' counters. None writes chunks unchanged.
 
     Returns:
-        bool: True if audio generation was successful and saved, False otherwise.
+        bool: True if audio generation was successful and saved (or queued for encoding), False otherwise.
     """
     start_file_read = time.time()
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+        if text is None:
+            with open(input_path, 'r', encoding='utf-8') as f:
+                text = f.read()
         if not text.strip():
             print(f"      Warning: Input file '{os.path.basename(input_path)}' is empty. Skipping.")
             return False
@@ -81,85 +1488,398 @@ def generate_audio_for_file_kokoro(
         raise InterruptedError("Processing cancelled by user.")
     if pause_event: pause_event.wait() # Wait if paused
 
-    audio_chunks = []
-    total_chars_in_file = len(text) # Approx total chars for this file
-    chars_processed_in_file = 0
-    start_synth_time = time.time()
-    last_callback_time = start_synth_time
+    # Each chunk goes straight to disk, so memory use does not depend on the file's length.
+    # A checkpoint is only resumed if it was written for the same text and settings.
+    journal_info = {
+        'text': make_key(text), 'voice': voice, 'speed': float(speed), 'split_pattern': split_pattern, 'chunk_size': chunk_size,
+        'samplerate': DEFAULT_SAMPLE_RATE, 'model': f"{pipeline.repo_id} {kokoro.__version__}", 'pauses': pauses,
+    }
+    try:
+        writer = StreamingAudioWriter(output_path, journal_info=journal_info, resume=resume,
+                                      trailing_silence=pauses['chapter'] if pauses else 0.0)
+    except OSError as e:
+        print(f"      Error creating temporary audio file for '{os.path.basename(output_path)}': {e}")
+        return False
 
+    if writer.resumed:
+        skipped_chars = sum(len(segment) for segment in split_text_segments(text, split_pattern, chunk_size)[:writer.next_segment])
+        print(f"      Resuming after {writer.num_chunks} finished chunks ({writer.num_samples / DEFAULT_SAMPLE_RATE:.1f}s of audio)...")
+        if chunk_progress_callback and skipped_chars > 0:
+            chunk_progress_callback(skipped_chars, 0.0)
     print(f"      Synthesizing audio...")
+    file_stats = {}
+    # This thread only runs the model: G2P runs ahead in iter_synthesized_chunks' thread, and
+    # writing, checkpoints (after each segment) and progress in the writer thread
+    stop = threading.Event()
+    writer_thread = _AudioWriterThread(writer, stop, chunk_progress_callback, cancellation_flag, pause_event, pauses)
+    writer_thread.start()
+
+    # Pause before the next chunk: none at the start of the file, a paragraph pause after
+    # the last segment of a paragraph, a sentence pause otherwise
+    paragraph_ends = segment_paragraph_ends(text, split_pattern, chunk_size) if pauses else None
+    def boundary_pause(next_segment):
+        return 'paragraph' if paragraph_ends and paragraph_ends[next_segment - 1] else 'sentence'
+    next_pause = boundary_pause(writer.next_segment) if writer.num_chunks else None
+
+    def segment_done(next_segment):
+        nonlocal next_pause
+        next_pause = boundary_pause(next_segment)
+        writer_thread.put(('checkpoint', next_segment))
+
+    synthesized_chunks = iter_synthesized_chunks(
+        pipeline, text, voice, speed=speed, split_pattern=split_pattern,
+        audio_cache=audio_cache, stats=file_stats, start_segment=writer.next_segment,
+        segment_done=segment_done,
+        batch_size=batch_size, cancellation_flag=cancellation_flag, pause_event=pause_event,
+        phoneme_cache=get_phoneme_cache() if use_phoneme_cache else None, chunk_size=chunk_size
+    )
     try:
-        # Iterate through generated audio chunks from the pipeline
-        for chunk_index, (gs, ps, audio) in enumerate(pipeline(text, voice=voice, speed=speed, split_pattern=split_pattern)):
-
-            if cancellation_flag and cancellation_flag():
-                print("      Cancellation detected during audio synthesis.")
-                raise InterruptedError("Processing cancelled by user.")
-            if pause_event: pause_event.wait() # Wait if paused
-
-            # Process the audio chunk
-            if isinstance(audio, torch.Tensor):
-                audio = audio.cpu().numpy() # Move to CPU and convert to NumPy if needed
-            audio_chunks.append(audio)
-
-            # Update progress based on this chunk
-            chars_in_chunk = len(gs) if gs else 0 # Length of graphemes in the chunk
-            chars_processed_in_file += chars_in_chunk
-            current_time = time.time()
-            chunk_duration = current_time - last_callback_time
-            last_callback_time = current_time
-
-            if chunk_progress_callback and chars_in_chunk > 0:
-                 # Report characters processed in this chunk and its duration
-                 chunk_progress_callback(chars_in_chunk, chunk_duration)
-
-    except Exception as e:
+        # Iterate through generated audio chunks from the pipeline (or the audio cache);
+        # the model runs in this thread, so inference mode applies to it
+        with torch.inference_mode(cpu_fast):
+            for gs, ps, audio in synthesized_chunks:
+
+                if cancellation_flag and cancellation_flag():
+                    print("      Cancellation detected during audio synthesis.")
+                    raise InterruptedError("Processing cancelled by user.")
+                if pause_event: pause_event.wait() # Wait if paused
+
+                # Hand the audio chunk to the writer thread
+                writer_thread.put(('chunk', gs, audio, next_pause))
+                next_pause = 'sentence' # Until the segment is done
+
+        writer_thread.close() # Waits for the queued chunks to be written
+
+    except BaseException as e:
+        stop.set()
+        synthesized_chunks.close() # Stops the G2P thread
+        writer_thread.join()
+        if resume:
+            writer.close() # Keeps the checkpoint, so the file can be resumed
+        else:
+            writer.abort()
+        _add_counts(cache_stats, file_stats)
+        if not isinstance(e, Exception):
+            raise # KeyboardInterrupt, SystemExit
         print(f"      Error during Kokoro pipeline processing for '{os.path.basename(input_path)}': {e}")
         traceback.print_exc() # Print detailed traceback for debugging
         return False # Indicate failure for this file
 
-    if not audio_chunks:
+    if pauses and writer_thread.samples_in:
+        file_stats['untrimmed_seconds'] = writer_thread.samples_in / DEFAULT_SAMPLE_RATE
+        file_stats['trimmed_seconds'] = (writer_thread.samples_out + writer.trailing_samples) / DEFAULT_SAMPLE_RATE
+        saved = file_stats['untrimmed_seconds'] - file_stats['trimmed_seconds']
+        print(f"      Pauses: {abs(saved):.1f}s {'shorter' if saved >= 0 else 'longer'} "
+              f"({abs(saved) / file_stats['untrimmed_seconds'] * 100:.0f}%) after trimming chunk silences.")
+    _add_counts(cache_stats, file_stats)
+    if file_stats.get('hits'):
+        print(f"      Audio cache: reused {file_stats['hits']} of {file_stats['hits'] + file_stats.get('misses', 0)} segments.")
+
+    if not writer.num_chunks:
+        writer.abort()
         print(f"      Warning: No audio chunks generated for '{os.path.basename(input_path)}'.")
         return False
 
-    # Concatenate, Normalize, and Save
+    # Normalize and Save (one streaming pass over the written chunks)
     try:
-        print(f"      Concatenating {len(audio_chunks)} audio chunks...")
-        combined_audio = np.concatenate(audio_chunks)
-
-        # Normalize audio to prevent clipping and fit int16 range
-        max_abs_val = np.max(np.abs(combined_audio))
-        if max_abs_val > 0: # Avoid division by zero for silent audio
-             # Normalize to ~95% of max range to leave some headroom
-             normalized_audio = (combined_audio / max_abs_val * 32767 * 0.95).astype(np.int16)
-        else:
-             normalized_audio = combined_audio.astype(np.int16) # Already silent
-
-        print(f"      Saving audio to '{os.path.basename(output_path)}'...")
-        sf.write(output_path, normalized_audio, DEFAULT_SAMPLE_RATE)
+        if encoder is None:
+            print(f"      Saving {writer.num_chunks} audio chunks to '{os.path.basename(output_path)}'...")
+        writer.finish(encoder)
         # Removed verbose "Audio saved to..." log from here
 
     except Exception as e:
-        print(f"      Error concatenating or saving audio for '{os.path.basename(output_path)}': {e}")
+        if resume:
+            writer.close() # The synthesized audio is kept for a resumed run
+        else:
+            writer.abort()
+        print(f"      Error normalizing or saving audio for '{os.path.basename(output_path)}': {e}")
         return False
 
     return True # Indicate success for this file
 
 
+# --- Multi-Process Synthesis ---
+# A pool of worker processes, each with its own pipeline and torch thread budget, that
+# synthesizes whole files in parallel. One pipeline in one process stops scaling long
+# before a large CPU is busy; several smaller ones keep scaling until the cores (or
+# memory bandwidth) run out. The pool is kept between calls with the same settings,
+# so a batch of books loads the model once per worker.
+_synthesis_farm = None # {'key', 'executor', 'progress_queue', 'cancel_event', 'run_event'}
+
+# Per-worker state, set by _init_synthesis_worker in each worker process
+_worker_pipeline = None
+_worker_progress_queue = None
+_worker_cancel_event = None
+_worker_run_event = None
+
+def plan_worker_threads(num_workers, threads_per_worker=None, cpu_affinity=False):
+    """
+    Splits the CPUs available to this process between synthesis workers.
+
+    Args:
+        num_workers (int): Number of worker processes.
+        threads_per_worker (int, optional): Torch threads per worker. Defaults to an even
+                                            share of the available CPUs (at least 1).
+        cpu_affinity (bool): If True, also give each worker its own set of CPUs.
+
+    Returns:
+        tuple: (threads_per_worker, cpu_sets). cpu_sets is a list with one set of CPU ids
+               per worker, or None without affinity (or where it is unsupported).
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    if not threads_per_worker:
+        threads_per_worker = max(1, len(cpus) // num_workers)
+    cpu_sets = None
+    if cpu_affinity:
+        if hasattr(os, 'sched_setaffinity'):
+            cpu_sets = []
+            for worker_index in range(num_workers):
+                start = (worker_index * threads_per_worker) % len(cpus)
+                cpu_sets.append({cpus[(start + offset) % len(cpus)] for offset in range(threads_per_worker)})
+        else:
+            print("  Note: CPU affinity is not supported on this platform; workers are not pinned.")
+    return threads_per_worker, cpu_sets
+
+def _init_synthesis_worker(lang_code, device, repo_id, voice, num_threads, cpu_sets, worker_counter,
+                           progress_queue, cancel_event, run_event, quantize=False):
+    """Worker initializer: sets the thread budget and affinity, then loads and warms up the pipeline."""
+    global _worker_pipeline, _worker_progress_queue, _worker_cancel_event, _worker_run_event
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+    torch.set_num_threads(num_threads)
+    if cpu_sets:
+        os.sched_setaffinity(0, cpu_sets[worker_index % len(cpu_sets)])
+    _worker_progress_queue = progress_queue
+    _worker_cancel_event = cancel_event
+    _worker_run_event = run_event
+    print(f"  Synthesis worker {worker_index + 1} (pid {os.getpid()}): {num_threads} threads"
+          f"{', CPUs ' + str(sorted(cpu_sets[worker_index % len(cpu_sets)])) if cpu_sets else ''}")
+    # Kept in use for the life of the worker, so it is never evicted
+    _worker_pipeline, _ = acquire_pipeline_with_fallback(lang_code, device, repo_id, voice=voice, quantize=quantize)
+
+def _synthesize_file_in_worker(job_index, input_path, output_path, voice, speed, split_pattern, use_audio_cache, resume,
+                               batch_size, cpu_fast, chunk_size, defer_encoding=False, pauses=None):
+    """
+    Worker: synthesizes one file with this worker's pipeline. Returns (success, cache counters,
+    encode job); with defer_encoding the file is left for the caller to encode (see
+    StreamingAudioWriter.seal), otherwise the encode job is None.
+    """
+    file_stats = {}
+    encode_jobs = []
+    success = generate_audio_for_file_kokoro(
+        input_path=input_path,
+        pipeline=_worker_pipeline,
+        voice=voice,
+        output_path=output_path,
+        speed=speed,
+        split_pattern=split_pattern,
+        cancellation_flag=_worker_cancel_event.is_set,
+        chunk_progress_callback=lambda chars, duration: _worker_progress_queue.put((job_index, chars)),
+        pause_event=_worker_run_event, # Set while running, cleared while paused
+        audio_cache=get_audio_cache() if use_audio_cache else None,
+        resume=resume,
+        batch_size=batch_size,
+        cache_stats=file_stats,
+        cpu_fast=cpu_fast,
+        chunk_size=chunk_size,
+        encoder=encode_jobs.append if defer_encoding else None,
+        pauses=pauses
+    )
+    get_phoneme_cache().flush() # Workers may be stopped without running atexit handlers
+    return success, file_stats, encode_jobs[0] if encode_jobs else None
+
+def _get_synthesis_farm(lang_code, device, repo_id, voice, num_workers, threads_per_worker, cpu_affinity, quantize=False):
+    """Returns the worker pool for these settings, replacing a pool started with other settings."""
+    global _synthesis_farm
+    threads_per_worker, cpu_sets = plan_worker_threads(num_workers, threads_per_worker, cpu_affinity)
+    key = (lang_code, device, repo_id, num_workers, threads_per_worker, cpu_affinity, quantize)
+    if _synthesis_farm is not None and _synthesis_farm['key'] == key:
+        return _synthesis_farm
+    shutdown_synthesis_farm()
+
+    print(f"  Starting {num_workers} synthesis workers ({threads_per_worker} torch threads each)...")
+    # 'spawn' gives each worker a fresh interpreter: forking a process that already runs
+    # torch (or GUI) threads is not safe
+    context = multiprocessing.get_context('spawn')
+    progress_queue = context.Queue()
+    cancel_event = context.Event()
+    run_event = context.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=context,
+        initializer=_init_synthesis_worker,
+        initargs=(lang_code, device, repo_id, voice, threads_per_worker, cpu_sets, context.Value('i', 0),
+                  progress_queue, cancel_event, run_event, quantize)
+    )
+    _synthesis_farm = {
+        'key': key, 'executor': executor, 'progress_queue': progress_queue,
+        'cancel_event': cancel_event, 'run_event': run_event,
+    }
+    return _synthesis_farm
+
+def shutdown_synthesis_farm():
+    """Stops the synthesis worker processes, if any are running."""
+    global _synthesis_farm
+    if _synthesis_farm is not None:
+        _synthesis_farm['cancel_event'].set()
+        _synthesis_farm['run_event'].set() # Let paused workers see the cancellation
+        _synthesis_farm['executor'].shutdown(wait=True)
+        _synthesis_farm = None
+
+def is_finished_output(output_path):
+    """True if output_path is a complete audio file (it exists without a checkpoint journal)."""
+    return os.path.exists(output_path) and not os.path.exists(output_path + JOURNAL_SUFFIX)
+
+def synthesize_files_in_workers(
+    jobs,
+    lang_code,
+    voice,
+    device="cpu",
+    repo_id=DEFAULT_REPO_ID,
+    num_workers=2,
+    threads_per_worker=None,
+    cpu_affinity=False,
+    speed=1.0,
+    split_pattern=r'\n+',
+    use_audio_cache=False,
+    resume=False,
+    batch_size=1,
+    chars_callback=None,
+    file_callback=None,
+    cancellation_flag=None,
+    pause_event=None,
+    cache_stats=None,
+    cpu_fast=False,
+    quantize=False,
+    chunk_size=None,
+    encoder=None,
+    pauses=None
+):
+    """
+    Synthesizes several text files in parallel, one file per worker process at a time.
+
+    Args:
+        jobs (list[tuple]): (input_path, output_path) per file.
+        lang_code, voice, device, repo_id, speed, split_pattern, use_audio_cache, resume, batch_size,
+        cpu_fast, quantize, chunk_size, pauses:
+            As for generate_audiobooks_kokoro. Workers keep their planned thread budget
+            (their threads are not tuned).
+        num_workers (int): Number of worker processes.
+        threads_per_worker (int, optional): Torch threads per worker (default: an even share of the CPUs).
+        cpu_affinity (bool): Pin each worker to its own CPUs (Linux).
+        chars_callback (callable, optional): Called as (job_index, chars) as audio is produced,
+                                             from this process, for unified progress.
+        file_callback (callable, optional): Called as (job_index, success, file_stats) as files
+                                            finish, with the file's counters (see cache_stats).
+        cancellation_flag (callable, optional): Function returning True to cancel.
+        pause_event (threading.Event, optional): Pauses every worker while cleared.
+        cache_stats (dict, optional): The cache counters of every file are added to it
+                                      (see generate_audio_for_file_kokoro).
+        encoder (callable, optional): Receives the encode job of each finished file, in this
+                                      process (e.g. BackgroundEncoder.submit), instead of the
+                                      worker encoding it before taking the next file.
+
+    Returns:
+        list[bool]: Success of each job, in the order of jobs.
+
+    Raises:
+        InterruptedError: If cancelled before every file finished.
+    """
+    farm = _get_synthesis_farm(lang_code, device, repo_id, voice, num_workers, threads_per_worker, cpu_affinity,
+                               quantize and device == "cpu")
+    farm['cancel_event'].clear()
+    farm['run_event'].set()
+    progress_queue = farm['progress_queue']
+
+    results = [False] * len(jobs)
+    futures = {}
+    for job_index, (input_path, output_path) in enumerate(jobs):
+        future = farm['executor'].submit(
+            _synthesize_file_in_worker, job_index, input_path, output_path,
+            voice, speed, split_pattern, use_audio_cache, resume, batch_size, cpu_fast, chunk_size,
+            encoder is not None, pauses
+        )
+        futures[future] = job_index
+
+    def drain_progress():
+        while True:
+            try:
+                job_index, chars = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            if chars_callback: chars_callback(job_index, chars)
+
+    pending = set(futures)
+    cancelled = False
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=FARM_POLL_INTERVAL)
+            # Forward the UI's pause/cancel state to the workers
+            if cancellation_flag and cancellation_flag() and not cancelled:
+                cancelled = True
+                farm['cancel_event'].set()
+                for future in pending:
+                    future.cancel() # Files not started yet
+            if pause_event is not None and not cancelled:
+                if pause_event.is_set(): farm['run_event'].set()
+                else: farm['run_event'].clear()
+            drain_progress()
+            for future in done:
+                job_index = futures[future]
+                if future.cancelled():
+                    continue
+                file_stats = {}
+                try:
+                    results[job_index], file_stats, encode_job = future.result()
+                    _add_counts(cache_stats, file_stats)
+                    if encode_job is not None:
+                        encoder(encode_job)
+                except InterruptedError:
+                    results[job_index] = False
+                if file_callback: file_callback(job_index, results[job_index], file_stats)
+        drain_progress()
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        shutdown_synthesis_farm() # Do not leave workers running on an error
+        raise
+    if cancelled:
+        raise InterruptedError("Processing cancelled by user.")
+    return results
+
+
 # --- Main Function for Processing a Directory ---
 
 def generate_audiobooks_kokoro(
     input_dir,
     lang_code,           # Language code for the pipeline (e.g., 'a')
     voice,               # Voice identifier (e.g., "am_liam")
-    device="cuda",       # Device for TTS computation ('cuda' or 'cpu')
+    device="auto",       # Device for TTS computation ('auto', 'cuda' or 'cpu')
     output_dir=None,     # Optional: Defaults to 'input_dir_audio' sibling folder
-    audio_format=".wav", # Output audio format (ensure soundfile supports it)
+    audio_format=".wav", # Output audio format: '.wav', '.flac', '.opus', '.ogg' or '.mp3' (see audio_encoder)
     speed=1.0,
     split_pattern=r'\n+',
     progress_callback=None,      # Callback for overall progress (percentage, current_file, index, total)
     cancellation_flag=None,
     pause_event=None,
+    repo_id=DEFAULT_REPO_ID, # Hugging Face repository of the Kokoro model
+    use_audio_cache=False,   # Reuse/store synthesized segments in the audio cache
+    resume=False,            # Skip finished files and continue interrupted ones
+    batch_size=1,            # Phoneme sequences per forward pass (1: one sentence at a time)
+    num_workers=1,           # Synthesis processes; more than 1 uses generate_audiobook_batch_kokoro
+    threads_per_worker=None, # Torch threads per worker process (default: an even share of the CPUs)
+    cpu_affinity=False,      # Pin each worker process to its own CPUs (Linux)
+    cpu_fast=False,          # CPU fast mode: inference mode and tuned thread count
+    quantize=False,          # Use a model with int8 linear layers (CPU only)
+    chunk_size=None,         # Characters per synthesized segment (sentences packed per paragraph)
+    encode_bitrate=None,     # Target kbps for MP3/Opus output (None: encode_quality)
+    encode_quality=DEFAULT_ENCODE_QUALITY, # 0 (smallest) to 1 (best) for lossy output without a bitrate
+    pauses=None,             # Trim chunk silences and use these pauses in seconds (see DEFAULT_PAUSES)
+    normalize_loudness=False, # One gain for the whole book instead of peak-normalizing each file
     # Removed file_callback (merged into progress_callback)
     # Removed update_estimate_callback (handled internally if needed or by UI)
 ):
@@ -170,32 +1890,93 @@ def generate_audiobooks_kokoro(
         input_dir (str): Path to the directory containing .txt files.
         lang_code (str): Kokoro language code (e.g., 'a', 'b', 'j').
         voice (str): Kokoro voice identifier (e.g., 'am_liam').
-        device (str): Computation device ('cuda' or 'cpu').
+        device (str): Computation device ('auto', 'cuda' or 'cpu'; see resolve_device).
         output_dir (str, optional): Directory to save audio files. Defaults to sibling directory.
-        audio_format (str): File extension for audio output (e.g., '.wav', '.mp3').
+        audio_format (str): File extension for audio output ('.wav', '.flac', '.opus', '.ogg'
+                            or '.mp3'). Formats other than WAV are encoded by a background
+                            process (see audio_encoder.BackgroundEncoder) while the next file
+                            is synthesized.
         speed (float): Speech speed multiplier.
         split_pattern (str): Regex for splitting text for TTS processing.
         progress_callback (callable, optional): Reports overall progress.
             Receives: (overall_percentage, current_filename, current_index, total_files).
         cancellation_flag (callable, optional): Function returning True to cancel.
         pause_event (threading.Event, optional): Event to pause processing.
+        repo_id (str): Kokoro model repository. The pipeline for (lang_code, device, repo_id)
+                       is shared by every call in this process (see acquire_pipeline).
+        use_audio_cache (bool): If True, segments synthesized before with the same voice,
+                                speed and model are taken from the audio cache instead of
+                                being synthesized again, and new ones are stored in it.
+        resume (bool): If True, files whose audio output already exists (and has no
+                       checkpoint journal) are skipped, and files interrupted mid-way
+                       continue from their last checkpoint. Outputs are only created once
+                       complete (temp file + rename), so an existing output is finished.
+        batch_size (int): If above 1, sentences of similar length are synthesized together in
+                          batched forward passes of up to batch_size sequences.
+        num_workers (int): Number of synthesis processes. With more than one, the files are
+                           spread over a pool of workers, each with its own pipeline (see
+                           generate_audiobook_batch_kokoro); meant for CPU synthesis.
+        threads_per_worker (int, optional): Torch threads per worker process.
+        cpu_affinity (bool): Pin each worker process to its own CPUs (Linux only).
+        cpu_fast (bool): Run the model under torch.inference_mode and, on the CPU, pick the
+                         torch thread count with a short calibration run (tune_cpu_threads).
+        quantize (bool): On the CPU, use a copy of the model with int8 linear layers. How
+                         far its output drifts from the fp32 model is printed when loaded.
+        chunk_size (int, optional): Pack consecutive sentences of a paragraph into segments of
+                                    up to chunk_size characters (see pack_sentences). None
+                                    synthesizes each split_pattern piece (sentence) on its own.
+        encode_bitrate (int, optional): Target bitrate in kbps for MP3 (constant bitrate) and
+                                        Opus output. None encodes by encode_quality.
+        encode_quality (float): 0 (smallest files) to 1 (best quality) for lossy output
+                                without an encode_bitrate.
+        pauses (dict, optional): 'sentence', 'paragraph' and 'chapter' pause lengths in
+                                 seconds. The silence at the edges of every synthesized
+                                 chunk is trimmed and replaced by these pauses, and the
+                                 time saved is reported. None keeps the chunks as they are.
+        normalize_loudness (bool): Give every file of the book the same gain, from the loudness
+                                   measured while synthesizing (see BookLoudnessNormalizer).
+                                   The files are saved once the whole book is synthesized, and
+                                   the per-file stats are kept in the output directory's
+                                   loudness log. Otherwise each file is peak-normalized on its own.
 
     Returns:
         list[str]: List of paths to successfully generated audio files.
 
     Raises:
         FileNotFoundError: If input_dir does not exist.
-        ValueError: If lang_code or device is invalid.
+        ValueError: If lang_code, device or audio_format is invalid (or audio_format cannot
+                    be written by this libsndfile).
         Exception: For errors during pipeline initialization or processing.
     """
+    if num_workers > 1:
+        return generate_audiobook_batch_kokoro(
+            [(input_dir, output_dir)], lang_code, voice, device=device, audio_format=audio_format,
+            speed=speed, split_pattern=split_pattern, progress_callback=progress_callback,
+            cancellation_flag=cancellation_flag, pause_event=pause_event, repo_id=repo_id,
+            use_audio_cache=use_audio_cache, resume=resume, batch_size=batch_size, num_workers=num_workers,
+            threads_per_worker=threads_per_worker, cpu_affinity=cpu_affinity, cpu_fast=cpu_fast, quantize=quantize,
+            chunk_size=chunk_size, encode_bitrate=encode_bitrate, encode_quality=encode_quality, pauses=pauses,
+            normalize_loudness=normalize_loudness
+        )[0]
+
     start_process_time = time.time()
+    device = resolve_device(device)
     print(f"\n--- Starting Audiobook Generation Task ---")
     print(f"  Input Directory : '{input_dir}'")
     print(f"  Language / Voice: {lang_code} / {voice}")
     print(f"  Device          : {device}")
+    print(f"  Audio Cache     : {use_audio_cache}")
+    print(f"  Resume          : {resume}")
+    print(f"  Batch Size      : {batch_size}")
+    print(f"  Chunk Size      : {chunk_size or 'one sentence'}")
+    print(f"  CPU Fast Mode   : {cpu_fast}{' (int8)' if quantize else ''}")
+    print(f"  Output Format   : {describe_output_format(audio_format, encode_bitrate, encode_quality)}")
+    print(f"  Pauses          : {_describe_pauses(pauses)}")
+    print(f"  Loudness        : {'one gain per book' if normalize_loudness else 'peak-normalized per file'}")
 
     if not os.path.isdir(input_dir):
         raise FileNotFoundError(f"Input directory not found: '{input_dir}'")
+    check_output_format(audio_format) # Before any synthesis, not when the first file is saved
 
     # --- Determine and Create Output Directory ---
     if output_dir is None:
@@ -221,23 +2002,19 @@ def generate_audiobooks_kokoro(
         print(f"  Error listing files in '{input_dir}': {e}")
         raise
 
-    # --- Initialize Kokoro Pipeline ---
+    # --- Get the Shared Kokoro Pipeline ---
     pipeline = None # Define outside try block
     try:
-        print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'...")
-        init_start_time = time.time()
-        # *** CRUCIAL: Assuming KPipeline accepts 'device' argument ***
-        pipeline = KPipeline(lang_code=lang_code, device=device, repo_id='hexgrad/Kokoro-82M')
-        print(f"  Pipeline initialized in {time.time() - init_start_time:.2f}s.")
-    except AssertionError as e:
-         # Catch assertion errors specifically, often related to invalid lang_code
-         print(f"  Error: Invalid language code '{lang_code}' provided for KPipeline.")
-         print(f"  Details: {e}")
-         raise ValueError(f"Invalid language code: {lang_code}") from e
+        # Loaded (and warmed up) once per process, then reused by every book of a batch
+        pipeline, device = acquire_pipeline_with_fallback(lang_code, device, repo_id, voice=voice, quantize=quantize)
+    except ValueError:
+        raise # Invalid lang_code, already reported
     except Exception as e:
         print(f"  Error initializing Kokoro pipeline: {e}")
         traceback.print_exc()
         raise # Re-raise other initialization errors
+    if cpu_fast and device == "cpu":
+        tune_cpu_threads(pipeline, voice) # Timed once per process
 
     # --- Prepare for Progress Tracking ---
     # Pre-calculate total characters for smoother progress estimation
@@ -251,6 +2028,14 @@ def generate_audiobooks_kokoro(
             print(f"    Warning: Could not read file '{text_file}' for size calculation: {e}")
     print(f"  Total characters approx: {total_characters_all_files}")
 
+    audio_cache = get_audio_cache() if use_audio_cache else None
+    # Compressed formats are encoded in another process while the next file is synthesized
+    background_encoder = BackgroundEncoder(encode_bitrate, encode_quality) if encodes_in_background(audio_format) else None
+    encoder = background_encoder.submit if background_encoder else None
+    normalizer = None
+    if normalize_loudness:
+        normalizer = BookLoudnessNormalizer(output_dir, encoder, encode_bitrate, encode_quality)
+        encoder = normalizer.hold # Files are saved with the book gain once all are synthesized
     characters_processed_so_far = 0
     start_loop_time = time.time() # For rate calculation within the loop
     generated_files = []
@@ -281,9 +2066,15 @@ def generate_audiobooks_kokoro(
 
 
     # --- Process Each File ---
+    cache_stats = {} # Cache hit/miss counters of the whole run
     print("\n--- Processing Files ---")
+    completed = False
+    # The next file is read while the current one is synthesized
+    read_ahead = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kokoro-read-ahead")
+    next_text = read_ahead.submit(_read_text_file, os.path.join(input_dir, files[0])) if files else None
     try:
         for i, text_file in enumerate(files, start=1):
+            text_future = next_text
             if cancellation_flag and cancellation_flag():
                 print(f"\nCancellation detected before processing '{text_file}'.")
                 raise InterruptedError("Processing cancelled by user.")
@@ -296,6 +2087,21 @@ def generate_audiobooks_kokoro(
             output_filename = f"{base_name}{audio_format}"
             output_path = os.path.join(output_dir, output_filename)
 
+            try:
+                text = text_future.result()
+            except Exception:
+                text = None # Read (and reported) again by generate_audio_for_file_kokoro
+            # Read the next file while this one is synthesized
+            next_text = read_ahead.submit(_read_text_file, os.path.join(input_dir, files[i])) if i < total_files else None
+
+            if resume and is_finished_output(output_path):
+                print(f"   Skipping '{text_file}': '{output_filename}' is already finished.")
+                if text is not None:
+                    internal_chunk_progress_callback(len(text), 0.0, text_file, i, total_files) # Only affects the progress estimate
+                generated_files.append(output_path)
+                files_processed_successfully += 1
+                continue
+
             # --- Call the file generation function ---
             # Pass a lambda that captures the current file context for the internal callback
             file_chunk_callback = lambda chars, duration: internal_chunk_progress_callback(
@@ -311,7 +2117,16 @@ def generate_audiobooks_kokoro(
                 split_pattern=split_pattern,
                 cancellation_flag=cancellation_flag,
                 chunk_progress_callback=file_chunk_callback, # Use the context-aware lambda
-                pause_event=pause_event
+                pause_event=pause_event,
+                audio_cache=audio_cache,
+                resume=resume,
+                batch_size=batch_size,
+                text=text,
+                cache_stats=cache_stats,
+                cpu_fast=cpu_fast,
+                chunk_size=chunk_size,
+                encoder=encoder,
+                pauses=pauses
             )
 
             file_elapsed_time = time.time() - file_start_time
@@ -321,6 +2136,7 @@ def generate_audiobooks_kokoro(
                 files_processed_successfully += 1
             else:
                 print(f"   Failed to process '{text_file}' (check logs above)")
+        completed = True
 
     except InterruptedError as e:
          print("\n--- Audiobook Generation Cancelled ---")
@@ -334,11 +2150,31 @@ def generate_audiobooks_kokoro(
          if progress_callback: progress_callback(None, "Error", i, total_files) # Signal error
          # Don't re-raise, allow finally block to run
     finally:
+        read_ahead.shutdown(wait=True)
+        release_pipeline(lang_code, device, repo_id, quantize)
+        get_phoneme_cache().flush() # Record the phoneme cache reads of this run for eviction
+        if normalizer is not None:
+            if completed:
+                failed_paths = normalizer.finish(generated_files)
+            else:
+                # The book gain is unknown; the raw audio is kept, so a resumed run saves these files
+                failed_paths = normalizer.held_paths()
+                if failed_paths: print(f"  {len(failed_paths)} synthesized file(s) not saved (run incomplete).")
+            for failed_path in failed_paths:
+                generated_files.remove(failed_path)
+                files_processed_successfully -= 1
+        if background_encoder is not None:
+            # Files synthesized before a cancellation are still encoded
+            for failed_path in background_encoder.wait():
+                generated_files.remove(failed_path)
+                files_processed_successfully -= 1
         # --- Cleanup / Final Report ---
         print("\n--- Audiobook Generation Finished ---")
         total_process_time = time.time() - start_process_time
         print(f"  Successfully generated: {files_processed_successfully} / {total_files} files")
         print(f"  Total time elapsed  : {total_process_time:.2f} seconds")
+        _print_cache_summary(cache_stats)
+        _print_pause_summary(cache_stats)
         # Ensure progress reaches 100% only if fully completed without cancellation/error
         if files_processed_successfully == total_files and not (cancellation_flag and cancellation_flag()):
              if progress_callback: progress_callback(100, "Completed", total_files, total_files)
@@ -346,19 +2182,306 @@ def generate_audiobooks_kokoro(
     return generated_files
 
 
+def generate_audiobook_batch_kokoro(
+    tasks,               # List of (input_dir, output_dir) pairs, one per book
+    lang_code,
+    voice,
+    device="cpu",
+    audio_format=".wav",
+    speed=1.0,
+    split_pattern=r'\n+',
+    progress_callback=None,
+    cancellation_flag=None,
+    pause_event=None,
+    repo_id=DEFAULT_REPO_ID,
+    use_audio_cache=False,
+    resume=False,
+    batch_size=1,
+    num_workers=2,
+    threads_per_worker=None,
+    cpu_affinity=False,
+    cpu_fast=False,
+    quantize=False,
+    chunk_size=None,
+    encode_bitrate=None,
+    encode_quality=DEFAULT_ENCODE_QUALITY,
+    pauses=None,
+    normalize_loudness=False
+):
+    """
+    Generates the audio of several books with a pool of synthesis worker processes.
+
+    The text files of every book go into one queue, so workers move on to the next book
+    while the last files of the previous one are still being synthesized. Each worker
+    has its own pipeline and a share of the CPU threads (see plan_worker_threads).
+
+    Args:
+        tasks (list[tuple]): (input_dir, output_dir) per book. output_dir may be None
+                             (defaults to the 'input_dir_audio' sibling folder).
+        lang_code, voice, device, audio_format, speed, split_pattern, repo_id,
+        use_audio_cache, resume, batch_size, cancellation_flag, pause_event, cpu_fast, quantize, chunk_size,
+        encode_bitrate, encode_quality, pauses, normalize_loudness:
+            As for generate_audiobooks_kokoro (the time saved by pauses is reported per book, and
+            each book is normalized as soon as its last file is synthesized; workers keep their share of the threads
+            instead of tuning them, and hand compressed files to the background encoder).
+        progress_callback (callable, optional): Reports progress over all books.
+            Receives: (overall_percentage, current_filename, files_done, total_files),
+            with current_filename as 'book/file.txt'.
+        num_workers (int): Number of worker processes.
+        threads_per_worker (int, optional): Torch threads per worker (default: an even share of the CPUs).
+        cpu_affinity (bool): Pin each worker to its own CPUs (Linux).
+
+    Returns:
+        list[list[str]]: Paths of the successfully generated audio files, per task.
+
+    Raises:
+        FileNotFoundError: If an input_dir does not exist.
+        ValueError: If audio_format cannot be written.
+    """
+    start_process_time = time.time()
+    device = resolve_device(device)
+    print(f"\n--- Starting Parallel Audiobook Generation ({len(tasks)} book(s)) ---")
+    print(f"  Language / Voice: {lang_code} / {voice}")
+    print(f"  Device          : {device}")
+    print(f"  Workers         : {num_workers}")
+    print(f"  CPU Fast Mode   : {cpu_fast}{' (int8)' if quantize else ''}")
+    print(f"  Audio Cache     : {use_audio_cache}")
+    print(f"  Resume          : {resume}")
+    print(f"  Batch Size      : {batch_size}")
+    print(f"  Output Format   : {describe_output_format(audio_format, encode_bitrate, encode_quality)}")
+    print(f"  Pauses          : {_describe_pauses(pauses)}")
+    print(f"  Loudness        : {'one gain per book' if normalize_loudness else 'peak-normalized per file'}")
+    check_output_format(audio_format) # Before any synthesis, not when the first file is saved
+
+    # --- Gather the Files of Every Book ---
+    jobs = []      # (input_path, output_path) per file to synthesize
+    job_info = []  # (task_index, display name, characters) per job
+    generated_files = [[] for _ in tasks]
+    output_dirs = []
+    total_characters = 0
+    characters_processed_so_far = 0
+    total_files = 0
+    for task_index, (input_dir, output_dir) in enumerate(tasks):
+        if not os.path.isdir(input_dir):
+            raise FileNotFoundError(f"Input directory not found: '{input_dir}'")
+        book_name = os.path.basename(os.path.normpath(input_dir))
+        if output_dir is None:
+            output_dir = os.path.join(os.path.dirname(os.path.normpath(input_dir)), f"{book_name}_audio")
+        os.makedirs(output_dir, exist_ok=True)
+        output_dirs.append(output_dir)
+        for text_file in sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.txt')):
+            total_files += 1
+            input_path = os.path.join(input_dir, text_file)
+            output_path = os.path.join(output_dir, os.path.splitext(text_file)[0] + audio_format)
+            try:
+                with open(input_path, 'r', encoding='utf-8') as f:
+                    characters = len(f.read())
+            except Exception as e:
+                print(f"    Warning: Could not read file '{text_file}' for size calculation: {e}")
+                characters = 0
+            total_characters += characters
+            if resume and is_finished_output(output_path):
+                print(f"   Skipping '{book_name}/{text_file}': already finished.")
+                characters_processed_so_far += characters
+                generated_files[task_index].append(output_path)
+                continue
+            jobs.append((input_path, output_path))
+            job_info.append((task_index, f"{book_name}/{text_file}", characters))
+    print(f"  Files to process: {len(jobs)} of {total_files} ({total_characters} characters approx)")
+
+    files_done = total_files - len(jobs)
+    files_processed_successfully = files_done
+
+    def report(current_filename):
+        if progress_callback:
+            overall_progress = 0
+            if total_characters > 0:
+                overall_progress = min(max(characters_processed_so_far / total_characters * 100, 0), 100)
+            progress_callback(overall_progress, current_filename, files_done, total_files)
+
+    def on_chars(job_index, chars):
+        nonlocal characters_processed_so_far
+        characters_processed_so_far += chars
+        report(job_info[job_index][1])
+
+    book_stats = [{} for _ in tasks] # Counters per book, for the per-book pause report
+    files_left = [0 for _ in tasks] # Files per book still being synthesized
+    for task_index, _, _ in job_info:
+        files_left[task_index] += 1
+
+    # --- Encoding and Book Normalization ---
+    background_encoder = BackgroundEncoder(encode_bitrate, encode_quality) if encodes_in_background(audio_format) else None
+    encoder = background_encoder.submit if background_encoder else None
+    normalizers = {} # Task index -> BookLoudnessNormalizer, until the book is normalized
+    if normalize_loudness:
+        for task_index, output_dir in enumerate(output_dirs):
+            normalizers[task_index] = BookLoudnessNormalizer(output_dir, encoder, encode_bitrate, encode_quality)
+        book_of_output = {output_path: job_info[job_index][0] for job_index, (_, output_path) in enumerate(jobs)}
+        encoder = lambda job: normalizers[book_of_output[job['output_path']]].hold(job)
+
+    def drop_failed(task_index, failed_paths):
+        nonlocal files_processed_successfully
+        for failed_path in failed_paths:
+            if failed_path in generated_files[task_index]:
+                generated_files[task_index].remove(failed_path)
+                files_processed_successfully -= 1
+
+    def on_file(job_index, success, file_stats):
+        nonlocal files_done, files_processed_successfully
+        files_done += 1
+        task_index = job_info[job_index][0]
+        _add_counts(book_stats[task_index], file_stats)
+        name = job_info[job_index][1]
+        if success:
+            files_processed_successfully += 1
+            generated_files[task_index].append(jobs[job_index][1])
+            print(f"   [{files_done}/{total_files}] Finished '{name}'")
+        else:
+            print(f"   [{files_done}/{total_files}] Failed to process '{name}' (check logs above)")
+        files_left[task_index] -= 1
+        if not files_left[task_index] and task_index in normalizers and not (cancellation_flag and cancellation_flag()):
+            # The book is complete: save its files with the book gain while the next book is synthesized
+            drop_failed(task_index, normalizers.pop(task_index).finish(sorted(generated_files[task_index])))
+        report(name)
+
+    # --- Synthesize in the Worker Pool ---
+    cache_stats = {} # Cache hit/miss counters of the whole run
+    print("\n--- Processing Files ---")
+    completed = False
+    try:
+        if jobs:
+            synthesize_files_in_workers(
+                jobs, lang_code, voice, device=device, repo_id=repo_id,
+                num_workers=num_workers, threads_per_worker=threads_per_worker, cpu_affinity=cpu_affinity,
+                speed=speed, split_pattern=split_pattern, use_audio_cache=use_audio_cache, resume=resume,
+                batch_size=batch_size, chars_callback=on_chars, file_callback=on_file,
+                cancellation_flag=cancellation_flag, pause_event=pause_event, cache_stats=cache_stats,
+                cpu_fast=cpu_fast, quantize=quantize, chunk_size=chunk_size,
+                encoder=encoder, pauses=pauses
+            )
+        completed = True
+    except InterruptedError:
+        print("\n--- Audiobook Generation Cancelled ---")
+        if progress_callback: progress_callback(None, "Cancelled", files_done, total_files) # Signal cancellation
+    except Exception as e:
+        print(f"\n--- An Unexpected Error Occurred During Processing ---")
+        print(f"   Error: {e}")
+        traceback.print_exc()
+        if progress_callback: progress_callback(None, "Error", files_done, total_files) # Signal error
+    finally:
+        get_phoneme_cache().flush() # Record the phoneme cache reads of this run for eviction
+        for task_index, normalizer in sorted(normalizers.items()):
+            if completed:
+                drop_failed(task_index, normalizer.finish(sorted(generated_files[task_index])))
+            elif normalizer.jobs:
+                # The book gain is unknown; the raw audio is kept, so a resumed run saves these files
+                print(f"  {len(normalizer.jobs)} synthesized file(s) of book {task_index + 1} not saved (run incomplete).")
+                drop_failed(task_index, normalizer.held_paths())
+        if background_encoder is not None:
+            for failed_path in background_encoder.wait():
+                for task_index in range(len(tasks)):
+                    drop_failed(task_index, [failed_path])
+        print("\n--- Audiobook Generation Finished ---")
+        print(f"  Successfully generated: {files_processed_successfully} / {total_files} files")
+        print(f"  Total time elapsed  : {time.time() - start_process_time:.2f} seconds")
+        _print_cache_summary(cache_stats)
+        for (input_dir, _), stats in zip(tasks, book_stats):
+            _print_pause_summary(stats, os.path.basename(os.path.normpath(input_dir))[:20])
+        if completed and files_processed_successfully == total_files:
+            if progress_callback: progress_callback(100, "Completed", total_files, total_files)
+
+    # Files finish in any order; list each book's files in chapter order
+    return [sorted(files) for files in generated_files]
+
+
 # --- Functions for Testing ---
 
+def benchmark_batched_inference(
+    input_path,          # Text file with one sentence per line (e.g. an extracted chapter)
+    lang_code,
+    voice,
+    device="cpu",
+    repo_id=DEFAULT_REPO_ID,
+    batch_sizes=(4, 8, 16),
+    max_sentences=200,
+    speed=1.0,
+    quantize=False
+):
+    """
+    Compares the sentences per second of the per-sentence loop with batched inference,
+    and how far the batched audio drifts from the per-sentence audio (see compare_audio).
+
+    Both include G2P, as a real run does. Run on CPU, set torch.set_num_threads first
+    to benchmark a particular thread budget. Every run starts from the same torch seed,
+    but the random excitation of the decoder's source module is drawn per pass, so the
+    SNR also counts that noise; the log-spectral distance shows the drift better.
+
+    Args:
+        input_path (str): Text file; its first max_sentences non-empty lines are used.
+        lang_code (str): Kokoro language code.
+        voice (str): Voice identifier.
+        device (str): Computation device ('auto', 'cuda' or 'cpu'; see resolve_device).
+        repo_id (str): Kokoro model repository.
+        batch_sizes (tuple[int]): Batch sizes to measure.
+        max_sentences (int): Number of sentences to synthesize per measurement.
+        speed (float): Speech speed multiplier.
+        quantize (bool): Benchmark the model with int8 linear layers (CPU only).
+
+    Returns:
+        tuple: (rates, drifts): sentences per second, keyed by 1 (per-sentence loop) and
+               each batch size, and the compare_audio result of each batch size.
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        sentences = [line for line in f.read().splitlines() if line.strip()][:max_sentences]
+    if not sentences:
+        raise ValueError(f"No text found in '{input_path}'")
+
+    device = resolve_device(device)
+    print(f"\n--- Batched Inference Benchmark ({len(sentences)} sentences, device='{device}', "
+          f"{torch.get_num_threads()} threads) ---")
+    pipeline = get_pipeline(lang_code, device, repo_id, warm_up=True, voice=voice, quantize=quantize)
+    rates = {}
+    drifts = {}
+
+    torch.manual_seed(QUALITY_CHECK_SEED)
+    references = []
+    start_time = time.time()
+    for sentence in sentences:
+        chunks = [result.audio for result in pipeline(sentence, voice=voice, speed=speed, split_pattern=None)
+                  if result.audio is not None]
+        references.append(torch.cat(chunks).numpy().astype(np.float64) if chunks else np.zeros(0))
+    rates[1] = len(sentences) / (time.time() - start_time)
+    print(f"  Per-sentence loop : {rates[1]:7.2f} sentences/s")
+
+    for batch_size in batch_sizes:
+        window_size = batch_size * BATCH_WINDOW_FACTOR
+        torch.manual_seed(QUALITY_CHECK_SEED)
+        audios = []
+        start_time = time.time()
+        for start in range(0, len(sentences), window_size):
+            for chunks in synthesize_segments_batched(pipeline, sentences[start:start + window_size], voice, speed, batch_size):
+                audios.append(np.concatenate([audio for _, _, audio in chunks]).astype(np.float64) if chunks else np.zeros(0))
+        rates[batch_size] = len(sentences) / (time.time() - start_time)
+        drifts[batch_size] = compare_audio(references, audios)
+        print(f"  Batch size {batch_size:<6} : {rates[batch_size]:7.2f} sentences/s ({rates[batch_size] / rates[1]:.2f}x); "
+              f"drift: {format_output_drift(drifts[batch_size])}")
+    return rates, drifts
+
+
 def generate_audio_for_all_voices_kokoro(
     input_path,          # Path to the single .txt file for testing
     lang_code,           # Language code for the pipeline
     voices,              # List of voice identifiers to test
     output_dir,          # Directory to save test audio files
-    device="cuda",       # Device ('cuda' or 'cpu')
+    device="auto",       # Device ('auto', 'cuda' or 'cpu')
     speed=1.0,
     split_pattern=r'\n+',
     cancellation_flag=None, # Optional cancellation
     progress_callback=None,   # Callback(overall_perc, voice_name, index, total)
-    pause_event=None       # Optional pause event
+    pause_event=None,      # Optional pause event
+    repo_id=DEFAULT_REPO_ID,
+    cpu_fast=False,        # Run inference under torch.inference_mode
+    quantize=False         # Use a model with int8 linear layers (CPU only)
 ):
     """
     Generates audio samples for multiple voices from a single text file.
@@ -368,13 +2491,16 @@ def generate_audio_for_all_voices_kokoro(
         lang_code (str): Kokoro language code.
         voices (list[str]): List of voice identifiers to test.
         output_dir (str): Directory to save output audio files.
-        device (str): Computation device ('cuda' or 'cpu').
+        device (str): Computation device ('auto', 'cuda' or 'cpu'; see resolve_device).
         speed (float): Speech speed multiplier.
         split_pattern (str): Regex for splitting text.
         cancellation_flag (callable, optional): Function returning True to cancel.
         progress_callback (callable, optional): Reports overall progress.
         pause_event (threading.Event, optional): Event to pause processing.
+        repo_id (str): Kokoro model repository (shared pipeline, see acquire_pipeline).
+        cpu_fast, quantize (bool): As for generate_audiobooks_kokoro (without thread tuning).
     """
+    device = resolve_device(device)
     print(f"\n--- Starting Test Generation for All Voices ---")
     print(f"  Input File : '{input_path}'")
     print(f"  Language   : {lang_code}")
@@ -394,11 +2520,10 @@ def generate_audio_for_all_voices_kokoro(
         print(f"  Error creating output directory '{output_dir}': {e}")
         return
 
-    # --- Initialize Pipeline Once ---
+    # --- Get the Shared Pipeline ---
     pipeline = None
     try:
-        print(f"  Initializing Kokoro pipeline for lang='{lang_code}' on device='{device}'...")
-        pipeline = KPipeline(lang_code=lang_code, device=device)
+        pipeline, device = acquire_pipeline_with_fallback(lang_code, device, repo_id, voice=voices[0], quantize=quantize)
     except Exception as e:
         print(f"  Error initializing Kokoro pipeline: {e}")
         traceback.print_exc()
@@ -432,6 +2557,7 @@ def generate_audio_for_all_voices_kokoro(
 
     # --- Loop Through Voices ---
     print("\n--- Generating Voice Samples ---")
+    cache_stats = {} # Cache hit/miss counters of the whole run
     try:
         for i, voice in enumerate(voices, start=1):
             if cancellation_flag and cancellation_flag():
@@ -458,7 +2584,9 @@ def generate_audio_for_all_voices_kokoro(
                 split_pattern=split_pattern,
                 cancellation_flag=cancellation_flag,
                 chunk_progress_callback=test_chunk_callback, # Use context-aware lambda
-                pause_event=pause_event
+                pause_event=pause_event,
+                cache_stats=cache_stats, # Later voices reuse the phonemes of the first
+                cpu_fast=cpu_fast
             )
 
             file_elapsed_time = time.time() - file_start_time
@@ -477,7 +2605,9 @@ def generate_audio_for_all_voices_kokoro(
          print(f"   Error: {e}")
          traceback.print_exc()
     finally:
+         release_pipeline(lang_code, device, repo_id, quantize)
          print("\n--- Voice Test Generation Finished ---")
+         _print_cache_summary(cache_stats)
          # Ensure 100% is reported if fully completed
          if not (cancellation_flag and cancellation_flag()):
               if progress_callback: progress_callback(100, "Completed", total_voices, total_voices)
@@ -488,12 +2618,15 @@ def test_single_voice_kokoro(
     voice,               # Voice identifier
     output_path,         # Full path for the output audio file
     lang_code="a",       # Language code (must match voice)
-    device="cuda",       # Device ('cuda' or 'cpu')
+    device="auto",       # Device ('auto', 'cuda' or 'cpu')
     speed=1.0,
     split_pattern=r'\n+',
     cancellation_flag=None,
     progress_callback=None,   # Callback(overall_perc, filename, 1, 1)
-    pause_event=None
+    pause_event=None,
+    repo_id=DEFAULT_REPO_ID,
+    cpu_fast=False,      # Run inference under torch.inference_mode
+    quantize=False       # Use a model with int8 linear layers (CPU only)
 ):
     """
     Generates a test audio sample for a single voice from a text string.
@@ -505,18 +2638,21 @@ def test_single_voice_kokoro(
         voice (str): Kokoro voice identifier.
         output_path (str): Full path to save the output audio file.
         lang_code (str): Kokoro language code.
-        device (str): Computation device ('cuda' or 'cpu').
+        device (str): Computation device ('auto', 'cuda' or 'cpu'; see resolve_device).
         speed (float): Speech speed multiplier.
         split_pattern (str): Regex for splitting text.
         cancellation_flag (callable, optional): Function returning True to cancel.
         progress_callback (callable, optional): Reports overall progress (0-100).
         pause_event (threading.Event, optional): Event to pause processing.
+        repo_id (str): Kokoro model repository (shared pipeline, see acquire_pipeline).
+        cpu_fast, quantize (bool): As for generate_audiobooks_kokoro (without thread tuning).
 
     Returns:
         str or None: Path to the generated audio file on success, None on failure.
     """
     import tempfile # Keep import local as it's only used here
 
+    device = resolve_device(device)
     print(f"\n--- Starting Single Voice Test ---")
     print(f"  Voice      : {voice}")
     print(f"  Language   : {lang_code}")
@@ -528,6 +2664,7 @@ def test_single_voice_kokoro(
         return None
 
     temp_file_path = None # Define outside try
+    pipeline = None
     try:
         # --- Create Temporary File ---
         with tempfile.NamedTemporaryFile(mode='w+', suffix='.txt', delete=False, encoding='utf-8') as temp_file:
@@ -535,11 +2672,9 @@ def test_single_voice_kokoro(
             temp_file.write(input_text)
         print(f"  Created temp input file: '{temp_file_path}'")
 
-        # --- Initialize Pipeline ---
-        pipeline = None
+        # --- Get the Shared Pipeline ---
         try:
-            print(f"  Initializing Kokoro pipeline...")
-            pipeline = KPipeline(lang_code=lang_code, device=device)
+            pipeline, device = acquire_pipeline_with_fallback(lang_code, device, repo_id, voice=voice, quantize=quantize)
         except Exception as e:
             print(f"  Error initializing Kokoro pipeline: {e}")
             traceback.print_exc()
@@ -578,7 +2713,8 @@ def test_single_voice_kokoro(
             split_pattern=split_pattern,
             cancellation_flag=cancellation_flag,
             chunk_progress_callback=single_test_chunk_callback, # Use specific callback
-            pause_event=pause_event
+            pause_event=pause_event,
+            cpu_fast=cpu_fast
         )
         elapsed_time = time.time() - start_time
 
@@ -603,10 +2739,32 @@ def test_single_voice_kokoro(
         if progress_callback: progress_callback(None, "Error", 1, 1)
         return None
     finally:
+        if pipeline is not None:
+            release_pipeline(lang_code, device, repo_id, quantize)
         # --- Clean up Temporary File ---
         if temp_file_path and os.path.exists(temp_file_path):
             try:
                 os.remove(temp_file_path)
                 # print(f"  Cleaned up temp file: '{temp_file_path}'") # Optional debug log
             except OSError as e:
-                print(f"  Warning: Could not remove temporary file '{temp_file_path}': {e}")
\ No newline at end of file
+                print(f"  Warning: Could not remove temporary file '{temp_file_path}': {e}")
+
+
+# --- Benchmark Entry Point ---
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark batched Kokoro inference against the per-sentence loop.")
+    parser.add_argument("input_path", help="Text file with one sentence per line (e.g. an extracted chapter)")
+    parser.add_argument("--voice", default="af_heart")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads (default: torch's choice)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--sentences", type=int, default=200)
+    parser.add_argument("--int8", action="store_true", help="Benchmark the int8-quantized model (CPU; prints its quality check)")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    benchmark_batched_inference(
+        args.input_path, args.voice[0], args.voice, device=args.device,
+        batch_sizes=tuple(args.batch_sizes), max_sentences=args.sentences, quantize=args.int8
+    )
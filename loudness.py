@@ -0,0 +1,130 @@
+# loudness.py
+
+import json
+import os
+
+import numpy as np
+
+# --- Configuration ---
+LOUDNESS_BLOCK_SECONDS = 0.4 # Measurement block length (as in ITU-R BS.1770 / EBU R 128)
+LOUDNESS_BIN_DB = 0.25 # Width of the block loudness histogram bins
+ABSOLUTE_GATE_DB = -70.0 # Blocks quieter than this (pauses, silence) are not counted
+RELATIVE_GATE_DB = -10.0 # Blocks more than this below the ungated level are not counted either
+TARGET_LOUDNESS_DB = -20.0 # Gated loudness of a normalized book (dB full scale), unless its peaks limit the gain
+GAIN_TOLERANCE_DB = 0.1 # Finished files already within this of the book gain are not rewritten
+LOUDNESS_LOG_NAME = "loudness.json" # Per-file stats and gains of a book, kept in its output directory
+
+# --- Measurement ---
+class LoudnessMeter:
+    """
+    Measures the loudness of audio streamed through it, in constant memory.
+
+    The audio is cut into LOUDNESS_BLOCK_SECONDS blocks (carrying the remainder over to
+    the next add()), and each block's mean square goes into a histogram of LOUDNESS_BIN_DB
+    bins that keeps the block count and energy sum per bin. Histograms of several files
+    can be merged, so the gated loudness of a whole book is computed from the stats of
+    its files without reading the audio again. The measurement is a plain (unweighted)
+    block RMS: every file is the same synthetic voice, so frequency weighting would not
+    change how the files compare.
+    """
+
+    def __init__(self, samplerate):
+        self.block_samples = max(1, round(LOUDNESS_BLOCK_SECONDS * samplerate))
+        self.bins = {} # Bin index -> [blocks, sum of block mean squares]
+        self.num_blocks = 0
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def add(self, audio):
+        """Measures the next samples of mono float32 audio."""
+        if self._carry.size:
+            audio = np.concatenate([self._carry, audio])
+        num_blocks = len(audio) // self.block_samples
+        self._carry = audio[num_blocks * self.block_samples:].copy()
+        if not num_blocks:
+            return
+        self.num_blocks += num_blocks
+        blocks = audio[:num_blocks * self.block_samples].reshape(num_blocks, self.block_samples)
+        energy = np.einsum('ij,ij->i', blocks, blocks, dtype=np.float64) / self.block_samples
+        energy = energy[energy > 10 ** (ABSOLUTE_GATE_DB / 10)]
+        if not energy.size:
+            return
+        indices = np.floor(10 * np.log10(energy) / LOUDNESS_BIN_DB).astype(np.int64)
+        bin_ids, inverse = np.unique(indices, return_inverse=True)
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=energy)
+        for bin_id, count, total in zip(bin_ids.tolist(), counts.tolist(), sums.tolist()):
+            entry = self.bins.setdefault(bin_id, [0, 0.0])
+            entry[0] += count
+            entry[1] += total
+
+    def stats(self):
+        """
+        Returns the measurement as a JSON-serialisable dict: 'bins' ([bin, blocks, energy sum]
+        per non-empty bin), 'blocks' (all complete blocks, silent ones included) and
+        'loudness_db' (gated loudness, None if silent).
+        """
+        stats = {'bins': [[bin_id, count, total] for bin_id, (count, total) in sorted(self.bins.items())],
+                 'blocks': self.num_blocks}
+        stats['loudness_db'] = gated_loudness([stats])
+        return stats
+
+def gated_loudness(stats_list):
+    """
+    Returns the gated loudness (dB full scale) of one or more measurements (see
+    LoudnessMeter.stats) taken together, or None if they hold no audible blocks.
+
+    Blocks below ABSOLUTE_GATE_DB were never counted; of the rest, bins more than
+    RELATIVE_GATE_DB below the mean level are left out, so quiet passages and pauses
+    do not pull the level down.
+    """
+    merged = {}
+    for stats in stats_list:
+        for bin_id, count, total in stats['bins']:
+            entry = merged.setdefault(bin_id, [0, 0.0])
+            entry[0] += count
+            entry[1] += total
+    blocks = sum(count for count, _ in merged.values())
+    if not blocks:
+        return None
+    threshold_db = 10 * np.log10(sum(total for _, total in merged.values()) / blocks) + RELATIVE_GATE_DB
+    gated = [(count, total) for bin_id, (count, total) in merged.items() if (bin_id + 1) * LOUDNESS_BIN_DB > threshold_db]
+    return float(10 * np.log10(sum(total for _, total in gated) / sum(count for count, _ in gated)))
+
+def book_gain(stats_list, peaks, peak_limit):
+    """
+    Returns the one gain for every file of a book: the gain that brings the book's gated
+    loudness to TARGET_LOUDNESS_DB, lowered if needed so the loudest peak of any file
+    stays at peak_limit.
+
+    Args:
+        stats_list (list[dict]): Measurement of each file (see LoudnessMeter.stats).
+        peaks (list[float]): Peak absolute sample value of each file.
+        peak_limit (float): Highest allowed peak after the gain (fraction of full scale).
+
+    Returns:
+        float: Gain for float samples (1.0 if the book is silent).
+    """
+    max_peak = max(peaks, default=0.0)
+    loudness_db = gated_loudness(stats_list)
+    if loudness_db is None or max_peak <= 0:
+        return 1.0
+    return min(10 ** ((TARGET_LOUDNESS_DB - loudness_db) / 20), peak_limit / max_peak)
+
+# --- Loudness Log ---
+def read_loudness_log(output_dir):
+    """Returns the loudness log of a book's output directory ({'files': {name: entry}}), empty if there is none."""
+    try:
+        with open(os.path.join(output_dir, LOUDNESS_LOG_NAME), 'r', encoding='utf-8') as f:
+            log = json.load(f)
+        if isinstance(log.get('files'), dict):
+            return log
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'files': {}}
+
+def write_loudness_log(output_dir, log):
+    """Writes the loudness log of a book's output directory atomically (temp + rename)."""
+    path = os.path.join(output_dir, LOUDNESS_LOG_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(log, f, indent=1)
+    os.replace(path + '.tmp', path)
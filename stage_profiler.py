@@ -0,0 +1,124 @@
+# stage_profiler.py
+
+import json
+import time
+
+class StageProfiler:
+    """
+    Accumulates wall time, call count and characters in/out per named stage.
+
+    Stages are recorded with add() around the code being measured, so the cost of
+    profiling is two perf_counter() calls per stage call. Totals from other processes
+    (see stages) can be folded in with merge(), which is why stage seconds may add up
+    to more than the wall time of a run that used worker processes.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.stages = {} # stage -> [calls, seconds, chars_in, chars_out], in first-recorded order
+        self.start_time = time.perf_counter()
+
+    def add(self, stage, seconds, chars_in=0, chars_out=0):
+        """Records one call of stage that took `seconds` and turned chars_in characters into chars_out."""
+        totals = self.stages.get(stage)
+        if totals is None:
+            self.stages[stage] = [1, seconds, chars_in, chars_out]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += chars_in
+            totals[3] += chars_out
+
+    def merge(self, stages):
+        """Adds the stage totals of another profiler (its .stages dict) to this one."""
+        for stage, (calls, seconds, chars_in, chars_out) in stages.items():
+            totals = self.stages.setdefault(stage, [0, 0.0, 0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += chars_in
+            totals[3] += chars_out
+
+    def report(self, **info):
+        """
+        Builds a JSON-serialisable report of the stages recorded so far.
+
+        Args:
+            **info: Extra top-level fields (book, options, ...) copied into the report.
+
+        Returns:
+            dict: {'name', 'wall_seconds', 'stages': [...], **info}. Each stage entry has
+                  'stage', 'calls', 'seconds', 'chars_in', 'chars_out' and 'share'
+                  (seconds as a fraction of wall_seconds).
+        """
+        wall_seconds = time.perf_counter() - self.start_time
+        report = {'name': self.name, 'wall_seconds': round(wall_seconds, 4)}
+        report.update(info)
+        report['stages'] = _stage_entries(self.stages, wall_seconds)
+        return report
+
+def _stage_entries(stages, wall_seconds):
+    return [
+        {
+            'stage': stage,
+            'calls': calls,
+            'seconds': round(seconds, 4),
+            'chars_in': chars_in,
+            'chars_out': chars_out,
+            'share': round(seconds / wall_seconds, 4) if wall_seconds > 0 else 0.0,
+        }
+        for stage, (calls, seconds, chars_in, chars_out) in stages.items()
+    ]
+
+def print_report(report):
+    """Prints the stages of a report as a table, slowest first."""
+    print(f"  Stage timings for '{report['name']}' ({report['wall_seconds']:.2f} s wall):")
+    for entry in sorted(report['stages'], key=lambda entry: entry['seconds'], reverse=True):
+        print(f"    {entry['stage']:<24} {entry['seconds'] * 1000:10.1f} ms  {entry['calls']:7d} calls"
+              f"  {entry['chars_in']:>11,} -> {entry['chars_out']:>11,} chars")
+
+def write_report(report, path):
+    """Writes a report (or summary) to path as indented JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+def read_report(path):
+    """Reads a report written by write_report. Returns None if it is missing or unreadable."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def summarize_reports(reports, name="batch"):
+    """
+    Aggregates several per-book reports into one summary.
+
+    Args:
+        reports (Iterable[dict]): Reports built by StageProfiler.report().
+        name (str): Name of the summary.
+
+    Returns:
+        dict: {'name', 'books', 'wall_seconds', 'stages', 'per_book'}. wall_seconds is the
+              sum over books (books extracted concurrently overlap in real time), stages
+              are summed across books and per_book lists each book's wall time.
+    """
+    stages = {}
+    per_book = []
+    wall_seconds = 0.0
+    for report in reports:
+        wall_seconds += report['wall_seconds']
+        per_book.append({'name': report['name'], 'wall_seconds': report['wall_seconds']})
+        for entry in report['stages']:
+            totals = stages.setdefault(entry['stage'], [0, 0.0, 0, 0])
+            totals[0] += entry['calls']
+            totals[1] += entry['seconds']
+            totals[2] += entry['chars_in']
+            totals[3] += entry['chars_out']
+    per_book.sort(key=lambda book: book['wall_seconds'], reverse=True)
+    return {
+        'name': name,
+        'books': len(per_book),
+        'wall_seconds': round(wall_seconds, 4),
+        'stages': _stage_entries(stages, wall_seconds),
+        'per_book': per_book,
+    }
@@ -0,0 +1,249 @@
+"""
+Frozen copy of the text cleaning rules as they were before the compiled rule engine
+(extract.py at the baseline commit). The equivalence tests compare the current
+pipeline against these; do not change them when the cleaning rules change.
+"""
+
+import regex as re
+import unicodedata
+from num2words import num2words
+
+OVERLAP_CHECK_LINES = 20
+
+def normalize_text(text):
+    """Apply Unicode normalization and fix common problematic characters."""
+    # NFKC decomposes ligatures and compatibility characters
+    text = unicodedata.normalize('NFKC', text)
+    # Specific replacements for characters normalization might not handle as desired
+    text = text.replace('—', ', ') # Em dash with comma space (often better for TTS pause)
+    text = text.replace('–', ', ') # En dash
+    text = text.replace('«', '"').replace('»', '"') # Guillemets to standard quotes
+    # Replace various apostrophe/quote types with standard ones
+    text = text.replace(chr(8216), "'").replace(chr(8217), "'") # ‘ ’ -> '
+    text = text.replace(chr(8220), '"').replace(chr(8221), '"') # “ ” -> "
+    # Add spaces around hyphens used as separators (like in ranges, if desired)
+    # text = re.sub(r'(?<=\w)-(?=\w)', ' - ', text) # Optional: might affect compound words
+
+    # Fix specific odd characters observed (add more if found)
+    # text = text.replace('ĕ', 'e') # If 'ĕ' consistently represents 'e' due to font issues
+    # text = text.replace('', 'Th') # If Th ligature consistently causes issues
+
+    return text
+
+def expand_abbreviations_and_initials(text):
+    """Expand common abbreviations and fix spaced initials."""
+    abbreviations = {
+        r'\bMr\.': 'Mister', r'\bMrs\.': 'Misses', r'\bMs\.': 'Miss', r'\bDr\.': 'Doctor',
+        r'\bProf\.': 'Professor', r'\bJr\.': 'Junior', r'\bSr\.': 'Senior',
+        r'\bvs\.': 'versus', r'\betc\.': 'etcetera', r'\bi\.e\.': 'that is',
+        r'\be\.g\.': 'for example', r'\bcf\.': 'compare', r'\bSt\.': 'Saint', # Changed St. -> Saint, more common? Or 'Street'? Needs context. Assume Saint for now.
+        r'\bVol\.': 'Volume', r'\bNo\.': 'Number', r'\bpp\.': 'pages', r'\bp\.': 'page',
+        # Add more domain-specific ones if needed
+    }
+    # Expand standard abbreviations
+    for abbr, expansion in abbreviations.items():
+        text = re.sub(abbr, expansion, text, flags=re.IGNORECASE)
+
+    # Fix initials like "E. B. White" -> "E B White"
+    # Looks for sequences of (CapitalLetter + Period + OptionalSpace) followed by another CapitalLetter
+    # Using positive lookahead to handle sequences correctly.
+    text = re.sub(r'([A-Z])\.(?=\s*[A-Z])', r'\1', text)
+    # Clean up any potential double spaces left by the above
+    text = re.sub(r' +', ' ', text)
+
+    return text
+
+def convert_numbers(text):
+    """Convert integers and years to words. Leaves decimals and other numbers."""
+    # Replace commas in numbers (thousand separators)
+    text = re.sub(r'(?<=\d),(?=\d)', '', text)
+
+    def replace_match(match):
+        num_str = match.group(0)
+        try:
+            # Handle potential decimals - leave them as digits for now, TTS often handles them well
+            if '.' in num_str:
+                return num_str
+            num = int(num_str)
+            # Year handling (common range)
+            if 1500 <= num <= 2100:
+                # Use 'year' format which typically reads digits (e.g., "nineteen eighty-four")
+                # If you prefer "one thousand nine hundred eighty four", change to 'cardinal'
+                return num2words(num, to='year')
+            # Handle ordinal numbers (e.g., 1st, 2nd) - num2words handles suffixes like 'st'
+            elif match.group(1):
+                 # num2words can convert directly to ordinal words
+                 return num2words(num, to='ordinal')
+            # Default: convert cardinal numbers
+            else:
+                 # Optional: Add threshold? Only convert small numbers?
+                 # if num < 1000: return num2words(num) else: return num_str
+                 return num2words(num)
+        except ValueError:
+            return num_str # Return original if not a valid number
+
+    # Regex to find integers possibly followed by ordinal suffixes (st, nd, rd, th)
+    # We target whole numbers primarily, potentially with ordinal indicators
+    # Make suffix optional and capture it to decide if ordinal conversion is needed
+    pattern = r'\b(\d+)(st|nd|rd|th)?\b'
+    text = re.sub(pattern, replace_match, text)
+    return text
+
+def handle_sentence_ends_and_pauses(text):
+    """Ensure sentences end cleanly and handle potential pauses."""
+    # Add a space before punctuation if missing (helps TTS parsing)
+    text = re.sub(r'(?<=\w)([.,!?;:])', r' \1', text)
+    # Normalize multiple spaces
+    text = re.sub(r' +', ' ', text)
+
+    # Ensure common sentence endings have a period if missing (e.g. lists)
+    # This is less aggressive than forcing periods everywhere
+    lines = text.splitlines()
+    processed_lines = []
+    for line in lines:
+        stripped_line = line.strip()
+        # Add period if line isn't empty, doesn't end in punctuation, isn't a list item, and has enough words
+        if stripped_line and \
+           not re.search(r'[.!?;:]$', stripped_line) and \
+           not re.match(r'^[-\*\u2022•\d+\.\s]+', stripped_line) and \
+           len(stripped_line.split()) > 3:
+             line += '.' # Add period only if it seems like a sentence fragment needing termination
+        processed_lines.append(line)
+    text = '\n'.join(processed_lines)
+
+    # Replace semicolons with commas (often better for TTS pause)
+    text = text.replace(';', ',')
+    # Replace hyphens used as pauses (like in dialogues) with commas - more specific pattern
+    text = re.sub(r'\s+-\s+', ', ', text) # Requires space around hyphen
+    # Optional: Replace exclamation marks with periods if excitement is not desired
+    # text = text.replace('!', '.')
+    # Optional: Replace question marks with periods if intonation is not desired
+    # text = text.replace('?', '.')
+
+    # Add newline after sentence-ending punctuation for potential TTS break cues
+    # Ensure space doesn't exist before newline, add it if needed for clarity.
+    # This version adds newline *after* the punctuation and a space.
+    text = re.sub(r'([.!?:])\s*', r'\1\n', text) # Ensures newline separation after sentence ends
+
+    return text
+
+def remove_artifacts(text):
+    """Remove common extraction artifacts like citations, excessive newlines etc."""
+    # Remove bracketed numbers (citations, footnotes)
+    text = re.sub(r'\[\s*\d+\s*\]', '', text)
+    # Remove page numbers (simple standalone numbers on a line) - might need refinement
+    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
+    # Remove lines that are just punctuation (often artifacts)
+    text = re.sub(r'^\s*[.,;:!?\-—–_]+\s*$', '', text, flags=re.MULTILINE)
+    # Collapse multiple blank lines into a single blank line
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    # Remove leading/trailing whitespace from the whole text
+    text = text.strip()
+    return text
+
+def join_wrapped_lines(text):
+    """Join lines that seem to be wrapped mid-sentence. More robust."""
+    lines = text.splitlines()
+    result_lines = []
+    if not lines:
+        return ""
+
+    buffer = lines[0]
+    for i in range(1, len(lines)):
+        current_line = lines[i]
+        prev_line_stripped = buffer.strip() # Check the buffered content so far
+
+        # Heuristic: Join if previous line doesn't end with sentence punctuation
+        # AND current line doesn't look like a new paragraph/header/list item
+        # This tries to avoid joining across paragraphs or list items.
+        if (prev_line_stripped and # Don't join if buffer is empty
+            not re.search(r'[.!?:)"»’]$', prev_line_stripped) and # Doesn't end like a sentence
+            not re.match(r'^[\sA-Z\d"«‘\[\*\-\u2022•]', current_line.strip()) and # Current line doesn't start like a new para/header/list
+            len(prev_line_stripped.split()) > 1): # Avoid joining single-word lines too eagerly
+             # Join with a space
+             buffer += " " + current_line.strip()
+        else:
+             # If previous line looks like end of sentence, or current line looks like start of new section
+             result_lines.append(buffer) # Add completed buffer
+             buffer = current_line # Start new buffer
+
+    result_lines.append(buffer) # Add the last buffer content
+
+    # Filter out potentially empty lines created during processing before joining
+    return '\n'.join(filter(None, [line.strip() for line in result_lines]))
+
+
+def clean_pipeline(text):
+    """Apply the full cleaning pipeline in order."""
+    if not text: return ""
+    # print("--- Before clean ---\n", text[:500]) # Debug
+    text = normalize_text(text)
+    # print("--- After normalize ---\n", text[:500]) # Debug
+    text = join_wrapped_lines(text) # Join lines SHOULD be early
+    # print("--- After join lines ---\n", text[:500]) # Debug
+    text = expand_abbreviations_and_initials(text)
+    # print("--- After abbreviations ---\n", text[:500]) # Debug
+    text = convert_numbers(text)
+    # print("--- After numbers ---\n", text[:500]) # Debug
+    text = handle_sentence_ends_and_pauses(text) # Sentence handling before artifact removal
+    # print("--- After sentence ends ---\n", text[:500]) # Debug
+    text = remove_artifacts(text)
+    # print("--- After artifacts ---\n", text[:500]) # Debug
+    # Final whitespace cleanup
+    text = re.sub(r' +', ' ', text)
+    # Consolidate newlines: single newlines for within-paragraph breaks, double for paragraph ends
+    text = re.sub(r'\n\n+', '\n\n', text) # Ensure max 2 newlines
+    text = text.strip()
+    # print("--- After final cleanup ---\n", text[:500]) # Debug
+    return text
+
+
+def remove_overlap(prev_text, curr_text, num_lines=OVERLAP_CHECK_LINES):
+    """
+    Checks if the end of prev_text overlaps with the start of curr_text
+    and returns prev_text with the overlap removed. Based on line comparison.
+    """
+    if not prev_text or not curr_text:
+        return prev_text
+
+    prev_lines = prev_text.splitlines()
+    curr_lines = curr_text.splitlines()
+
+    # Don't check if either text is too short
+    if not prev_lines or not curr_lines:
+        return prev_text
+
+    max_possible_overlap = min(len(prev_lines), len(curr_lines), num_lines)
+
+    for overlap_size in range(max_possible_overlap, 0, -1):
+        # Compare last `overlap_size` lines of prev with first `overlap_size` lines of curr
+        prev_suffix = prev_lines[-overlap_size:]
+        curr_prefix = curr_lines[:overlap_size]
+
+        # Basic check: are the lines identical?
+        # More robust checks could involve fuzzy matching, but start simple.
+        if prev_suffix == curr_prefix:
+            print(f"    Overlap detected ({overlap_size} lines). Removing from previous chapter end.")
+            # Return previous text excluding the overlapping lines
+            return "\n".join(prev_lines[:-overlap_size])
+
+    # No overlap found
+    return prev_text
+
+
+def final_cleanup(text):
+    """The final whitespace cleanup of clean_pipeline above, as a stage of its own."""
+    text = re.sub(r' +', ' ', text)
+    text = re.sub(r'\n\n+', '\n\n', text)
+    return text.strip()
+
+# Stage name (as in extract.CLEAN_PIPELINE_STAGES) -> frozen implementation
+LEGACY_STAGES = {
+    "normalize": normalize_text,
+    "join_lines": join_wrapped_lines,
+    "abbreviations": expand_abbreviations_and_initials,
+    "numbers": convert_numbers,
+    "sentence_ends": handle_sentence_ends_and_pauses,
+    "artifacts": remove_artifacts,
+    "final_cleanup": final_cleanup,
+}
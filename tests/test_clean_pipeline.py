@@ -0,0 +1,71 @@
+"""Equivalence of the compiled cleaning rules (extract.CLEAN_PIPELINE_STAGES) with the frozen originals."""
+
+import random
+
+import pytest
+
+import extract
+import legacy_extract
+
+# Pieces the fuzzer builds text from: abbreviations (including back-to-back ones), initials,
+# numbers, ordinals and years, punctuation, quotes and dashes, and odd Unicode.
+ATOMS = [
+    "Mr.", "mr.", "MRS.", "Ms.", "Dr.", "Prof.", "Jr.", "Sr.", "vs.", "etc.", "i.e.", "e.g.", "I.E.", "cf.",
+    "St.", "Vol.", "No.", "pp.", "p.", "P.", "Mr.p.", "vs.etc.", "p.Mr.", "i.e.g.", "e.i.e.", "Mr.Mrs.Dr.",
+    "A.", "B.", "E. B. White", "J.R.R.", "x", "word", "Word", "WORD", "the", "and", " ", "  ", "\n", "\n\n",
+    "\n \n", "\n\n\n", "\t", "1", "12", "1984", "2100", "1499", "3rd", "21st", "2nd", "4th", "1,000",
+    "12,345,678", "3.14", "0", "10000", "10001", "007", "99999999999999999999", ",", ".", "!", "?", ";", ":",
+    "-", " - ", "—", "–", "«", "»", "‘", "’", "“", "”", "ﬁ", "½", "[12]", "[ 3 ]", "(", ")", "\"", "'", "*",
+    "•", "é", "ß", "İ", "ſ", "K", "ा", "नमस्ते", "_", "...", "?!", "\r\n", "\x0c", "\xa0", "end", "x1st", "1stx",
+]
+FUZZ_CASES = 400 # Random texts per stage
+
+SAMPLES = [
+    "Mr. and Mrs. Smith met Dr. Jones, Prof. Lee and St. John at No. 10 on p. 4 (see pp. 12-14, cf. Vol. 2).",
+    "E. B. White and J.R.R. Tolkien, i.e. two authors, e.g. of fiction, etc. were born vs. died.",
+    "In 1984 he paid 1,250 dollars for the 3rd and 21st copies; 3.14 is left as is.\nThe 2nd line\nwraps here",
+    "CHAPTER 1\n\n12\n\nIt was a dark night - or so they said [3] - and the rain\nfell on the roof of the\nold house.",
+    "“Quoted” ‘text’ «here» — and – dashes; lists:\n• one item\n- another item\n* a third item here now",
+    "",
+    "   \n\n  ",
+]
+
+def _fuzz_text(rng):
+    return "".join(rng.choice(ATOMS) + rng.choice(["", " ", " ", "\n"]) for _ in range(rng.randint(0, 80)))
+
+def _fuzz_texts(seed):
+    rng = random.Random(seed)
+    return [_fuzz_text(rng) for _ in range(FUZZ_CASES)]
+
+def test_stage_list_matches_frozen_rules():
+    assert [name for name, _ in extract.CLEAN_PIPELINE_STAGES] == list(legacy_extract.LEGACY_STAGES)
+
+@pytest.mark.parametrize("name,stage", extract.CLEAN_PIPELINE_STAGES, ids=[n for n, _ in extract.CLEAN_PIPELINE_STAGES])
+def test_stage_matches_frozen_rules(name, stage):
+    legacy_stage = legacy_extract.LEGACY_STAGES[name]
+    for text in SAMPLES + _fuzz_texts(seed=name):
+        assert stage(text) == legacy_stage(text), repr(text)
+
+def test_clean_pipeline_matches_frozen_rules():
+    for text in SAMPLES + _fuzz_texts(seed="pipeline"):
+        assert extract.clean_pipeline(text) == legacy_extract.clean_pipeline(text), repr(text)
+
+def test_clean_pipeline_samples():
+    assert extract.clean_pipeline(SAMPLES[0]).startswith("Mister and Misses Smith met Doctor Jones")
+    assert "nineteen eighty-four" in extract.clean_pipeline(SAMPLES[2])
+    assert "E B White" in extract.clean_pipeline(SAMPLES[1])
+
+def test_text_document_skips_stages_already_run():
+    for text in SAMPLES:
+        doc = extract.clean_pipeline(extract.TextDocument.from_pages(text.split("\n")))
+        assert doc.text == extract.clean_pipeline(text)
+        assert doc.stages_run == extract.ALL_CLEAN_STAGES
+        # Cleaned text (e.g. EPUB chapters combined into a whole book) is not cleaned again
+        cleaned = extract.TextDocument(doc.text, stages_run=extract.ALL_CLEAN_STAGES)
+        assert extract.clean_pipeline(cleaned).text == doc.text
+
+def test_benchmark_reports_every_stage(capsys):
+    results = extract.benchmark_clean_pipeline(" ".join(SAMPLES) * 20, repeats=1)
+    assert [name for name, _, _ in results] == [name for name, _ in extract.CLEAN_PIPELINE_STAGES] + ["total"]
+    assert all(seconds >= 0 and mb_per_second > 0 for _, seconds, mb_per_second in results)
+    assert "MB/s" in capsys.readouterr().out
@@ -0,0 +1,75 @@
+"""Equivalence of the linear join_wrapped_lines and remove_overlap with the frozen originals."""
+
+import contextlib
+import io
+import random
+
+import pytest
+
+import extract
+import legacy_extract
+
+# Every separator str.splitlines() breaks on, so the line-based passes see the same lines
+LINE_SEPARATORS = ["\n", "\r\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029"]
+JOIN_ATOMS = ["word", "Word", "two words", "end.", "end!", "ends:", "(aside)", "quote\"", "»", "’", "1.", "• item",
+              "- item", "* item", "[note]", "«open", "‘open", "x", " ", "  ", "\t", "", "tail,", "é", "ß"]
+OVERLAP_ATOMS = ["a", "b", "ab", "", "", " ", "x y"]
+FUZZ_CASES = 2000
+
+def _quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()): # remove_overlap reports each overlap
+        return func(*args)
+
+def _join_text(rng):
+    pieces = []
+    for _ in range(rng.randint(0, 40)):
+        pieces.append(" ".join(rng.choice(JOIN_ATOMS) for _ in range(rng.randint(0, 4))))
+        pieces.append(rng.choice(LINE_SEPARATORS + ["\n"] * 6 + ["\n\n", " \n"]))
+    return "".join(pieces)
+
+def _overlap_text(rng, num_lines):
+    separators = LINE_SEPARATORS + ["\n\n", " "]
+    return "".join(rng.choice(OVERLAP_ATOMS) + rng.choice(separators) for _ in range(num_lines))
+
+def test_join_wrapped_lines_matches_frozen_version():
+    rng = random.Random(3)
+    samples = [
+        "", "\n", "one", "It was a dark night and the\nrain fell on the\nroof.\nNew paragraph here.",
+        "wrapped across\r\nwindows line\r\nends. And\r\nmore text\r\n",
+        "a b\u2028c d\u2029e f\x85g\x0bh\x0ci\x1cj\rk",
+    ]
+    for text in samples + [_join_text(rng) for _ in range(FUZZ_CASES)]:
+        assert extract.join_wrapped_lines(text) == legacy_extract.join_wrapped_lines(text), repr(text)
+
+def test_join_wrapped_lines_long_paragraph():
+    # One paragraph wrapped over many lines (quadratic in the old version)
+    text = "\n".join("and the story goes on" for _ in range(2000))
+    assert extract.join_wrapped_lines(text) == legacy_extract.join_wrapped_lines(text)
+
+@pytest.mark.parametrize("window", [1, 2, 3, 7, extract.OVERLAP_WINDOW_CHARS])
+def test_remove_overlap_matches_frozen_version(monkeypatch, window):
+    # Tiny windows make _edge_lines grow its window many times and cut lines (and CRLF pairs) at the edge
+    monkeypatch.setattr(extract, "OVERLAP_WINDOW_CHARS", window)
+    rng = random.Random(window)
+    for _ in range(FUZZ_CASES):
+        shared = _overlap_text(rng, rng.randint(0, 6))
+        prev_text = _overlap_text(rng, rng.randint(0, 30)) + shared
+        curr_text = shared + _overlap_text(rng, rng.randint(0, 30)) + rng.choice(["", "a", "\n"])
+        num_lines = rng.choice([1, 2, 3, 5, 20])
+        expected = _quiet(legacy_extract.remove_overlap, prev_text, curr_text, num_lines)
+        actual = _quiet(extract.remove_overlap, prev_text, curr_text, num_lines)
+        assert actual == expected, (window, num_lines, prev_text, curr_text)
+
+def test_remove_overlap_long_chapters():
+    lines = [f"Line {i} of the chapter." for i in range(20000)]
+    prev_text = "\r\n".join(lines)
+    curr_text = "\n".join(lines[-5:] + ["The next chapter."])
+    assert _quiet(extract.remove_overlap, prev_text, curr_text) == "\n".join(lines[:-5])
+    assert _quiet(extract.remove_overlap, prev_text, "Unrelated.") is prev_text
+
+def test_benchmark_reports_every_pass(capsys):
+    text = "\n".join("a wrapped line of text" for _ in range(500))
+    results = extract.benchmark_structural_passes(text, repeats=1)
+    assert [name for name, _, _ in results] == ["join_lines", "overlap_found", "overlap_none"]
+    assert all(mb_per_second > 0 for _, _, mb_per_second in results)
+    assert "MB/s" in capsys.readouterr().out
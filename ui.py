@@ -13,18 +13,42 @@ import json
 import subprocess # For opening folders cross-platform
 
 # Keep these imports - assuming they exist and work
-from extract import extract_book
+from extract import extract_book, extract_books, clear_extraction_cache, save_profile_summary, PROFILE_SUMMARY_NAME
 from generate_audiobook_kokoro import (
     generate_audiobooks_kokoro,
+    generate_audiobook_batch_kokoro,
     generate_audio_for_all_voices_kokoro,
     test_single_voice_kokoro,
+    clear_audio_cache,
+    shutdown_synthesis_farm,
+    available_devices,
+    DEFAULT_PAUSES,
     available_voices # Assuming this function is now in kokoro module
 )
+from audio_encoder import DEFAULT_ENCODE_QUALITY, available_output_formats, shutdown_encoder_pool
+from assemble_audiobook import assemble_book_directory
 
 # --- Constants ---
 CONFIG_FILE = "config.json"
 DEFAULT_THEME = "flatly"
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FORMAT_LABELS = { # Output extension -> label in the format list (only formats libsndfile can write are offered)
+    ".wav": ".wav (High Quality)",
+    ".flac": ".flac (Lossless, Smaller)",
+    ".opus": ".opus (Smallest)",
+    ".ogg": ".ogg (Vorbis)",
+    ".mp3": ".mp3 (Smaller Size)",
+}
+LOSSLESS_FORMATS = (".wav", ".flac") # Compression settings do not apply
+ENCODING_OPTIONS = { # Compression label -> (bitrate in kbps or 0, quality); bitrates apply to MP3 and Opus
+    "Best quality": (0, 0.9),
+    "Balanced": (0, DEFAULT_ENCODE_QUALITY),
+    "Smallest": (0, 0.4),
+    "32 kbps": (32, DEFAULT_ENCODE_QUALITY),
+    "64 kbps": (64, DEFAULT_ENCODE_QUALITY),
+    "96 kbps": (96, DEFAULT_ENCODE_QUALITY),
+    "128 kbps": (128, DEFAULT_ENCODE_QUALITY),
+}
 
 # --- Helper Classes ---
 
@@ -61,6 +85,10 @@ class SourceFrame(tb.Frame):
         self.extracted_text_dir = tk.StringVar() # Auto-populated output
         self.use_toc = tk.BooleanVar(value=True)
         self.extract_mode = tk.StringVar(value="chapters")
+        self.extract_workers = tk.IntVar(value=1)
+        self.clean_workers = tk.IntVar(value=1)
+        self.use_cache = tk.BooleanVar(value=True)
+        self.profile = tk.BooleanVar(value=False)
         self.source_option = tk.StringVar(value="single")
 
         self.grid_columnconfigure(1, weight=1) # Make entry fields expand
@@ -118,6 +146,32 @@ class SourceFrame(tb.Frame):
         self.whole_rb = tb.Radiobutton(mode_frame, text="Whole Book (Single File)", variable=self.extract_mode, value="whole")
         self.whole_rb.pack(side=LEFT)
 
+        # Worker processes: shards pages of a single PDF, or runs several books of a batch at once
+        tb.Label(self.options_lf, text="Worker processes:").grid(row=2, column=0, sticky="w", pady=(10, 0))
+        self.workers_spin = tb.Spinbox(
+            self.options_lf, from_=1, to=os.cpu_count() or 1, textvariable=self.extract_workers, width=5
+        )
+        self.workers_spin.grid(row=2, column=1, sticky="w", pady=(10, 0))
+
+        # Cleaning processes: cleans several chapters of a book at once (order is kept)
+        tb.Label(self.options_lf, text="Cleaning processes:").grid(row=3, column=0, sticky="w", pady=(10, 0))
+        self.clean_workers_spin = tb.Spinbox(
+            self.options_lf, from_=1, to=os.cpu_count() or 1, textvariable=self.clean_workers, width=5
+        )
+        self.clean_workers_spin.grid(row=3, column=1, sticky="w", pady=(10, 0))
+
+        # Extraction cache: re-running on an unchanged book with the same options reuses the previous result
+        self.cache_check = tb.Checkbutton(self.options_lf, text="Use extraction cache", variable=self.use_cache)
+        self.cache_check.grid(row=4, column=0, sticky="w", pady=(10, 0))
+        self.clear_cache_btn = tb.Button(
+            self.options_lf, text="Clear Cache", command=self._clear_extraction_cache, bootstyle=SECONDARY
+        )
+        self.clear_cache_btn.grid(row=4, column=1, sticky="w", pady=(10, 0))
+
+        # Stage timings: saves a JSON report per book (plus a summary for batches) next to the text
+        self.profile_check = tb.Checkbutton(self.options_lf, text="Save stage timing report", variable=self.profile)
+        self.profile_check.grid(row=5, column=0, columnspan=2, sticky="w", pady=(10, 0))
+
         # --- Output Directory Display ---
         out_lf = tb.Labelframe(self, text="Extracted Text Output (Preview)", padding=15, bootstyle=SECONDARY)
         out_lf.grid(row=2, column=0, columnspan=3, sticky="ew", padx=10, pady=(10, 0))
@@ -144,7 +198,7 @@ class SourceFrame(tb.Frame):
         options_state = NORMAL if option != "skip" else DISABLED
         for child in self.options_lf.winfo_children():
              # Handle nested frames like mode_frame
-            if isinstance(child, (tb.Checkbutton, tb.Label, tb.Radiobutton)):
+            if isinstance(child, (tb.Checkbutton, tb.Label, tb.Radiobutton, tb.Spinbox)):
                 child.config(state=options_state)
             elif isinstance(child, tb.Frame):
                  for grandchild in child.winfo_children():
@@ -252,12 +306,32 @@ class SourceFrame(tb.Frame):
     def _browse_extracted_folder(self):
         self._browse_file_or_folder("skip")
 
+    def _clear_extraction_cache(self):
+        """Deletes all cached extractions after confirmation."""
+        if messagebox.askyesno("Clear Cache", "Delete all cached extraction results?"):
+            count, total = clear_extraction_cache()
+            messagebox.showinfo("Cache Cleared", f"Removed {count} cached entries ({total / (1024 * 1024):.1f} MB).")
+
     def _open_extracted_folder(self):
         """Opens the displayed extracted text folder."""
         folder = self.extracted_text_dir.get()
         self.app.open_folder(folder)
 
     # --- Getters ---
+    def _get_extract_workers(self):
+        """Returns the worker process count, falling back to 1 if the field is invalid."""
+        try:
+            return max(1, self.extract_workers.get())
+        except tk.TclError:
+            return 1
+
+    def _get_clean_workers(self):
+        """Returns the cleaning process count, falling back to 1 if the field is invalid."""
+        try:
+            return max(1, self.clean_workers.get())
+        except tk.TclError:
+            return 1
+
     def get_config(self):
         return {
             "source_option": self.source_option.get(),
@@ -266,6 +340,10 @@ class SourceFrame(tb.Frame):
             "manual_extracted_dir": self.manual_extracted_dir.get(),
             "use_toc": self.use_toc.get(),
             "extract_mode": self.extract_mode.get(),
+            "extract_workers": self._get_extract_workers(),
+            "clean_workers": self._get_clean_workers(),
+            "use_cache": self.use_cache.get(),
+            "profile": self.profile.get(),
             # extracted_text_dir is derived, no need to save explicitly
         }
 
@@ -277,6 +355,10 @@ class SourceFrame(tb.Frame):
         self.manual_extracted_dir.set(config.get("manual_extracted_dir", ""))
         self.use_toc.set(config.get("use_toc", True))
         self.extract_mode.set(config.get("extract_mode", "chapters"))
+        self.extract_workers.set(config.get("extract_workers", 1))
+        self.clean_workers.set(config.get("clean_workers", 1))
+        self.use_cache.set(config.get("use_cache", True))
+        self.profile.set(config.get("profile", False))
 
         # Update the UI elements to reflect the loaded mode (enable/disable fields)
         self._update_ui()
@@ -304,7 +386,21 @@ class AudioFrame(tb.Frame):
         self.chunk_size_display = tk.StringVar(value="510 (Small)") # For combobox
         self.audio_format = tk.StringVar(value=".wav")
         self.audio_format_display = tk.StringVar(value=".wav (High Quality)") # For combobox
-        self.device = tk.StringVar(value="cuda") # Default to GPU if available
+        self.encode_bitrate = tk.IntVar(value=0) # kbps for MP3/Opus, 0: by quality
+        self.encode_quality = tk.DoubleVar(value=DEFAULT_ENCODE_QUALITY)
+        self.encoding_display = tk.StringVar(value="Balanced") # For combobox
+        self.device = tk.StringVar(value="auto") # GPU if usable, else CPU (resolved when a run starts)
+        self.use_audio_cache = tk.BooleanVar(value=True)
+        self.resume_audio = tk.BooleanVar(value=False)
+        self.audio_workers = tk.IntVar(value=1)
+        self.cpu_affinity = tk.BooleanVar(value=False)
+        self.batch_size = tk.IntVar(value=1)
+        self.cpu_fast = tk.BooleanVar(value=False)
+        self.quantize_int8 = tk.BooleanVar(value=False)
+        self.assemble_book = tk.BooleanVar(value=False)
+        self.trim_silence = tk.BooleanVar(value=False)
+        self.normalize_loudness = tk.BooleanVar(value=False)
+        self.pause_vars = {kind: tk.DoubleVar(value=seconds) for kind, seconds in DEFAULT_PAUSES.items()} # Seconds
         self.audio_output_dir = tk.StringVar() # Display only, set by app
 
         self.grid_columnconfigure(1, weight=1)
@@ -346,23 +442,101 @@ class AudioFrame(tb.Frame):
 
         # Audio Format
         tb.Label(settings_lf, text="Output Format:").grid(row=1, column=0, sticky="w", padx=(0, 10), pady=5)
-        formats = [".wav (High Quality)", ".mp3 (Smaller Size)"]
+        format_frame = tb.Frame(settings_lf)
+        format_frame.grid(row=1, column=1, sticky="w", pady=5)
+        formats = [AUDIO_FORMAT_LABELS[extension] for extension in available_output_formats()]
         self.format_combo = tb.Combobox(
-            settings_lf, textvariable=self.audio_format_display, values=formats,
-            state="readonly", width=18
+            format_frame, textvariable=self.audio_format_display, values=formats,
+            state="readonly", width=22
         )
-        self.format_combo.grid(row=1, column=1, sticky="w", pady=5)
+        self.format_combo.pack(side=LEFT, padx=(0, 15))
         self.format_combo.bind("<<ComboboxSelected>>", self._update_audio_format)
+        # Compressed formats are encoded by a background process while synthesis goes on
+        tb.Label(format_frame, text="Compression:").pack(side=LEFT, padx=(0, 10))
+        self.encoding_combo = tb.Combobox(
+            format_frame, textvariable=self.encoding_display, values=list(ENCODING_OPTIONS),
+            state="readonly", width=12
+        )
+        self.encoding_combo.pack(side=LEFT)
+        self.encoding_combo.bind("<<ComboboxSelected>>", self._update_encoding)
+        self._update_audio_format() # Compression only applies to lossy formats
 
         # Device Selection
         tb.Label(settings_lf, text="Device:").grid(row=2, column=0, sticky="w", padx=(0, 10), pady=5)
         device_frame = tb.Frame(settings_lf)
         device_frame.grid(row=2, column=1, sticky="w", pady=5)
+        self.auto_rb = tb.Radiobutton(device_frame, text="Auto", variable=self.device, value="auto")
+        self.auto_rb.pack(side=LEFT, padx=(0, 15))
         self.gpu_rb = tb.Radiobutton(device_frame, text="GPU (CUDA)", variable=self.device, value="cuda")
         self.gpu_rb.pack(side=LEFT, padx=(0, 15))
         self.cpu_rb = tb.Radiobutton(device_frame, text="CPU", variable=self.device, value="cpu")
         self.cpu_rb.pack(side=LEFT)
-        # Maybe add a check here for CUDA availability and disable GPU if not found
+        # Probed once at startup; a GPU that cannot be used is not offered
+        if "cuda" not in available_devices():
+            self.gpu_rb.configure(state=DISABLED)
+            if self.device.get() == "cuda":
+                self.device.set("auto")
+
+        # Audio cache: sentences synthesized before (same voice and speed) are reused on re-runs
+        self.audio_cache_check = tb.Checkbutton(settings_lf, text="Use audio cache", variable=self.use_audio_cache)
+        self.audio_cache_check.grid(row=3, column=0, sticky="w", pady=5)
+        self.clear_audio_cache_btn = tb.Button(
+            settings_lf, text="Clear Cache", command=self._clear_audio_cache, bootstyle=SECONDARY
+        )
+        self.clear_audio_cache_btn.grid(row=3, column=1, sticky="w", pady=5)
+
+        # Resume: skips finished audio files and continues interrupted ones from their last checkpoint
+        self.resume_check = tb.Checkbutton(settings_lf, text="Resume unfinished audio (skip finished files)", variable=self.resume_audio)
+        self.resume_check.grid(row=4, column=0, columnspan=2, sticky="w", pady=5)
+
+        # Synthesis processes: each has its own pipeline and a share of the CPU threads (for CPU synthesis)
+        tb.Label(settings_lf, text="Synthesis processes:").grid(row=5, column=0, sticky="w", padx=(0, 10), pady=5)
+        workers_frame = tb.Frame(settings_lf)
+        workers_frame.grid(row=5, column=1, sticky="w", pady=5)
+        self.audio_workers_spin = tb.Spinbox(
+            workers_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.audio_workers, width=5
+        )
+        self.audio_workers_spin.pack(side=LEFT, padx=(0, 15))
+        self.cpu_affinity_check = tb.Checkbutton(workers_frame, text="Pin to CPU cores", variable=self.cpu_affinity)
+        self.cpu_affinity_check.pack(side=LEFT)
+
+        # Batched inference: sentences of similar length share one forward pass (1 = one sentence at a time)
+        tb.Label(settings_lf, text="Sentences per batch:").grid(row=6, column=0, sticky="w", padx=(0, 10), pady=5)
+        self.batch_size_spin = tb.Spinbox(settings_lf, from_=1, to=64, textvariable=self.batch_size, width=5)
+        self.batch_size_spin.grid(row=6, column=1, sticky="w", pady=5)
+
+        # CPU fast mode: inference mode and a tuned thread count, optionally an int8 model (CPU only)
+        cpu_fast_frame = tb.Frame(settings_lf)
+        cpu_fast_frame.grid(row=7, column=0, columnspan=2, sticky="w", pady=5)
+        self.cpu_fast_check = tb.Checkbutton(cpu_fast_frame, text="CPU fast mode", variable=self.cpu_fast)
+        self.cpu_fast_check.pack(side=LEFT, padx=(0, 15))
+        self.quantize_check = tb.Checkbutton(cpu_fast_frame, text="int8 model (slight quality loss)", variable=self.quantize_int8)
+        self.quantize_check.pack(side=LEFT)
+
+        # Single-file book: the chapter files are joined into '<audio folder>.wav' with chapter markers
+        self.assemble_check = tb.Checkbutton(
+            settings_lf, text="Also save the book as one file with chapter markers (.wav)", variable=self.assemble_book
+        )
+        self.assemble_check.grid(row=8, column=0, columnspan=2, sticky="w", pady=5)
+
+        # Pause shaping: each chunk's own leading/trailing silence is trimmed and replaced by these pauses
+        pauses_frame = tb.Frame(settings_lf)
+        pauses_frame.grid(row=9, column=0, columnspan=2, sticky="w", pady=5)
+        self.trim_silence_check = tb.Checkbutton(pauses_frame, text="Trim silence, pauses (s):", variable=self.trim_silence)
+        self.trim_silence_check.pack(side=LEFT, padx=(0, 10))
+        self.pause_spins = {}
+        for kind in DEFAULT_PAUSES:
+            tb.Label(pauses_frame, text=f"{kind.capitalize()}").pack(side=LEFT, padx=(0, 5))
+            self.pause_spins[kind] = tb.Spinbox(
+                pauses_frame, from_=0.0, to=10.0, increment=0.1, format="%.1f", textvariable=self.pause_vars[kind], width=5
+            )
+            self.pause_spins[kind].pack(side=LEFT, padx=(0, 10))
+
+        # Book loudness: one gain for every chapter of a book, from loudness measured while synthesizing
+        self.normalize_loudness_check = tb.Checkbutton(
+            settings_lf, text="Same loudness for every chapter (saved when the book is done)", variable=self.normalize_loudness
+        )
+        self.normalize_loudness_check.grid(row=10, column=0, columnspan=2, sticky="w", pady=5)
 
         # --- Output Directory Display ---
         out_lf = tb.Labelframe(self, text="Audiobook Output (Preview)", padding=15, bootstyle=SECONDARY)
@@ -377,16 +551,40 @@ class AudioFrame(tb.Frame):
         # Placeholder if validation is needed in the future
         pass
 
+    def _clear_audio_cache(self):
+        """Deletes all cached sentence audio after confirmation."""
+        if messagebox.askyesno("Clear Cache", "Delete all cached sentence audio?"):
+            count, total = clear_audio_cache()
+            messagebox.showinfo("Cache Cleared", f"Removed {count} cached entries ({total / (1024 * 1024):.1f} MB).")
+
     def _update_chunk_size(self, event):
         selection = self.chunk_size_display.get()
         if "Small" in selection: self.chunk_size.set(510)
         elif "Medium" in selection: self.chunk_size.set(1020)
         elif "Large" in selection: self.chunk_size.set(2040)
 
-    def _update_audio_format(self, event):
+    def _update_audio_format(self, event=None):
         selection = self.audio_format_display.get()
-        if "wav" in selection: self.audio_format.set(".wav")
-        elif "mp3" in selection: self.audio_format.set(".mp3")
+        for extension, label in AUDIO_FORMAT_LABELS.items():
+            if label == selection: self.audio_format.set(extension)
+        self.encoding_combo.config(state=DISABLED if self.audio_format.get() in LOSSLESS_FORMATS else "readonly")
+
+    def _update_encoding(self, event=None):
+        bitrate, quality = ENCODING_OPTIONS[self.encoding_display.get()]
+        self.encode_bitrate.set(bitrate)
+        self.encode_quality.set(quality)
+
+    def _update_display_values(self):
+        """Sets the combobox display values from the internal values (e.g. after loading a config)."""
+        chunk_map = {510: "510 (Small)", 1020: "1020 (Medium)", 2040: "2040 (Large)"}
+        self.chunk_size_display.set(chunk_map.get(self.chunk_size.get(), "510 (Small)"))
+        self.audio_format_display.set(AUDIO_FORMAT_LABELS.get(self.audio_format.get(), ".wav (High Quality)"))
+        self._update_audio_format()
+        self.encoding_display.set("Balanced")
+        for label, (bitrate, quality) in ENCODING_OPTIONS.items():
+            if bitrate == self.encode_bitrate.get() and abs(quality - self.encode_quality.get()) < 1e-6:
+                self.encoding_display.set(label)
+                break
 
     def update_output_display(self, path):
         """Updates the read-only output directory field."""
@@ -400,18 +598,52 @@ class AudioFrame(tb.Frame):
         self.app.open_folder(folder)
 
     # --- Getters ---
+    def _get_audio_workers(self):
+        """Returns the synthesis process count, falling back to 1 if the field is invalid."""
+        try:
+            return max(1, self.audio_workers.get())
+        except tk.TclError:
+            return 1
+
+    def _get_batch_size(self):
+        """Returns the sentences per batch, falling back to 1 if the field is invalid."""
+        try:
+            return max(1, self.batch_size.get())
+        except tk.TclError:
+            return 1
+
+    def _get_pauses(self):
+        """Returns the sentence/paragraph/chapter pauses in seconds, using the defaults for invalid fields."""
+        pauses = {}
+        for kind, var in self.pause_vars.items():
+            try:
+                pauses[kind] = max(0.0, var.get())
+            except tk.TclError:
+                pauses[kind] = DEFAULT_PAUSES[kind]
+        return pauses
+
     def get_config(self):
          # Find the actual display value matching the internal value
-        chunk_map = {510: "510 (Small)", 1020: "1020 (Medium)", 2040: "2040 (Large)"}
-        format_map = {".wav": ".wav (High Quality)", ".mp3": ".mp3 (Smaller Size)"}
-        self.chunk_size_display.set(chunk_map.get(self.chunk_size.get(), "510 (Small)"))
-        self.audio_format_display.set(format_map.get(self.audio_format.get(), ".wav (High Quality)"))
+        self._update_display_values()
 
         return {
             "voicepack": self.voicepack.get(),
             "chunk_size": self.chunk_size.get(),
             "audio_format": self.audio_format.get(),
+            "encode_bitrate": self.encode_bitrate.get(),
+            "encode_quality": self.encode_quality.get(),
             "device": self.device.get(),
+            "use_audio_cache": self.use_audio_cache.get(),
+            "resume_audio": self.resume_audio.get(),
+            "audio_workers": self._get_audio_workers(),
+            "cpu_affinity": self.cpu_affinity.get(),
+            "batch_size": self._get_batch_size(),
+            "cpu_fast": self.cpu_fast.get(),
+            "quantize_int8": self.quantize_int8.get(),
+            "assemble_book": self.assemble_book.get(),
+            "trim_silence": self.trim_silence.get(),
+            "normalize_loudness": self.normalize_loudness.get(),
+            **{f"pause_{kind}": seconds for kind, seconds in self._get_pauses().items()},
         }
 
     def set_config(self, config):
@@ -423,15 +655,30 @@ class AudioFrame(tb.Frame):
 
         self.chunk_size.set(config.get("chunk_size", 510))
         self.audio_format.set(config.get("audio_format", ".wav"))
-        self.device.set(config.get("device", "cuda"))
+        if self.audio_format.get() not in available_output_formats():
+            self.audio_format.set(".wav") # Saved with a libsndfile that could write it
+        self.encode_bitrate.set(config.get("encode_bitrate", 0))
+        self.encode_quality.set(config.get("encode_quality", DEFAULT_ENCODE_QUALITY))
+        self.device.set(config.get("device", "auto"))
+        if self.device.get() == "cuda" and "cuda" not in available_devices():
+            self.device.set("auto") # Saved on a machine (or driver) with a usable GPU
+        self.use_audio_cache.set(config.get("use_audio_cache", True))
+        self.resume_audio.set(config.get("resume_audio", False))
+        self.audio_workers.set(config.get("audio_workers", 1))
+        self.cpu_affinity.set(config.get("cpu_affinity", False))
+        self.batch_size.set(config.get("batch_size", 1))
+        self.cpu_fast.set(config.get("cpu_fast", False))
+        self.quantize_int8.set(config.get("quantize_int8", False))
+        self.assemble_book.set(config.get("assemble_book", False))
+        self.trim_silence.set(config.get("trim_silence", False))
+        self.normalize_loudness.set(config.get("normalize_loudness", False))
+        for kind, var in self.pause_vars.items():
+            var.set(config.get(f"pause_{kind}", DEFAULT_PAUSES[kind]))
 
         # Update display variables based on loaded internal values
-        chunk_map = {510: "510 (Small)", 1020: "1020 (Medium)", 2040: "2040 (Large)"}
-        format_map = {".wav": ".wav (High Quality)", ".mp3": ".mp3 (Smaller Size)"}
-        self.chunk_size_display.set(chunk_map.get(self.chunk_size.get(), "510 (Small)"))
-        self.audio_format_display.set(format_map.get(self.audio_format.get(), ".wav (High Quality)"))
+        self._update_display_values()
     def get_device(self):
-        """Returns the currently selected device string ('cuda' or 'cpu')."""
+        """Returns the currently selected device string ('auto', 'cuda' or 'cpu')."""
         return self.device.get() # Retrieve the value from the tk.StringVar
 
 class ControlFrame(tb.Frame):
@@ -775,6 +1022,8 @@ class VoiceTestFrame(tb.Frame):
             mode = self.test_mode.get()
             output_dir = self.test_output_dir.get()
             device = self.app.audio_frame.get_device() # Get device from audio frame
+            cpu_fast = self.app.audio_frame.cpu_fast.get()
+            quantize = self.app.audio_frame.quantize_int8.get()
             os.makedirs(output_dir, exist_ok=True)
 
             if mode == "single":
@@ -800,7 +1049,9 @@ class VoiceTestFrame(tb.Frame):
                     cancellation_flag=lambda: self.cancellation_flag,
                     # Modify progress callback for single test context if needed
                     progress_callback=lambda p, fname, idx, total: self._progress_callback(p, voice), # Simplified for single file
-                    pause_event=self.pause_event
+                    pause_event=self.pause_event,
+                    cpu_fast=cpu_fast,
+                    quantize=quantize # Hear the int8 model before a long run
                 )
                 final_progress = 100
 
@@ -834,7 +1085,9 @@ class VoiceTestFrame(tb.Frame):
                     cancellation_flag=lambda: self.cancellation_flag,
                     # Pass the correct progress callback signature expected by the function
                     progress_callback=self._progress_callback, # UI method handles overall progress
-                    pause_event=self.pause_event
+                    pause_event=self.pause_event,
+                    cpu_fast=cpu_fast,
+                    quantize=quantize
                 )
                 final_progress = 100
 
@@ -1177,6 +1430,10 @@ class AudiobookApp(tb.Window):
 
                 use_toc = cfg["source"]["use_toc"]
                 extract_mode = cfg["source"]["extract_mode"]
+                extract_workers = cfg["source"].get("extract_workers", 1)
+                clean_workers = cfg["source"].get("clean_workers", 1)
+                use_cache = cfg["source"].get("use_cache", True)
+                profile = cfg["source"].get("profile", False)
 
                 if source_opt == "single":
                     pdf_path = cfg["source"]["pdf_path"]
@@ -1196,7 +1453,11 @@ class AudiobookApp(tb.Window):
                     extract_book(
                         pdf_path, use_toc=use_toc, extract_mode=extract_mode,
                         output_dir=extracted_base_output, # e.g., ./extracted_books/MyBook
-                        progress_callback=single_extract_progress
+                        progress_callback=single_extract_progress,
+                        num_workers=extract_workers, # Shards the pages of a PDF across processes
+                        clean_workers=clean_workers, # Cleans chapters concurrently
+                        use_cache=use_cache,
+                        profile=profile # Saves stage timings next to the extracted text
                     )
                     all_task_folders.append((extracted_base_output, audio_base_output))
                     print(f"Successfully extracted: {filename}")
@@ -1213,15 +1474,11 @@ class AudiobookApp(tb.Window):
                     total_files = len(book_files)
                     print(f"Found {total_files} book files for batch processing.")
 
-                    for i, book_path in enumerate(book_files, start=1):
-                        if self.cancellation_flag: raise InterruptedError("Batch extraction cancelled")
-
-                        filename = os.path.basename(book_path)
-                        self._update_gui_progress(action="Extracting:", file=filename, count_str=f"({i} of {total_files})")
-
+                    batch_tasks = [] # (book_path, text_output_folder, audio_output_folder)
+                    for book_path in book_files:
                         # Determine relative path for output structure mirroring
                         rel_path = os.path.relpath(os.path.dirname(book_path), source_folder)
-                        book_name_no_ext = os.path.splitext(filename)[0]
+                        book_name_no_ext = os.path.splitext(os.path.basename(book_path))[0]
 
                         # Output folder for this specific book's text
                         current_extract_output = os.path.join(extracted_base_output, rel_path, book_name_no_ext)
@@ -1229,22 +1486,67 @@ class AudiobookApp(tb.Window):
                         current_audio_output = os.path.join(audio_base_output, rel_path, book_name_no_ext)
 
                         os.makedirs(current_extract_output, exist_ok=True)
+                        batch_tasks.append((book_path, current_extract_output, current_audio_output))
+
+                    # Per-book stage timings are aggregated into one summary for the batch
+                    profile_summary_path = os.path.join(extracted_base_output, PROFILE_SUMMARY_NAME) if profile else None
 
-                        def batch_extract_progress(p):
-                            if self.cancellation_flag: raise InterruptedError("Extraction cancelled")
-                            overall_p = ((i - 1 + p / 100.0) / total_files) * 100
-                            self._update_gui_progress(extract_p=overall_p)
+                    if extract_workers > 1 and total_files > 1:
+                        # Run several books at once, one worker process per book
+                        self._update_gui_progress(action="Extracting:", file=f"{total_files} books ({extract_workers} at a time)", count_str=f"(0 of {total_files})")
+                        completed_books = 0
+
+                        def batch_book_done(job_index, output_dir):
+                            nonlocal completed_books
+                            completed_books += 1
+                            overall_p = (completed_books / total_files) * 100
+                            self._update_gui_progress(extract_p=overall_p, count_str=f"({completed_books} of {total_files})")
                             elapsed = time.time() - start_time
-                            est = (elapsed / (overall_p / 100.0)) - elapsed if overall_p > 0 else 0
+                            est = (elapsed / (overall_p / 100.0)) - elapsed
                             self._update_gui_progress(est_time_str=f"Est. Time: {self._format_time(est)}")
-
-                        extract_book(
-                            book_path, use_toc=use_toc, extract_mode=extract_mode,
-                            output_dir=current_extract_output,
-                            progress_callback=batch_extract_progress
+                            print(f"({completed_books}/{total_files}) Extracted: {os.path.basename(batch_tasks[job_index][0])}")
+
+                        extract_books(
+                            [
+                                {"file_path": book_path, "use_toc": use_toc, "extract_mode": extract_mode, "output_dir": text_dir, "use_cache": use_cache}
+                                for book_path, text_dir, _ in batch_tasks
+                            ],
+                            num_workers=extract_workers,
+                            cancellation_flag=lambda: self.cancellation_flag,
+                            book_callback=batch_book_done,
+                            profile_summary_path=profile_summary_path
                         )
-                        all_task_folders.append((current_extract_output, current_audio_output))
-                        print(f"({i}/{total_files}) Extracted: {filename}")
+                        all_task_folders.extend((text_dir, audio_dir) for _, text_dir, audio_dir in batch_tasks)
+
+                    else:
+                        for i, (book_path, current_extract_output, current_audio_output) in enumerate(batch_tasks, start=1):
+                            if self.cancellation_flag: raise InterruptedError("Batch extraction cancelled")
+
+                            filename = os.path.basename(book_path)
+                            self._update_gui_progress(action="Extracting:", file=filename, count_str=f"({i} of {total_files})")
+
+                            def batch_extract_progress(p):
+                                if self.cancellation_flag: raise InterruptedError("Extraction cancelled")
+                                overall_p = ((i - 1 + p / 100.0) / total_files) * 100
+                                self._update_gui_progress(extract_p=overall_p)
+                                elapsed = time.time() - start_time
+                                est = (elapsed / (overall_p / 100.0)) - elapsed if overall_p > 0 else 0
+                                self._update_gui_progress(est_time_str=f"Est. Time: {self._format_time(est)}")
+
+                            extract_book(
+                                book_path, use_toc=use_toc, extract_mode=extract_mode,
+                                output_dir=current_extract_output,
+                                progress_callback=batch_extract_progress,
+                                num_workers=extract_workers,
+                                clean_workers=clean_workers,
+                                use_cache=use_cache,
+                                profile=profile
+                            )
+                            all_task_folders.append((current_extract_output, current_audio_output))
+                            print(f"({i}/{total_files}) Extracted: {filename}")
+
+                        if profile_summary_path:
+                            save_profile_summary([text_dir for _, text_dir, _ in batch_tasks], profile_summary_path)
 
                 self._update_gui_progress(extract_p=100) # Mark extraction as complete
 
@@ -1291,8 +1593,22 @@ class AudiobookApp(tb.Window):
                  # Handle case where voice might be empty, though validation should prevent this
                  raise ValueError("Invalid or empty voice selected.")
             audio_format = audio_cfg["audio_format"]
-            chunk_size = audio_cfg["chunk_size"] # Not directly used by kokoro func? Check generate_audiobooks_kokoro
-            device = audio_cfg["device"] # Not directly used by kokoro func? Check generate_audiobooks_kokoro
+            encode_bitrate = audio_cfg.get("encode_bitrate", 0) or None # kbps for MP3/Opus, else by quality
+            encode_quality = audio_cfg.get("encode_quality", DEFAULT_ENCODE_QUALITY)
+            use_audio_cache = audio_cfg.get("use_audio_cache", True)
+            resume_audio = audio_cfg.get("resume_audio", False)
+            chunk_size = audio_cfg["chunk_size"] # Characters per synthesized segment (sentences packed per paragraph)
+            device = audio_cfg["device"] # 'auto' is resolved (with CPU fallback) by the kokoro functions
+            audio_workers = audio_cfg.get("audio_workers", 1)
+            cpu_affinity = audio_cfg.get("cpu_affinity", False)
+            batch_size = audio_cfg.get("batch_size", 1)
+            cpu_fast = audio_cfg.get("cpu_fast", False)
+            quantize = audio_cfg.get("quantize_int8", False)
+            assemble_book = audio_cfg.get("assemble_book", False)
+            pauses = None # Keep the chunks' own silences
+            if audio_cfg.get("trim_silence", False):
+                pauses = {kind: audio_cfg.get(f"pause_{kind}", seconds) for kind, seconds in DEFAULT_PAUSES.items()}
+            normalize_loudness = audio_cfg.get("normalize_loudness", False)
 
             total_tasks = len(all_task_folders)
             if total_tasks == 0:
@@ -1301,49 +1617,115 @@ class AudiobookApp(tb.Window):
 
             task_start_time = time.time() # Reset timer for audio phase estimate
 
-            for task_idx, (text_input_dir, audio_output_dir) in enumerate(all_task_folders, start=1):
-                 if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
+            if audio_workers > 1 and total_tasks > 0:
+                # One pool of synthesis processes for the whole batch: workers go straight on to
+                # the next book while the last chapters of the previous one are still running
+                self._update_gui_progress(action="Generating Audio:", file="", count_str=f"({total_tasks} book(s))")
+                print(f"--- Generating audio for {total_tasks} book(s) with {audio_workers} synthesis processes ---")
+
+                def batch_progress_callback(progress, current_file="", files_done=0, files_total=0):
+                    if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
+                    if progress is None: return # Cancelled or failed, reported by the generator
 
-                 task_name = os.path.basename(text_input_dir)
-                 self._update_gui_progress(action="Generating Audio:", file=task_name, count_str=f"({task_idx} of {total_tasks})")
-                 print(f"--- Generating audio for: {task_name} ({task_idx}/{total_tasks}) ---")
+                    self._update_gui_progress(audio_p=progress)
+                    file_count_str = f"({files_done}/{files_total})" if files_total > 0 else ""
+                    self._update_gui_progress(file=current_file, count_str=file_count_str)
 
-                 os.makedirs(audio_output_dir, exist_ok=True)
+                    elapsed = time.time() - task_start_time
+                    est = (elapsed / (progress / 100.0)) - elapsed if progress > 0 else 0
+                    self._update_gui_progress(est_time_str=f"Est. Time: {self._format_time(est)}")
 
-                 def audio_progress_callback(progress, current_file="", file_idx=0, files_total=0):
+                generate_audiobook_batch_kokoro(
+                    tasks=all_task_folders,
+                    lang_code=lang_code,
+                    voice=voice,
+                    device=device,
+                    audio_format=audio_format,
+                    encode_bitrate=encode_bitrate,
+                    encode_quality=encode_quality,
+                    use_audio_cache=use_audio_cache,
+                    resume=resume_audio,
+                    batch_size=batch_size, # Sentences per forward pass
+                    chunk_size=chunk_size,
+                    num_workers=audio_workers,
+                    cpu_affinity=cpu_affinity, # Pin each worker to its own cores
+                    cpu_fast=cpu_fast,
+                    quantize=quantize, # int8 linear layers (CPU only)
+                    pauses=pauses, # Trimmed chunks with fixed sentence/paragraph/chapter pauses
+                    normalize_loudness=normalize_loudness, # One gain per book
+                    progress_callback=batch_progress_callback,
+                    cancellation_flag=lambda: self.cancellation_flag,
+                    pause_event=self.pause_event,
+                )
+                if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
+            else:
+                for task_idx, (text_input_dir, audio_output_dir) in enumerate(all_task_folders, start=1):
                      if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
 
-                     overall_progress = ((task_idx - 1 + progress / 100.0) / total_tasks) * 100
-                     self._update_gui_progress(audio_p=overall_progress)
-
-                     # Update current file within the task
-                     file_count_str = f"({file_idx}/{files_total})" if files_total > 0 else ""
-                     self._update_gui_progress(file=f"{task_name} / {current_file}", count_str=f"{file_count_str}") # Append file name
-
-                     # Time estimate for audio phase
-                     elapsed = time.time() - task_start_time
-                     est = (elapsed / (overall_progress / 100.0)) - elapsed if overall_progress > 0 else 0
-                     self._update_gui_progress(est_time_str=f"Est. Time: {self._format_time(est)}")
-
-                 # Call the Kokoro generation function
-                 # Pass necessary parameters - adjust based on actual function signature
-                 generate_audiobooks_kokoro(
-                     input_dir=text_input_dir,
-                     output_dir=audio_output_dir,
-                     voice=voice,
-                     lang_code=lang_code, # Pass derived lang code
-                     audio_format=audio_format,
-                     # speed=1.0, # Assuming default speed, add if needed
-                     # split_pattern=r'\n+', # Assuming default split, add if needed
-                     # device=device # Pass device if kokoro func supports it
-                     # chunk_size=chunk_size # Pass chunk_size if kokoro func supports it
-                     progress_callback=audio_progress_callback, # Use the combined callback
-                     cancellation_flag=lambda: self.cancellation_flag,
-                     pause_event=self.pause_event, # Pass the pause event
-                     # Add file_callback if generate_audiobooks_kokoro supports it for finer file updates
-                     # file_callback=lambda filename, i, total: ...
-                 )
-                 print(f"Finished audio for: {task_name}")
+                     task_name = os.path.basename(text_input_dir)
+                     self._update_gui_progress(action="Generating Audio:", file=task_name, count_str=f"({task_idx} of {total_tasks})")
+                     print(f"--- Generating audio for: {task_name} ({task_idx}/{total_tasks}) ---")
+
+                     os.makedirs(audio_output_dir, exist_ok=True)
+
+                     def audio_progress_callback(progress, current_file="", file_idx=0, files_total=0):
+                         if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
+
+                         overall_progress = ((task_idx - 1 + progress / 100.0) / total_tasks) * 100
+                         self._update_gui_progress(audio_p=overall_progress)
+
+                         # Update current file within the task
+                         file_count_str = f"({file_idx}/{files_total})" if files_total > 0 else ""
+                         self._update_gui_progress(file=f"{task_name} / {current_file}", count_str=f"{file_count_str}") # Append file name
+
+                         # Time estimate for audio phase
+                         elapsed = time.time() - task_start_time
+                         est = (elapsed / (overall_progress / 100.0)) - elapsed if overall_progress > 0 else 0
+                         self._update_gui_progress(est_time_str=f"Est. Time: {self._format_time(est)}")
+
+                     # Call the Kokoro generation function
+                     # Pass necessary parameters - adjust based on actual function signature
+                     generate_audiobooks_kokoro(
+                         input_dir=text_input_dir,
+                         output_dir=audio_output_dir,
+                         voice=voice,
+                         lang_code=lang_code, # Pass derived lang code
+                         audio_format=audio_format,
+                         encode_bitrate=encode_bitrate, # Compressed formats are encoded in the background
+                         encode_quality=encode_quality,
+                         use_audio_cache=use_audio_cache, # Reuse sentences synthesized in earlier runs
+                         resume=resume_audio, # Skip finished files, continue interrupted ones
+                         batch_size=batch_size, # Sentences per forward pass
+                         cpu_fast=cpu_fast, # Inference mode and tuned thread count
+                         quantize=quantize, # int8 linear layers (CPU only)
+                         # speed=1.0, # Assuming default speed, add if needed
+                         # split_pattern=r'\n+', # Assuming default split, add if needed
+                         device=device, # 'auto' picks the GPU if usable, falls back to the CPU
+                         chunk_size=chunk_size, # Pack sentences into segments of up to this many characters
+                         pauses=pauses, # Trimmed chunks with fixed sentence/paragraph/chapter pauses
+                         normalize_loudness=normalize_loudness, # One gain per book
+                         progress_callback=audio_progress_callback, # Use the combined callback
+                         cancellation_flag=lambda: self.cancellation_flag,
+                         pause_event=self.pause_event, # Pass the pause event
+                         # Add file_callback if generate_audiobooks_kokoro supports it for finer file updates
+                         # file_callback=lambda filename, i, total: ...
+                     )
+                     print(f"Finished audio for: {task_name}")
+
+            if assemble_book:
+                # Streams each book's chapter files into one chaptered WAV next to its audio folder
+                for task_idx, (text_input_dir, audio_output_dir) in enumerate(all_task_folders, start=1):
+                    if self.cancellation_flag: raise InterruptedError("Audio generation cancelled")
+                    task_name = os.path.basename(text_input_dir)
+                    self._update_gui_progress(action="Assembling Book:", file=task_name, count_str=f"({task_idx} of {total_tasks})")
+                    try:
+                        assemble_book_directory(
+                            audio_output_dir,
+                            progress_callback=lambda progress, title: self._update_gui_progress(file=f"{task_name} / {title}"),
+                            cancellation_flag=lambda: self.cancellation_flag
+                        )
+                    except ValueError as e: # No finished chapters, or chapters that do not match
+                        print(f"Warning: Could not assemble '{task_name}': {e}")
 
             self._update_gui_progress(audio_p=100) # Mark audio as complete
 
@@ -1408,6 +1790,8 @@ class AudiobookApp(tb.Window):
              self.voice_test_frame.test_thread.join(timeout=1.0)
 
 
+        shutdown_synthesis_farm() # Stop idle synthesis worker processes
+        shutdown_encoder_pool() # Finishes queued encodes first
         self.save_config()
         self.destroy() # Close the Tkinter window
 